@@ -0,0 +1,62 @@
+"""Benchmarks of the registration of the invagination constriction events,
+against the number of mesoderm faces.
+"""
+from tyssue.behaviors.event_manager import EventManager
+from tyssue.behaviors.sheet.delamination_events import constriction
+
+from napari_tyssue.invagination import constriction_events
+from napari_tyssue.simulation import append_events
+
+from .benchmark_mesh import planar_sheet
+
+
+def loop_constriction_events(sheet, manager):
+    """The per face registration InvaginationSimulation.setup used before."""
+    from invagination.delamination import constriction_rate
+
+    for f in sheet.face_df[sheet.face_df["is_mesoderm"]].index:
+        x = sheet.face_df.loc[f, "x"]
+        c_rate = constriction_rate(x, max_constriction_rate=1.32, k=0.19, w=25)
+
+        delam_kwargs = sheet.settings["delamination"].copy()
+        delam_kwargs.update(
+            {
+                "face_id": f,
+                "contract_rate": c_rate,
+                "current_traction": 0,
+                "max_traction": 30,
+            }
+        )
+        manager.append(constriction, **delam_kwargs)
+
+
+class ConstrictionEvents:
+    params = ([10, 30, 50, 110], ["loop", "batch"])
+    param_names = ["nx", "registration"]
+
+    def setup(self, nx, registration):
+        self.sheet = planar_sheet(nx)
+        # every face is in the mesoderm
+        self.sheet.face_df["is_mesoderm"] = True
+        self.sheet.settings["delamination"] = {
+            "contract_rate": 2,
+            "critical_area": 5,
+            "radial_tension": 40,
+            "nb_iteration": 10,
+            "contract_neighbors": True,
+            "contract_span": 1,
+        }
+
+    def time_register(self, nx, registration):
+        manager = EventManager("face")
+        if registration == "loop":
+            loop_constriction_events(self.sheet, manager)
+        else:
+            append_events(
+                manager, constriction, constriction_events(self.sheet)
+            )
+
+    def track_num_events(self, nx, registration):
+        return int(self.sheet.face_df["is_mesoderm"].sum())
+
+    track_num_events.unit = "events"
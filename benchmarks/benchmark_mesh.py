@@ -0,0 +1,91 @@
+"""Benchmarks of the surface mesh extraction, against the number of faces.
+
+Run with ``asv run`` from the repository root, or ``asv dev`` for a quick
+pass over the current checkout.
+"""
+import numpy as np
+from tyssue import Sheet, SheetGeometry
+
+from napari_tyssue.tyssuewidget import (
+    TopologyCache,
+    _get_meshes,
+    face_mesh,
+    face_mesh_vertices,
+)
+
+COORDS = ["x", "y", "z"]
+
+
+def planar_sheet(nx):
+    """A flat hexagonal sheet with roughly ``nx ** 2`` faces."""
+    sheet = Sheet.planar_sheet_3d("bench", nx, nx, 1.0, 1.0)
+    sheet.sanitize(trim_borders=True, order_edges=True)
+    SheetGeometry.update_all(sheet)
+    return sheet
+
+
+def pandas_face_mesh_vertices(sheet, coords, epsilon=0.0):
+    """The DataFrame based extraction face_mesh used before."""
+    up_srce = sheet.edge_df[["s" + c for c in coords]]
+    up_trgt = sheet.edge_df[["t" + c for c in coords]]
+    if epsilon > 0:
+        up_face = sheet.edge_df[["f" + c for c in coords]].values
+        up_srce = (up_srce - up_face) * (1 - epsilon) + up_face
+        up_trgt = (up_trgt - up_face) * (1 - epsilon) + up_face
+    return np.concatenate(
+        [sheet.face_df[coords].values, up_srce.values, up_trgt.values]
+    )
+
+
+class FaceMeshVertices:
+    params = ([10, 50, 110], [0.0, 0.05])
+    param_names = ["nx", "epsilon"]
+
+    def setup(self, nx, epsilon):
+        self.sheet = planar_sheet(nx)
+        self.out = np.empty(
+            (self.sheet.Nf + 2 * self.sheet.Ne, 3), dtype=np.float32
+        )
+
+    def time_numpy(self, nx, epsilon):
+        face_mesh_vertices(self.sheet, COORDS, epsilon=epsilon, out=self.out)
+
+    def time_pandas(self, nx, epsilon):
+        pandas_face_mesh_vertices(self.sheet, COORDS, epsilon=epsilon)
+
+
+class GetMeshes:
+    """Mesh extraction of a whole sheet, as done after every step."""
+
+    params = ([10, 30, 50, 110], [False, True])
+    param_names = ["nx", "cached_topology"]
+
+    def setup(self, nx, cached_topology):
+        from tyssue.config.draw import sheet_spec
+
+        self.sheet = planar_sheet(nx)
+        self.draw_specs = sheet_spec()
+        self.topology_cache = TopologyCache() if cached_topology else None
+        if cached_topology:
+            self.topology_cache.triangles_for(self.sheet)
+
+    def time_face_mesh(self, nx, cached_topology):
+        triangles = None
+        if self.topology_cache is not None:
+            triangles = self.topology_cache.triangles_for(self.sheet)
+        face_mesh(
+            self.sheet, COORDS, triangles=triangles, **self.draw_specs["face"]
+        )
+
+    def time_get_meshes(self, nx, cached_topology):
+        _get_meshes(
+            self.sheet,
+            COORDS,
+            self.draw_specs,
+            topology_cache=self.topology_cache,
+        )
+
+    def track_num_faces(self, nx, cached_topology):
+        return self.sheet.Nf
+
+    track_num_faces.unit = "faces"
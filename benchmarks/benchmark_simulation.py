@@ -0,0 +1,61 @@
+"""Benchmarks of one step of the demo simulations.
+
+A step runs the events, the energy minimization and records the history;
+it is measured after a number of warm-up steps to show how the cost grows
+with the length of the run. The simulations are set up to run past the
+longest warm-up, a simulation done before it fails the benchmark.
+"""
+from napari_tyssue.apoptosis import ApoptosisSimulation
+from napari_tyssue.invagination import InvaginationSimulation
+
+
+class _SimulationStep:
+    simulation_class = None
+    simulation_settings = {}
+
+    params = [0, 5, 15]
+    param_names = ["timesteps"]
+
+    number = 1
+    repeat = 10
+    timeout = 600
+
+    def setup(self, timesteps):
+        # the relaxed initial sheet comes from the local cache after the
+        # first setup
+        self.simulation = self.simulation_class(
+            stop=timesteps + 1000, **self.simulation_settings
+        )
+        self.simulation.start()
+        while self.simulation.t < timesteps and not self.simulation.done:
+            self.simulation.step()
+        # the measured step must run too
+        assert not self.simulation.done, (
+            f"{self.simulation_class.__name__} is done at "
+            f"t={self.simulation.t}, before {timesteps + 1} steps"
+        )
+
+    def time_step(self, timesteps):
+        self.simulation.step()
+
+    def track_num_faces(self, timesteps):
+        return self.simulation.sheet.Nf
+
+    track_num_faces.unit = "faces"
+
+    def track_solver_iterations(self, timesteps):
+        self.simulation.step()
+        return self.simulation.res["nit"]
+
+    track_solver_iterations.unit = "iterations"
+
+
+class ApoptosisStep(_SimulationStep):
+    simulation_class = ApoptosisSimulation
+    # the cell shrinks slower than in the demo, which is done at t=9, so
+    # that the run lasts 21 steps
+    simulation_settings = {"shrink_rate": 1.05}
+
+
+class InvaginationStep(_SimulationStep):
+    simulation_class = InvaginationSimulation
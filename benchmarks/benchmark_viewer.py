@@ -0,0 +1,106 @@
+"""Benchmarks of the viewer update after a simulation step.
+
+They run against a hidden viewer, and measure how the cost of displaying
+one more timestep scales with the number of timesteps already displayed.
+"""
+import time
+
+import napari
+import numpy as np
+
+from napari_tyssue.tyssuewidget import (
+    Frame,
+    LazyTimeSeriesSurface,
+    TyssueWidget,
+)
+
+from .benchmark_mesh import planar_sheet
+
+
+def _displayed_widget(viewer, sheet, timesteps, lazy):
+    """A widget displaying ``timesteps`` timepoints of ``sheet``."""
+    widget = TyssueWidget(viewer)
+    if lazy:
+        widget.lazy_display = LazyTimeSeriesSurface(
+            viewer, widget._mesh_at, name=widget.layer_name
+        )
+
+    mesh = widget._sheet_mesh(sheet, widget.topology_cache)
+    widget._show_frames(
+        [Frame(t, mesh, None, None, None) for t in range(timesteps)]
+    )
+    return widget
+
+
+def _update(widget, sheet, t):
+    # what the simulation thread and the render timer do for one step
+    widget._on_simulation_update(sheet, t)
+    widget._on_render_tick()
+
+
+class SimulationUpdate:
+    params = ([10, 30], [10, 100, 500], [False, True])
+    param_names = ["nx", "timesteps", "lazy"]
+
+    # every call displays one more timestep, keep the layer size fixed
+    number = 1
+    repeat = 20
+
+    def setup(self, nx, timesteps, lazy):
+        self.viewer = napari.Viewer(show=False)
+        self.sheet = planar_sheet(nx)
+        self.widget = _displayed_widget(
+            self.viewer, self.sheet, timesteps, lazy
+        )
+        self.t = timesteps
+
+    def teardown(self, nx, timesteps, lazy):
+        self.viewer.close()
+
+    def time_update(self, nx, timesteps, lazy):
+        _update(self.widget, self.sheet, self.t)
+        self.t += 1
+
+
+class UpdateScaling:
+    """
+    Ratio of the cost of displaying one more timestep after 500 and after
+    10 timesteps. The lazy display, the default, must stay flat; the
+    stacked one is tracked for comparison.
+    """
+
+    params = ([10, 30], [False, True])
+    param_names = ["nx", "lazy"]
+
+    timesteps = (10, 500)
+    updates = 10
+    # slack for the timing noise of a flat cost
+    max_lazy_ratio = 2.0
+
+    def setup(self, nx, lazy):
+        self.sheet = planar_sheet(nx)
+
+    def _median_update(self, timesteps, lazy):
+        viewer = napari.Viewer(show=False)
+        try:
+            widget = _displayed_widget(viewer, self.sheet, timesteps, lazy)
+            durations = []
+            for t in range(timesteps, timesteps + self.updates):
+                start = time.perf_counter()
+                _update(widget, self.sheet, t)
+                durations.append(time.perf_counter() - start)
+        finally:
+            viewer.close()
+        return np.median(durations)
+
+    def track_update_growth(self, nx, lazy):
+        small, large = (self._median_update(t, lazy) for t in self.timesteps)
+        ratio = large / small
+        if lazy:
+            assert ratio < self.max_lazy_ratio, (
+                f"displaying a step costs {ratio:.1f} times more after "
+                f"{self.timesteps[1]} timesteps than after {self.timesteps[0]}"
+            )
+        return ratio
+
+    track_update_growth.unit = "ratio"
@@ -2,7 +2,6 @@ __version__ = "0.0.1"
 
 # from ._reader import napari_get_reader
 # from ._sample_data import make_sample_data
-from .apoptosis import ApoptosisWidget
 
 # from ._writer import write_multiple, write_single_image
 
@@ -14,3 +13,13 @@ __all__ = (
     "ApoptosisWidget",
     #    "example_magic_widget",
 )
+
+
+def __getattr__(name):
+    # The widget module is only imported when it is used, so that napari can
+    # list the plugin contributions without loading it
+    if name == "ApoptosisWidget":
+        from .apoptosis import ApoptosisWidget
+
+        return ApoptosisWidget
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
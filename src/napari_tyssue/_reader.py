@@ -1,15 +1,154 @@
 """
-This module is an example of a barebones numpy reader plugin for napari.
+This module implements the reader of tyssue HDF5 files and mesh sequences.
 
-It implements the Reader specification, but your plugin may choose to
-implement multiple readers or even other plugin contributions. see:
-https://napari.org/stable/plugins/guides.html?#readers
+It implements the Reader specification.
+see: https://napari.org/stable/plugins/guides.html?#readers
+
+Two layouts are recognized, both with one table per element (``vert``,
+``edge``, ``face``...):
+
+* datasets written by ``tyssue.io.hdf5.save_datasets``, opened as a single
+  surface,
+* histories written by ``tyssue.HistoryHdf5``, ``History.to_archive`` or
+  the Export button, where the tables have a ``time`` column. Only the
+  timepoint shown by the time slider is read from the file.
+
+Mesh sequences (``.npz``) are written by ``_writer.py``.
 """
+import logging
+import os
+
 import numpy as np
+import pandas as pd
+
+from napari_tyssue._writer import MESH_SEQUENCE_FORMAT
+
+LOGGER = logging.getLogger("napari_tyssue.reader")
+
+EXTENSIONS = (".hf5", ".h5", ".hdf5")
+
+DATA_NAMES = ("vert", "edge", "face", "cell")
+
+LAYER_KWARGS = {
+    "colormap": "viridis",
+    "opacity": 0.9,
+    "contrast_limits": [0, 1],
+}
+
+
+def is_tyssue_file(path):
+    """
+    Returns True if ``path`` is an HDF5 file with tyssue datasets.
+    """
+    if not os.fspath(path).endswith(EXTENSIONS):
+        return False
+    try:
+        with pd.HDFStore(path, mode="r") as store:
+            return all(name in store for name in ("vert", "edge", "face"))
+    except (OSError, ValueError):
+        return False
+
+
+def is_mesh_sequence(path):
+    """
+    Returns True if ``path`` is a mesh sequence written by ``_writer.py``.
+    """
+    if not os.fspath(path).endswith(".npz"):
+        return False
+    try:
+        with np.load(path) as npz:
+            return (
+                "format" in npz.files
+                and str(npz["format"]) == MESH_SEQUENCE_FORMAT
+            )
+    except (OSError, ValueError):
+        return False
+
+
+class MeshSequence:
+    """
+    Read access to a mesh sequence written by ``_writer.py``.
+
+    The arrays of a topology epoch are loaded when one of its timepoints is
+    first requested, and kept until another epoch is.
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with np.load(self.path) as npz:
+            self.time_stamps = npz["times"]
+            self.epochs = npz["epochs"]
+        self._epoch_starts = np.searchsorted(
+            self.epochs, np.arange(self.epochs.max(initial=-1) + 1)
+        )
+        self._epoch = None
+        self._arrays = None
+
+    def __len__(self):
+        return len(self.time_stamps)
+
+    def mesh_at(self, t):
+        """
+        Returns the ``(vertices, faces, values)`` mesh of the ``t``-th
+        timepoint.
+        """
+        epoch = self.epochs[t]
+        if epoch != self._epoch:
+            with np.load(self.path) as npz:
+                self._arrays = tuple(
+                    npz[f"{name}_{epoch}"]
+                    for name in ("vertices", "faces", "values")
+                )
+            self._epoch = epoch
+
+        vertices, faces, values = self._arrays
+        i = t - self._epoch_starts[epoch]
+        return vertices[i], faces, values[min(i, len(values) - 1)]
+
+
+class HistoryFile:
+    """
+    Read only access to a history stored in an HDF5 file.
+
+    The time stamps are read from the ``time`` column of the vertex table;
+    ``retrieve`` selects the rows of a single timepoint, so the memory used
+    only depends on the size of that timepoint.
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with pd.HDFStore(self.path, mode="r") as store:
+            self.data_names = [name for name in DATA_NAMES if name in store]
+            self.is_history = "time" in store.select("vert", stop=1).columns
+            if self.is_history:
+                times = store.select_column("vert", "time").to_numpy()
+                self.time_stamps = pd.unique(times)
+            else:
+                self.time_stamps = np.zeros(1)
+
+    def __len__(self):
+        return len(self.time_stamps)
+
+    def retrieve(self, time):
+        """
+        Returns the sheet recorded at ``time``.
+        """
+        from tyssue import Sheet
+
+        where = f"time == {time}" if self.is_history else None
+        datasets = {}
+        with pd.HDFStore(self.path, mode="r") as store:
+            for name in self.data_names:
+                df = store.select(name, where=where)
+                if name in df.columns:
+                    # History.to_archive keeps the element ids in a column
+                    df = df.set_index(name)
+                datasets[name] = df.drop(columns="time", errors="ignore")
+        return Sheet(os.path.basename(self.path), datasets)
 
 
 def napari_get_reader(path):
-    """A basic implementation of a Reader contribution.
+    """Returns the reader of tyssue HDF5 files.
 
     Parameters
     ----------
@@ -23,13 +162,11 @@ def napari_get_reader(path):
         same path or list of paths, and returns a list of layer data tuples.
     """
     if isinstance(path, list):
-        # reader plugins may be handed single path, or a list of paths.
-        # if it is a list, it is assumed to be an image stack...
-        # so we are only going to look at the first file.
+        # a tyssue file holds a whole simulation, we only open the first one
         path = path[0]
 
     # if we know we cannot read the file, we immediately return None.
-    if not path.endswith(".npy"):
+    if not (is_tyssue_file(path) or is_mesh_sequence(path)):
         return None
 
     # otherwise we return the *function* that can read ``path``.
@@ -37,11 +174,13 @@ def napari_get_reader(path):
 
 
 def reader_function(path):
-    """Take a path or list of paths and return a list of LayerData tuples.
+    """Opens a tyssue HDF5 file or a mesh sequence.
 
-    Readers are expected to return data as a list of tuples, where each tuple
-    is (data, [add_kwargs, [layer_type]]), "add_kwargs" and "layer_type" are
-    both optional.
+    Datasets are returned as a surface LayerData tuple. A time series is shown
+    in the current viewer by a :class:`LazyTimeSeriesSurface`, which only
+    reads the current timepoint; the ``[(None,)]`` sentinel tells napari
+    that there is no other layer to add. Without a viewer, only the first
+    timepoint of a time series is returned.
 
     Parameters
     ----------
@@ -52,21 +191,36 @@ def reader_function(path):
     -------
     layer_data : list of tuples
         A list of LayerData tuples where each tuple in the list contains
-        (data, metadata, layer_type), where data is a numpy array, metadata is
-        a dict of keyword arguments for the corresponding viewer.add_* method
-        in napari, and layer_type is a lower-case string naming the type of
-        layer. Both "meta", and "layer_type" are optional. napari will
-        default to layer_type=="image" if not provided
+        (data, metadata, layer_type)
     """
-    # handle both a string and a list of strings
-    paths = [path] if isinstance(path, str) else path
-    # load all files into array
-    arrays = [np.load(_path) for _path in paths]
-    # stack arrays into single array
-    data = np.squeeze(np.stack(arrays))
-
-    # optional kwargs for the corresponding viewer.add_* method
-    add_kwargs = {}
-
-    layer_type = "image"  # optional, default is "image"
-    return [(data, add_kwargs, layer_type)]
+    import napari
+
+    from napari_tyssue.tyssuewidget import (
+        LazyTimeSeriesSurface,
+        TopologyCache,
+        surface_mesh,
+    )
+
+    if isinstance(path, list):
+        path = path[0]
+
+    name = os.path.basename(path)
+    if is_mesh_sequence(path):
+        history = MeshSequence(path)
+        mesh_at = history.mesh_at
+    else:
+        history = HistoryFile(path)
+        topology_cache = TopologyCache()
+
+        def mesh_at(t):
+            sheet = history.retrieve(history.time_stamps[t])
+            return surface_mesh(sheet, topology_cache=topology_cache)
+
+    viewer = napari.current_viewer()
+    if viewer is None or len(history) == 1:
+        return [(mesh_at(0), dict(LAYER_KWARGS, name=name), "surface")]
+
+    display = LazyTimeSeriesSurface(viewer, mesh_at, **LAYER_KWARGS, name=name)
+    display.show(0, num_timepoints=len(history))
+    LOGGER.info("opened %s with %d timepoints", path, len(history))
+    return [(None,)]
@@ -0,0 +1,69 @@
+"""Small simulations that run without downloads, used by the tests."""
+import os
+
+from tyssue import Sheet, SheetGeometry, config
+from tyssue.behaviors.event_manager import EventManager, wait
+from tyssue.stores import stores_dir
+
+from napari_tyssue.simulation import TyssueSimulation, read_datasets
+
+
+def small_hexagonal_sheet():
+    """The small hexagonal sheet of the apoptosis demo, shipped with tyssue."""
+    datasets = read_datasets(
+        os.path.join(stores_dir, "small_hexagonal.hf5"),
+        data_names=["face", "vert", "edge"],
+    )
+    sheet = Sheet("emin", datasets, config.geometry.cylindrical_sheet())
+    sheet.sanitize(trim_borders=True, order_edges=True)
+    SheetGeometry.update_all(sheet)
+    return sheet
+
+
+class ShiftSolver:
+    """Stands in for the quasistatic solver by translating the sheet."""
+
+    def find_energy_min(self, sheet, geom, model, **kwargs):
+        sheet.vert_df["x"] += 1.0
+        geom.update_all(sheet)
+        return {"success": True, "nit": 1}
+
+
+def mark(sheet, manager, face_id):
+    """Flags the face of id ``face_id``."""
+    sheet.face_df.loc[sheet.face_df["id"] == face_id, "marked"] = True
+
+
+class ShiftSimulation(TyssueSimulation):
+    """Translates the sheet by one unit every step."""
+
+    face_events = ("mark",)
+
+    def setup(self):
+        self.sheet = small_hexagonal_sheet()
+        self.sheet.face_df["id"] = self.sheet.face_df.index
+        self.sheet.face_df["marked"] = False
+        self.manager = EventManager("face")
+        self.solver = ShiftSolver()
+        self.geom = SheetGeometry
+
+    def face_event(self, event, face_ids):
+        if event != "mark":
+            return super().face_event(event, face_ids)
+        return mark, [{"face_id": face_id} for face_id in face_ids]
+
+    def before_step(self):
+        # keep an event in the manager so the simulation runs until stop
+        self.manager.append(wait, n_steps=1)
+
+
+class RemoveFaceSimulation(ShiftSimulation):
+    """Removes a face at the second step."""
+
+    def before_step(self):
+        super().before_step()
+        if self.t == 1:
+            from tyssue.topology.sheet_topology import remove_face
+
+            remove_face(self.sheet, self.sheet.face_df.index[0])
+            self.geom.update_all(self.sheet)
@@ -0,0 +1,9 @@
+import pytest
+
+from napari_tyssue._tests._simulations import small_hexagonal_sheet
+
+
+@pytest.fixture
+def sheet():
+    """The small hexagonal sheet of the apoptosis demo, shipped with tyssue."""
+    return small_hexagonal_sheet()
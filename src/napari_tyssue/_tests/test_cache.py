@@ -0,0 +1,91 @@
+import numpy as np
+import pooch
+import pytest
+
+from napari_tyssue import cache
+from napari_tyssue._tests._simulations import small_hexagonal_sheet
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv(cache.CACHE_ENV, str(tmp_path))
+    return tmp_path
+
+
+def test_state_key_depends_on_every_part():
+    key = cache.state_key(input="abc", specs={"face": {"area": 1.0}})
+
+    assert key == cache.state_key(specs={"face": {"area": 1.0}}, input="abc")
+    assert key != cache.state_key(input="abc", specs={"face": {"area": 2.0}})
+    assert key != cache.state_key(input="abd", specs={"face": {"area": 1.0}})
+
+
+def test_cached_state_builds_once():
+    built = []
+
+    def build():
+        built.append(True)
+        return small_hexagonal_sheet()
+
+    key = cache.state_key(input="small_hexagonal")
+    first = cache.cached_state(key, build)
+    second = cache.cached_state(key, build)
+
+    assert len(built) == 1
+    assert second is not first
+    assert second.specs["settings"] == first.specs["settings"]
+    for name in cache.DATA_NAMES:
+        np.testing.assert_array_equal(
+            second.datasets[name].to_numpy(), first.datasets[name].to_numpy()
+        )
+
+
+def test_fetch_falls_back_when_offline(tmp_path, monkeypatch):
+    def retrieve(**kwargs):
+        raise OSError("offline")
+
+    monkeypatch.setattr(pooch, "retrieve", retrieve)
+    fallback = tmp_path / "input.hf5"
+    fallback.write_bytes(b"")
+
+    path = cache.fetch(
+        "https://example.org/input.hf5", "input.hf5", fallback=fallback
+    )
+    assert path == fallback
+    with pytest.raises(OSError):
+        cache.fetch("https://example.org/input.hf5", "input.hf5")
+
+
+def test_apoptosis_key_depends_on_specs(monkeypatch):
+    from tyssue import config
+
+    from napari_tyssue import apoptosis
+
+    class KeyComputed(Exception):
+        pass
+
+    # stop the setup once the key is known, before the relaxation
+    keys = []
+
+    def key_of(**parts):
+        keys.append(cache.state_key(**parts))
+        raise KeyComputed
+
+    monkeypatch.setattr(apoptosis, "state_key", key_of)
+    for _ in range(2):
+        with pytest.raises(KeyComputed):
+            apoptosis.ApoptosisSimulation(size=(8, 6)).setup()
+
+    cylindrical_sheet = config.geometry.cylindrical_sheet
+
+    def other_specs():
+        specs = cylindrical_sheet()
+        specs["settings"]["geometry"] = "flat"
+        return specs
+
+    monkeypatch.setattr(config.geometry, "cylindrical_sheet", other_specs)
+    with pytest.raises(KeyComputed):
+        apoptosis.ApoptosisSimulation(size=(8, 6)).setup()
+
+    assert keys[0] == keys[1]
+    assert keys[2] != keys[0]
@@ -0,0 +1,115 @@
+import numpy as np
+from tyssue.core.history import HistoryHdf5
+
+from napari_tyssue._tests._simulations import ShiftSimulation
+from napari_tyssue._tests.test_tyssuewidget import _ShiftWidget
+from napari_tyssue.export import HistoryWriter
+
+
+def _assert_same_history(path, history):
+    archive = HistoryHdf5.from_archive(path)
+    np.testing.assert_array_equal(archive.time_stamps, history.time_stamps)
+    for t in history.time_stamps:
+        expected = history.retrieve(t)
+        sheet = archive.retrieve(t)
+        for element in ("vert", "edge", "face"):
+            columns = history.columns[element]
+            np.testing.assert_allclose(
+                sheet.datasets[element][columns].to_numpy(dtype=float),
+                expected.datasets[element][columns].to_numpy(dtype=float),
+            )
+
+
+def test_history_writer_streams_steps(tmp_path):
+    path = tmp_path / "history.hf5"
+    simulation = ShiftSimulation(stop=4)
+    simulation.start()
+
+    with HistoryWriter(path) as writer:
+        writer.write_history(simulation.history)
+        while not simulation.done:
+            simulation.step()
+            writer.append(simulation.sheet, simulation.t)
+
+    _assert_same_history(path, simulation.history)
+
+
+def test_history_writer_catches_up_with_history(tmp_path):
+    path = tmp_path / "history.hf5"
+    simulation = ShiftSimulation(stop=4)
+    simulation.start()
+    simulation.step()
+
+    with HistoryWriter(path) as writer:
+        writer.write_history(simulation.history)
+        simulation.step()
+        simulation.step()
+        writer.write_history(simulation.history)
+        writer.write_history(simulation.history)
+        assert writer.time == 3
+
+    _assert_same_history(path, simulation.history)
+
+
+def test_history_writer_truncates_rewound_steps(tmp_path):
+    path = tmp_path / "history.hf5"
+    simulation = ShiftSimulation(stop=4)
+    simulation.keyframe_every = 2
+    simulation.start()
+
+    with HistoryWriter(path) as writer:
+        while not simulation.done:
+            simulation.step()
+        writer.write_history(simulation.history)
+
+        simulation.rewind(2)
+        writer.truncate(2)
+        assert writer.time == 2
+        while not simulation.done:
+            simulation.step()
+            writer.append(simulation.sheet, simulation.t)
+
+    _assert_same_history(path, simulation.history)
+
+
+def test_export_before_start_streams_the_run(
+    make_napari_viewer, qtbot, tmp_path
+):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=5)
+    path = tmp_path / "export.hf5"
+
+    widget.export_history(path)
+    assert widget.history_writer is not None
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    assert widget.history_writer is None
+    _assert_same_history(path, widget.history)
+
+    # exporting a finished run writes it at once
+    widget.export_history(tmp_path / "again.hf5")
+    assert widget.history_writer is None
+    _assert_same_history(tmp_path / "again.hf5", widget.history)
+
+
+def test_export_skips_steps_already_written(make_napari_viewer, tmp_path):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=2)
+    simulation = ShiftSimulation(stop=2)
+    simulation.start()
+    simulation.step()
+    widget.history = simulation.history
+    path = tmp_path / "export.hf5"
+
+    # Export clicked after step 1 was recorded, before the simulation
+    # thread exports it
+    widget.history_writer = HistoryWriter(path)
+    widget.history_writer.write_history(simulation.history)
+    widget._export(simulation.sheet, 1)
+    simulation.step()
+    widget._export(simulation.sheet, 2)
+    widget._finish_export()
+
+    _assert_same_history(path, simulation.history)
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+from tyssue import History
+
+from napari_tyssue._tests._simulations import ShiftSimulation
+from napari_tyssue import history as history_module
+from napari_tyssue.history import DeltaHistory, derived_columns
+
+
+def _assert_same_sheet(sheet, expected, columns):
+    # the Sheet constructor may add columns from the specs, only the
+    # recorded ones are compared
+    for element, df in expected.datasets.items():
+        actual = sheet.datasets[element]
+        np.testing.assert_array_equal(actual.index, df.index)
+        for column in columns[element]:
+            np.testing.assert_array_equal(actual[column], df[column])
+
+
+@pytest.mark.parametrize("keyframe_every", [1, 3, 10])
+def test_delta_history_retrieves_every_step(keyframe_every):
+    simulation = ShiftSimulation(stop=7)
+    simulation.keyframe_every = keyframe_every
+    simulation.start()
+    expected = History(simulation.sheet)
+    while not simulation.done:
+        simulation.step()
+        expected.record()
+
+    history = simulation.history
+    assert isinstance(history, DeltaHistory)
+    np.testing.assert_array_equal(history.time_stamps, expected.time_stamps)
+    for t in expected.time_stamps:
+        _assert_same_sheet(
+            history.retrieve(t), expected.retrieve(t), expected.columns
+        )
+
+
+def test_delta_history_stores_changed_columns_only():
+    simulation = ShiftSimulation(stop=20)
+    simulation.start()
+    while not simulation.done:
+        simulation.step()
+
+    history = simulation.history
+    full = sum(
+        df.memory_usage(index=True).sum()
+        for df in history.datasets.values()
+    )
+    assert history.nbytes < full / 2
+
+
+def test_delta_history_follows_topology_changes(sheet):
+    history = DeltaHistory(sheet, keyframe_every=10)
+    sheet.vert_df["x"] += 1.0
+    history.record()
+    # removing a face changes the rows of the face table
+    sheet.face_df = sheet.face_df.iloc[1:]
+    history.record()
+    removed = sheet.face_df.copy()
+    sheet.face_df["area"] += 1.0
+    history.record()
+
+    assert len(history.retrieve(0).face_df) == sheet.Nf + 1
+    np.testing.assert_array_equal(
+        history.retrieve(2).face_df.index, removed.index
+    )
+    np.testing.assert_allclose(
+        history.retrieve(3).face_df["area"], removed["area"] + 1.0
+    )
+
+    # a record at an existing time replaces the following ones
+    history.record(time_stamp=1)
+    assert len(history) == 2
+    np.testing.assert_allclose(
+        history.retrieve(1).face_df["area"], sheet.face_df["area"]
+    )
+
+
+def test_delta_history_recomputes_the_geometry():
+    simulation = ShiftSimulation(stop=20)
+    simulation.start()
+    expected = History(simulation.sheet)
+    while not simulation.done:
+        simulation.step()
+        expected.record()
+
+    history = simulation.history
+    assert "length" not in history.recorded_columns["edge"]
+    assert "length" in history.columns["edge"]
+    for t in expected.time_stamps:
+        sheet = history.retrieve(t)
+        for element, df in expected.retrieve(t).datasets.items():
+            for column in expected.columns[element]:
+                np.testing.assert_allclose(
+                    sheet.datasets[element][column], df[column]
+                )
+    # the geometry is not recorded between two keyframes
+    full = sum(
+        df.memory_usage(index=True).sum()
+        for df in expected.datasets.values()
+    )
+    assert history.nbytes < full / 5
+
+
+def test_derived_columns_are_probed_once(monkeypatch):
+    simulation = ShiftSimulation()
+    simulation.start()
+    sheet, geom = simulation.sheet, simulation.geom
+    history_module._derived_columns.clear()
+    derived = derived_columns(sheet, geom)
+    assert "length" in derived["edge"]
+    assert derived == history_module._probe_derived_columns(
+        sheet.copy(), geom
+    )
+
+    def probe(sheet, geom):
+        raise AssertionError("probed again")
+
+    monkeypatch.setattr(history_module, "_probe_derived_columns", probe)
+    other = ShiftSimulation()
+    other.start()
+    assert derived_columns(other.sheet, other.geom) == derived
+
+
+def test_delta_history_keeps_keyframes_only(sheet):
+    history = DeltaHistory(sheet, keyframe_every=2, keyframes_only=True)
+    for _ in range(4):
+        sheet.vert_df["x"] += 1.0
+        history.record()
+
+    np.testing.assert_array_equal(history.keyframe_times, [0, 2, 4])
+    assert history._records[1] is None
+    np.testing.assert_allclose(
+        history.retrieve(4).vert_df["x"], sheet.vert_df["x"]
+    )
+    # the steps between two keyframes are those of the keyframe before
+    np.testing.assert_allclose(
+        history.retrieve(3).vert_df["x"], sheet.vert_df["x"] - 2.0
+    )
@@ -0,0 +1,49 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Import time allowed for a widget module once napari is loaded, in seconds
+IMPORT_BUDGET = 0.5
+
+# These are only needed once a simulation runs
+HEAVY_MODULES = ["tyssue", "invagination", "pandas", "pooch", "IPython"]
+
+SCRIPT = """
+import json, sys, time
+import napari, napari.utils, qtpy.QtWidgets
+
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"duration": duration, "heavy": heavy}}))
+"""
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "napari_tyssue",
+        "napari_tyssue.apoptosis",
+        "napari_tyssue.invagination",
+        "napari_tyssue.sweep",
+    ],
+)
+def test_widget_import_is_cheap(module):
+    # a fresh interpreter, the test session has already imported everything
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            SCRIPT.format(module=module, heavy=HEAVY_MODULES),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+
+    assert result["heavy"] == []
+    assert result["duration"] < IMPORT_BUDGET
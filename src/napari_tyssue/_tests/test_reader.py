@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from tyssue.io.hdf5 import save_datasets
+
+from napari_tyssue import _reader
+from napari_tyssue._reader import HistoryFile, napari_get_reader
+from napari_tyssue._tests._simulations import ShiftSimulation
+from napari_tyssue.export import HistoryWriter
+
+
+def _write_history(path, stop=3):
+    simulation = ShiftSimulation(stop=stop)
+    simulation.start()
+    with HistoryWriter(path) as writer:
+        writer.write_history(simulation.history)
+        while not simulation.done:
+            simulation.step()
+            writer.append(simulation.sheet, simulation.t)
+    return simulation
+
+
+def test_get_reader_ignores_other_files(tmp_path):
+    assert napari_get_reader(str(tmp_path / "image.npy")) is None
+
+    # an HDF5 file without sheet datasets
+    path = tmp_path / "other.h5"
+    pd.DataFrame({"a": [1]}).to_hdf(path, key="a")
+    assert napari_get_reader(str(path)) is None
+
+
+def test_history_file_reads_one_timepoint(tmp_path):
+    path = tmp_path / "history.hf5"
+    simulation = _write_history(path)
+
+    history = HistoryFile(path)
+    assert len(history) == 4
+    sheet = history.retrieve(2)
+    np.testing.assert_allclose(
+        sheet.vert_df["x"].to_numpy(),
+        simulation.history.retrieve(2).vert_df["x"].to_numpy(),
+    )
+
+
+def test_reader_shows_history_lazily(make_napari_viewer, tmp_path):
+    viewer = make_napari_viewer()
+    path = str(tmp_path / "history.hf5")
+    _write_history(path)
+
+    reader = napari_get_reader(path)
+    assert reader is _reader.reader_function
+    assert reader(path) == [(None,)]
+
+    layer = viewer.layers["history.hf5"]
+    assert viewer.dims.range[0].stop == 3
+    x0 = layer.data[0][:, 0].copy()
+
+    # moving the slider rebuilds the mesh of that timepoint
+    viewer.dims.set_current_step(0, 2)
+    np.testing.assert_allclose(layer.data[0][:, 0], x0 + 20.0, rtol=1e-5)
+
+
+def test_reader_opens_datasets(sheet, tmp_path):
+    path = str(tmp_path / "sheet.hf5")
+    save_datasets(path, sheet)
+
+    [(data, kwargs, layer_type)] = napari_get_reader(path)(path)
+
+    vertices, faces, values = data
+    assert layer_type == "surface"
+    assert kwargs["name"] == "sheet.hf5"
+    assert faces.shape == (sheet.Ne, 3)
@@ -0,0 +1,249 @@
+import os
+
+import numpy as np
+
+from napari_tyssue._tests._simulations import (
+    RemoveFaceSimulation,
+    ShiftSimulation,
+)
+from napari_tyssue.apoptosis import ApoptosisSimulation, hexagonal_cylinder
+from napari_tyssue.invagination import constriction_events
+from napari_tyssue.simulation import (
+    ProcessSimulation,
+    WarmStartSolver,
+    append_events,
+)
+
+
+def test_simulation_records_every_step():
+    simulation = ShiftSimulation(stop=3)
+    simulation.start()
+    x0 = simulation.sheet.vert_df["x"].to_numpy().copy()
+
+    while not simulation.done:
+        simulation.step()
+
+    assert simulation.t == 3
+    assert len(simulation.history) == 4
+    np.testing.assert_allclose(simulation.sheet.vert_df["x"], x0 + 3)
+
+
+def test_process_simulation_mirrors_history():
+    simulation = ProcessSimulation(ShiftSimulation(stop=3))
+    simulation.start()
+    x0 = simulation.sheet.vert_df["x"].to_numpy().copy()
+
+    while not simulation.done:
+        simulation.step()
+    simulation.close()
+
+    assert simulation.t == 3
+    assert len(simulation.history) == 4
+    np.testing.assert_allclose(simulation.sheet.vert_df["x"], x0 + 3)
+    last = simulation.history.retrieve(3)
+    np.testing.assert_allclose(last.vert_df["x"], x0 + 3)
+
+
+def test_process_simulation_mirrors_topology_changes():
+    expected = RemoveFaceSimulation(stop=4)
+    expected.start()
+    while not expected.done:
+        expected.step()
+
+    simulation = ProcessSimulation(RemoveFaceSimulation(stop=4))
+    simulation.start()
+    while not simulation.done:
+        simulation.step()
+    simulation.close()
+
+    # only the changed columns were sent, the geometry is computed here
+    for element, df in expected.sheet.datasets.items():
+        mirror = simulation.sheet.datasets[element]
+        np.testing.assert_array_equal(mirror.index, df.index)
+        for column in expected.history.columns[element]:
+            np.testing.assert_allclose(mirror[column], df[column])
+    sheet = simulation.history.retrieve(4)
+    np.testing.assert_allclose(
+        sheet.edge_df["length"], expected.sheet.edge_df["length"]
+    )
+
+
+def test_process_simulation_can_be_stopped():
+    simulation = ProcessSimulation(ShiftSimulation(stop=1000))
+    simulation.start()
+    simulation.step()
+    simulation.close()
+
+    assert simulation.finished
+    assert not simulation._process.is_alive()
+
+
+def test_process_simulation_records_every_n_steps():
+    simulation = ProcessSimulation(ShiftSimulation(stop=5))
+    simulation.simulation.record_every = 2
+    simulation.start()
+    while not simulation.done:
+        simulation.step()
+    simulation.flush()
+    simulation.close()
+
+    np.testing.assert_array_equal(simulation.history.time_stamps, [0, 2, 4, 5])
+
+
+def test_warm_start_solver_reconverges_locally():
+    from tyssue import SheetGeometry as geom
+    from tyssue.dynamics.apoptosis_model import SheetApoptosisModel as model
+    from tyssue.solvers.quasistatic import QSSolver
+    from tyssue.stores import stores_dir
+
+    settings = {"options": {"ftol": 1e-9, "gtol": 1e-5}}
+    solver = WarmStartSolver(QSSolver(), rings=1)
+    sheet = ApoptosisSimulation()._relaxed_sheet(
+        os.path.join(stores_dir, "small_hexagonal.hf5"),
+        solver,
+        geom,
+        model,
+        settings,
+    )
+
+    # the solver stops on ftol, the gradient it left sets the tolerance
+    assert solver.tolerance > 1e-5
+    res = solver.find_energy_min(sheet, geom, model, **settings)
+    assert res["nit"] == 0
+    assert res["minimized_vertices"] == 0
+
+    active = sheet.vert_df.index[sheet.vert_df["is_active"] == 1]
+    sheet.vert_df.loc[active[len(active) // 2], "x"] += 0.5
+    res = solver.find_energy_min(sheet, geom, model, **settings)
+
+    assert 0 < res["minimized_vertices"] < len(active)
+    assert res["initial_gradient"] > solver.tolerance >= res["gradient"]
+    assert (sheet.vert_df["is_active"] == 1).sum() == len(active)
+
+
+def test_default_solver_is_not_warm_started():
+    from tyssue.solvers.quasistatic import QSSolver
+
+    simulation = ApoptosisSimulation()
+    simulation.start()
+    assert not isinstance(simulation.solver, WarmStartSolver)
+    while not simulation.done:
+        simulation.step()
+
+    expected = ApoptosisSimulation()
+    expected.start()
+    expected.solver = QSSolver()
+    while not expected.done:
+        expected.step()
+
+    coords = expected.sheet.coords
+    np.testing.assert_allclose(
+        simulation.sheet.vert_df[coords], expected.sheet.vert_df[coords]
+    )
+
+
+def test_append_events_matches_manager_append(sheet):
+    from invagination.delamination import constriction_rate
+    from tyssue.behaviors.event_manager import EventManager
+    from tyssue.behaviors.sheet.delamination_events import constriction
+
+    sheet.face_df["is_mesoderm"] = sheet.face_df["x"] > 0
+    sheet.face_df["id"] = sheet.face_df.index
+    sheet.settings["delamination"] = {"critical_area": 5}
+    events = constriction_events(sheet)
+    assert len(events) == sheet.face_df["is_mesoderm"].sum()
+
+    expected = EventManager("face")
+    batched = EventManager("face")
+    for manager in (expected, batched):
+        # already queued, the event is not appended again
+        manager.append(constriction, face_id=events[0]["face_id"])
+    for kwargs in events:
+        expected.append(constriction, **kwargs)
+
+    assert append_events(batched, constriction, events) == len(events) - 1
+    assert list(batched.next) == list(expected.next)
+    for _, kwargs in list(batched.next)[1:]:
+        x = sheet.face_df.loc[kwargs["face_id"], "x"]
+        assert kwargs["contract_rate"] == constriction_rate(
+            x, max_constriction_rate=1.32, k=0.19, w=25
+        )
+
+
+def test_hexagonal_cylinder_is_a_closed_sheet():
+    from tyssue import Sheet, SheetGeometry
+
+    sheet = Sheet("cylinder", hexagonal_cylinder(12, 8))
+    SheetGeometry.update_all(sheet)
+
+    assert sheet.Nf == 12 * 8
+    assert sheet.validate()
+    # every cell is an hexagon, facing outwards
+    np.testing.assert_array_equal(sheet.face_df["num_sides"], 6)
+    normals = sheet.edge_df[["nx", "ny"]].to_numpy()
+    centers = sheet.edge_df[["fx", "fy"]].to_numpy()
+    assert ((normals * centers).sum(axis=1) > 0).all()
+
+
+def test_rewind_restores_sheet_and_events():
+    simulation = ShiftSimulation(stop=6)
+    simulation.keyframe_every = 3
+    simulation.start()
+    x0 = simulation.sheet.vert_df["x"].to_numpy().copy()
+    simulation.step()
+    simulation.step()
+    simulation.inject("mark", [3])
+    clock = simulation.manager.clock
+    while not simulation.done:
+        simulation.step()
+    assert simulation.sheet.face_df.loc[3, "marked"]
+
+    assert simulation.rewind(3) == 3
+    np.testing.assert_allclose(simulation.sheet.vert_df["x"], x0 + 3)
+    np.testing.assert_array_equal(simulation.history.time_stamps, range(4))
+    assert simulation.checkpoints == [0, 3]
+    assert simulation.manager.clock == clock + 1
+    # the injected event is queued again, but not executed yet
+    assert not simulation.sheet.face_df["marked"].any()
+    queued = [kw.get("face_id") for _, kw in simulation.manager.current]
+    assert 3 in queued
+
+    while not simulation.done:
+        simulation.step()
+    assert simulation.t == 6
+    np.testing.assert_array_equal(simulation.history.time_stamps, range(7))
+    np.testing.assert_allclose(simulation.sheet.vert_df["x"], x0 + 6)
+    assert simulation.sheet.face_df.loc[3, "marked"]
+
+
+def test_rewind_goes_back_to_a_keyframe():
+    simulation = ShiftSimulation(stop=9)
+    simulation.record_every = 2
+    simulation.keyframe_every = 2
+    simulation.start()
+    while not simulation.done:
+        simulation.step()
+
+    # the keyframes are the records 0, 2 and 4
+    assert simulation.checkpoints == [0, 4, 8]
+    assert simulation.rewind(7) == 4
+    assert simulation.t == 4
+    np.testing.assert_array_equal(simulation.history.time_stamps, [0, 2, 4])
+
+
+def test_process_simulation_rewinds():
+    simulation = ProcessSimulation(ShiftSimulation(stop=1000))
+    simulation.simulation.keyframe_every = 1
+    simulation.start()
+    x0 = simulation.sheet.vert_df["x"].to_numpy().copy()
+    for _ in range(3):
+        simulation.step()
+
+    assert simulation.rewind(1) == 1
+    np.testing.assert_allclose(simulation.sheet.vert_df["x"], x0 + 1)
+    np.testing.assert_array_equal(simulation.history.time_stamps, [0, 1])
+
+    simulation.step()
+    simulation.close()
+    assert simulation.t == 2
+    np.testing.assert_allclose(simulation.sheet.vert_df["x"], x0 + 2)
@@ -0,0 +1,29 @@
+import os
+
+from napari_tyssue._tests._simulations import ShiftSimulation
+from napari_tyssue.sweep import SweepWidget, parameter_grid, run_sweep
+
+
+def test_parameter_grid():
+    grid = parameter_grid({"a": [1, 2], "b": ["x"]})
+    assert grid == [{"a": 1, "b": "x"}, {"a": 2, "b": "x"}]
+
+
+def test_sweep_archives_every_run(tmp_path, make_napari_viewer):
+    summary = run_sweep(
+        ShiftSimulation, {"stop": [1, 3]}, tmp_path, max_workers=2
+    )
+
+    assert list(summary["stop"]) == [1, 3]
+    assert list(summary["steps"]) == [1, 3]
+    assert (summary["error"] == "").all()
+    assert all(os.path.exists(path) for path in summary["path"])
+    assert os.path.exists(tmp_path / "summary.csv")
+
+    viewer = make_napari_viewer()
+    widget = SweepWidget(viewer)
+    widget.load(tmp_path)
+    assert widget.table.rowCount() == 2
+
+    widget.table.selectRow(1)
+    assert widget.display.layer.data[2].shape[0] == 4
@@ -0,0 +1,564 @@
+import queue
+
+import numpy as np
+import pytest
+
+from napari_tyssue._tests._simulations import (
+    RemoveFaceSimulation,
+    ShiftSimulation,
+)
+from napari_tyssue.tyssuewidget import (
+    LazyTimeSeriesSurface,
+    MeshIndices,
+    TimeSeriesMeshBuffer,
+    TopologyCache,
+    TyssueWidget,
+    edge_mesh,
+    vertex_points,
+    face_mesh_vertices,
+    mesh_values,
+    preview_mesh,
+    roi_mesh,
+    surface_mesh,
+)
+
+
+def _mesh(num_verts, num_faces, value):
+    vertices = np.full((num_verts, 3), value, dtype=np.float64)
+    faces = np.arange(num_faces * 3, dtype=np.uint32).reshape(-1, 3)
+    faces %= num_verts
+    values = np.full(num_verts, value, dtype=np.float64)
+    return vertices, faces, values
+
+
+def test_mesh_buffer_stacks_timepoints():
+    buffer = TimeSeriesMeshBuffer(capacity=4)
+
+    buffer.append(_mesh(5, 3, 1.0), 0)
+    buffer.append(_mesh(4, 2, 2.0), 1)
+
+    vertices, faces, values = buffer.data
+    assert len(buffer) == 2
+    assert vertices.shape == (9, 4)
+    np.testing.assert_array_equal(vertices[:5, 0], 0)
+    np.testing.assert_array_equal(vertices[5:, 0], 1)
+    np.testing.assert_array_equal(vertices[5:, 1:], 2.0)
+    # faces of the second timepoint index into its own vertices
+    assert faces.shape == (5, 3)
+    assert faces[3:].min() >= 5
+    np.testing.assert_array_equal(values[5:], 2.0)
+
+
+def test_mesh_buffer_grows_by_doubling():
+    buffer = TimeSeriesMeshBuffer(capacity=1)
+
+    for t in range(10):
+        buffer.append(_mesh(3, 1, t), t)
+
+    assert buffer._vertices.capacity == 32
+    assert buffer.data[0].shape == (30, 4)
+    np.testing.assert_array_equal(buffer.data[0][-3:, 0], 9)
+
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.data[0].shape == (0, 4)
+
+
+def test_mesh_buffer_truncate():
+    meshes = [_mesh(5, 3, 1.0), _mesh(4, 2, 2.0), _mesh(3, 1, 3.0)]
+    buffer = TimeSeriesMeshBuffer(capacity=2)
+    for t, mesh in enumerate(meshes):
+        buffer.append(mesh, t)
+
+    buffer.truncate(1)
+    buffer.append(meshes[2], 1)
+
+    expected = TimeSeriesMeshBuffer()
+    expected.append(meshes[0], 0)
+    expected.append(meshes[2], 1)
+    assert buffer.timepoints == [0, 1]
+    for actual, wanted in zip(buffer.data, expected.data):
+        np.testing.assert_array_equal(actual, wanted)
+
+
+def test_lazy_surface_rebuilds_current_timepoint(make_napari_viewer):
+    viewer = make_napari_viewer()
+    requested = []
+
+    def mesh_at(t):
+        requested.append(t)
+        return _mesh(5, 3, t)
+
+    display = LazyTimeSeriesSurface(viewer, mesh_at, cache_size=2)
+    for t in range(4):
+        display.show(t, num_timepoints=t + 1)
+
+    vertices, faces, values = display.layer.data
+    # only one mesh in the layer, but the time axis spans the whole run
+    assert vertices.shape == (5, 3)
+    assert values.shape == (4, 5)
+    assert viewer.dims.range[0].stop == 3
+
+    viewer.dims.set_current_step(0, 1)
+    assert display.current == 1
+    np.testing.assert_array_equal(display.layer.data[0], 1.0)
+
+    # t=3 is still cached, t=1 was evicted and had to be rebuilt
+    viewer.dims.set_current_step(0, 3)
+    assert requested == [0, 1, 2, 3, 1]
+
+
+def test_topology_cache_reuses_triangles(sheet):
+    cache = TopologyCache()
+    triangles = cache.triangles_for(sheet)
+    assert triangles.shape == (sheet.Ne, 3)
+
+    # moving vertices keeps the connectivity
+    sheet.vert_df["x"] += 1.0
+    assert cache.triangles_for(sheet) is triangles
+    assert cache.misses == 1
+
+    sheet.edge_df.loc[0, "face"] = sheet.edge_df.loc[1, "face"] + 1
+    assert cache.triangles_for(sheet) is not triangles
+    assert cache.misses == 2
+
+
+def test_face_mesh_vertices_matches_upcast_columns(sheet):
+    coords = ["x", "y", "z"]
+    epsilon = 0.1
+    up_face = sheet.edge_df[["f" + c for c in coords]].to_numpy()
+    up_srce = sheet.edge_df[["s" + c for c in coords]].to_numpy()
+    up_trgt = sheet.edge_df[["t" + c for c in coords]].to_numpy()
+    expected = np.concatenate(
+        [
+            sheet.face_df[coords].to_numpy(),
+            (up_srce - up_face) * (1 - epsilon) + up_face,
+            (up_trgt - up_face) * (1 - epsilon) + up_face,
+        ]
+    )
+
+    out = np.zeros((sheet.Nf + 2 * sheet.Ne, 3), dtype=np.float32)
+    mesh = face_mesh_vertices(sheet, coords, epsilon=epsilon, out=out)
+
+    assert mesh is out
+    np.testing.assert_allclose(mesh, expected, atol=1e-5)
+
+
+class _ShiftWidget(TyssueWidget):
+    def __init__(self, viewer, stop):
+        super().__init__(viewer)
+        self.stop = stop
+        # most tests look at the stacked timepoints
+        self.lazy_surface = False
+
+    def make_simulation(self):
+        return ShiftSimulation(stop=self.stop)
+
+
+def test_widget_without_simulation_does_nothing(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = TyssueWidget(viewer)
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+    assert widget.history is None
+    assert len(viewer.layers) == 0
+
+
+@pytest.mark.parametrize("use_process", [False, True])
+def test_frames_are_drained_on_main_thread(
+    make_napari_viewer, qtbot, use_process
+):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=5)
+    widget.use_process = use_process
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    assert widget.mesh_buffer.timepoints == [0, 1, 2, 3, 4, 5]
+    assert len(widget.history) == 6
+    assert widget.layer in viewer.layers
+    assert viewer.dims.current_step[0] == 5
+
+
+def test_full_frame_queue_drops_oldest_frame(make_napari_viewer, sheet):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=0)
+    widget.frame_queue = queue.Queue(maxsize=2)
+
+    for t in range(3):
+        widget._on_simulation_update(sheet, t)
+
+    assert widget.dropped_frames == 1
+    assert [frame[0] for frame in widget.frame_queue.queue] == [1, 2]
+
+
+@pytest.mark.parametrize("use_process", [False, True])
+def test_step_timings_are_recorded(
+    make_napari_viewer, qtbot, tmp_path, use_process
+):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=3)
+    widget.use_process = use_process
+    widget.record_timings = True
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    timer = widget.step_timer
+    records = timer.records()
+    assert [step["t"] for step in records] == [0, 1, 2, 3]
+    for step in records[1:]:
+        for phase in ("execute", "find_energy_min", "history_record"):
+            assert step[phase] >= 0
+        assert step["solver_iterations"] == 1
+        assert step["mesh_extraction"] >= 0
+    assert "layer_upload" in timer.summary(last=4)
+
+    timer.save(tmp_path / "timings.csv")
+    timer.save(tmp_path / "timings.json")
+    assert (tmp_path / "timings.csv").read_text().startswith(
+        "t,execute,find_energy_min,history_record,mesh_extraction"
+    )
+
+
+def test_timings_are_off_by_default(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=2)
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    assert widget.step_timer is None
+
+
+@pytest.mark.parametrize(
+    "color_by", [("face", "area"), ("edge", "length"), ("vert", "z")]
+)
+def test_mesh_values_follow_sheet_columns(sheet, color_by):
+    element, column = color_by
+    values = mesh_values(sheet, color_by)
+    assert values.shape == (sheet.Nf + 2 * sheet.Ne,)
+
+    edge_df = sheet.edge_df
+    if element == "face":
+        per_edge = sheet.upcast_face(sheet.face_df[column]).to_numpy()
+        face_values = sheet.face_df[column].to_numpy()
+    elif element == "edge":
+        per_edge = edge_df[column].to_numpy()
+        face_values = edge_df.groupby("face")[column].mean()
+        face_values = face_values.reindex(sheet.face_df.index).to_numpy()
+    else:
+        per_edge = sheet.upcast_srce(sheet.vert_df[column]).to_numpy()
+        face_values = edge_df.assign(v=per_edge).groupby("face")["v"].mean()
+        face_values = face_values.reindex(sheet.face_df.index).to_numpy()
+    np.testing.assert_allclose(values[: sheet.Nf], face_values, atol=1e-5)
+    np.testing.assert_allclose(
+        values[sheet.Nf : sheet.Nf + sheet.Ne], per_edge, atol=1e-5
+    )
+
+
+def test_color_by_only_updates_values(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=3)
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    vertices, faces, _ = widget.layer.data
+    widget.set_color_by(("face", "area"))
+
+    sheet = widget.history.retrieve(3)
+    assert widget.layer.data[0] is vertices
+    assert widget.layer.data[1] is faces
+    np.testing.assert_allclose(
+        widget.mesh_buffer.values_at(3), mesh_values(sheet, ("face", "area"))
+    )
+    low, high = widget.layer.contrast_limits
+    assert low == pytest.approx(sheet.face_df["area"].min(), rel=1e-5)
+
+
+def test_record_and_render_cadence(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=7)
+    widget.record_every = 2
+    widget.render_every = 3
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    # only recorded steps are shown, the last step is recorded and shown
+    np.testing.assert_array_equal(widget.history.time_stamps, [0, 2, 4, 6, 7])
+    assert widget.mesh_buffer.timepoints == [0, 6, 7]
+
+
+class _RemoveFaceWidget(_ShiftWidget):
+    def make_simulation(self):
+        return RemoveFaceSimulation(stop=self.stop)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_unrecorded_steps_are_not_rebuilt(make_napari_viewer, qtbot, lazy):
+    viewer = make_napari_viewer()
+    widget = _RemoveFaceWidget(viewer, stop=6)
+    widget.lazy_surface = lazy
+    widget.record_every = 5
+    widget.edge_color_by = "length"
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+    np.testing.assert_array_equal(widget.history.time_stamps, [0, 5, 6])
+
+    widget.set_color_by(("face", "area"))
+    sheet = widget.history.retrieve(5)
+    expected = mesh_values(sheet, ("face", "area"))
+    if lazy:
+        viewer.dims.set_current_step(0, 5)
+        np.testing.assert_allclose(
+            widget.lazy_display.layer.vertex_values[5], expected
+        )
+        # nothing was recorded at step 2
+        viewer.dims.set_current_step(0, 2)
+        assert not widget.lazy_display.layer.visible
+        assert not widget.edge_layer.visible
+        viewer.dims.set_current_step(0, 0)
+        assert widget.lazy_display.layer.visible
+    else:
+        assert widget.mesh_buffer.timepoints == [0, 5, 6]
+        np.testing.assert_allclose(widget.mesh_buffer.values_at(1), expected)
+        assert widget.edge_buffer.timepoints == [0, 5, 6]
+
+
+def test_preview_mesh_is_a_smaller_surface(sheet):
+    vertices, faces, values = preview_mesh(sheet, color_by=("face", "area"))
+    full_vertices, full_faces, _ = surface_mesh(sheet)
+
+    assert vertices.shape == (sheet.Nv, 3)
+    assert faces.shape == (sheet.Ne - 2 * sheet.Nf, 3)
+    assert len(faces) < len(full_faces)
+
+    def area(vertices, faces):
+        a, b, c = (vertices[faces[:, i]] for i in range(3))
+        return np.linalg.norm(np.cross(b - a, c - a), axis=1).sum() / 2
+
+    # the fans of the planar faces cover the same surface
+    assert area(vertices, faces) == pytest.approx(
+        area(full_vertices, full_faces), rel=0.05
+    )
+    areas = sheet.face_df["area"]
+    assert areas.min() - 1e-5 <= values.min() <= values.max() <= areas.max()
+
+
+def test_edge_mesh_draws_each_junction_once(sheet):
+    vectors, values = edge_mesh(sheet, ["x", "y", "z"], color_by="length")
+
+    edges = sheet.edge_df
+    junctions = {frozenset(pair) for pair in zip(edges["srce"], edges["trgt"])}
+    assert vectors.shape == (len(junctions), 2, 3)
+    np.testing.assert_allclose(
+        np.linalg.norm(vectors[:, 1], axis=1), values * 10, rtol=1e-4
+    )
+
+
+def test_junctions_are_buffered_like_the_surface(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=3)
+    widget.edge_color_by = "length"
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    assert widget.edge_buffer.timepoints == [0, 1, 2, 3]
+    # the layer only holds the junctions of the current timepoint
+    vectors = widget.edge_layer.data
+    assert vectors.shape[1:] == (2, 4)
+    np.testing.assert_array_equal(np.unique(vectors[:, 0, 0]), [3])
+    assert len(widget.edge_layer.features) == len(vectors)
+    viewer.dims.set_current_step(0, 1)
+    np.testing.assert_array_equal(
+        widget.edge_layer.data, widget.edge_buffer.at(1)[0]
+    )
+
+    widget.set_edge_color_by("line_tension")
+    assert widget.edge_buffer.timepoints == [0, 1, 2, 3]
+    np.testing.assert_array_equal(
+        widget.edge_layer.data, widget.edge_buffer.at(1)[0]
+    )
+    np.testing.assert_array_equal(
+        widget.edge_layer.features["value"], widget.edge_buffer.at(1)[1]
+    )
+
+    widget.set_edge_color_by(None)
+    assert widget.edge_layer is None
+    assert len(viewer.layers) == 1
+
+
+def test_vertex_points_features(sheet):
+    sheet.vert_df["is_active"] = 1
+    points, features = vertex_points(sheet, ["is_active", "radial_tension"])
+
+    assert points.shape == (sheet.Nv, 3)
+    np.testing.assert_array_equal(features["is_active"], 1)
+    np.testing.assert_array_equal(features["radial_tension"], 0)
+
+
+def test_vertices_are_updated_in_place(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=1)
+    widget.vertex_color_by = "is_active"
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    layer = widget.vertex_layer
+    points = layer.data
+    sheet = widget.history.retrieve(1)
+    widget._update_vertex_layer(vertex_points(sheet, widget.vertex_features))
+
+    assert widget.vertex_layer is layer
+    assert layer.data is points
+    np.testing.assert_allclose(
+        points[:, 0], sheet.vert_df["x"] * 10, rtol=1e-5
+    )
+    assert list(layer.features.columns) == ["is_active", "radial_tension"]
+
+    widget.set_vertex_color_by(None)
+    assert widget.vertex_layer is None
+
+
+@pytest.mark.parametrize("color_by", [None, ("face", "area"), ("vert", "z")])
+def test_roi_mesh_of_every_face_is_the_surface(sheet, color_by):
+    vertices, faces, values = roi_mesh(
+        sheet, np.arange(sheet.Nf), color_by=color_by
+    )
+    full_vertices, full_faces, full_values = surface_mesh(
+        sheet, color_by=color_by
+    )
+
+    def triangles(vertices, faces):
+        return np.sort(vertices[faces].reshape(len(faces), -1), axis=0)
+
+    np.testing.assert_allclose(
+        triangles(vertices, faces),
+        triangles(full_vertices, full_faces),
+        atol=1e-4,
+    )
+    if color_by is not None:
+        np.testing.assert_allclose(
+            np.sort(values), np.sort(full_values), atol=1e-5
+        )
+
+
+def test_roi_mesh_only_draws_the_region(sheet):
+    indices = MeshIndices(sheet)
+    mask = np.zeros(sheet.Nf, dtype=bool)
+    mask[[3, 7]] = True
+    region = indices.dilate(mask)
+
+    vertices, faces, _ = roi_mesh(
+        sheet, np.flatnonzero(region), indices=indices
+    )
+
+    assert region[[3, 7]].all() and region.sum() > 2
+    edges = sheet.edge_df["face"].isin(np.flatnonzero(region))
+    assert len(faces) == edges.sum()
+    assert faces.max() < len(vertices)
+
+
+def test_region_rebuilds_the_displayed_meshes(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=2)
+    widget.regions = {"first": lambda sheet, indices: np.arange(sheet.Nf) < 2}
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+    num_faces = len(widget.layer.data[1])
+
+    widget.set_region("first")
+    sheet = widget.history.retrieve(2)
+    drawn = (sheet.edge_df["face"] < 2).sum()
+    assert widget.mesh_buffer.timepoints == [0, 1, 2]
+    assert len(widget.layer.data[1]) == 3 * drawn < num_faces
+
+    widget.set_color_by(("face", "area"))
+    assert len(widget.mesh_buffer.values_at(2)) == len(
+        roi_mesh(sheet, [0, 1])[0]
+    )
+
+
+@pytest.mark.parametrize("use_process", [False, True])
+def test_queued_events_are_injected(make_napari_viewer, qtbot, use_process):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=3)
+    widget.use_process = use_process
+    widget.face_events = ShiftSimulation.face_events
+
+    widget.queue_event("mark", [3, 5])
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    marked = widget.history.retrieve(3).face_df["marked"]
+    assert marked[marked].index.tolist() == [3, 5]
+    assert widget.event_queue.empty()
+
+
+def test_clicked_face_is_picked(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=2)
+    widget.face_events = ShiftSimulation.face_events
+
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+    assert widget.layer.mouse_drag_callbacks[-1] == widget._on_surface_click
+
+    # look at the center of the faces from outside the cylinder
+    sheet = widget.history.retrieve(2)
+    axis = sheet.face_df[["x", "y", "z"]].mean().to_numpy() * [1, 1, 0]
+    for face in [7, 12]:
+        center = sheet.face_df.loc[face, ["x", "y", "z"]].to_numpy()
+        outward = (center - axis) * [1, 1, 0]
+        position = (2, *(center + outward) * 10)
+        direction = (0, *-outward)
+        assert widget.pick_face(position, direction, [1, 2, 3]) == face
+
+
+class _KeyframeWidget(_ShiftWidget):
+    def make_simulation(self):
+        simulation = super().make_simulation()
+        # every step can be rewound to
+        simulation.keyframe_every = 1
+        return simulation
+
+
+def test_paused_simulation_steps_and_rewinds(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = _KeyframeWidget(viewer, stop=6)
+    widget.edge_color_by = "length"
+
+    widget.pause()
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: widget.mesh_buffer.timepoints == [0])
+
+    widget.step_once()
+    widget.step_once()
+    qtbot.waitUntil(lambda: widget.mesh_buffer.timepoints == [0, 1, 2])
+    assert widget.thread.is_alive()
+
+    widget.rewind(1)
+    qtbot.waitUntil(lambda: widget.mesh_buffer.timepoints == [0, 1])
+    np.testing.assert_array_equal(widget.history.time_stamps, [0, 1])
+    assert widget.edge_buffer.timepoints == [0, 1]
+
+    widget.resume()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+    assert widget.mesh_buffer.timepoints == list(range(7))
+    assert widget.edge_buffer.timepoints == list(range(7))
+    np.testing.assert_array_equal(widget.history.time_stamps, range(7))
+
+    # a finished simulation continues from the rewound step
+    widget.rewind(3)
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+    assert widget.mesh_buffer.timepoints == list(range(7))
+    x0 = widget.history.retrieve(0).vert_df["x"]
+    np.testing.assert_allclose(widget.history.retrieve(6).vert_df["x"], x0 + 6)
@@ -0,0 +1,85 @@
+import numpy as np
+
+from napari_tyssue._reader import MeshSequence, napari_get_reader
+from napari_tyssue._tests.test_tyssuewidget import _ShiftWidget
+from napari_tyssue._writer import write_surface
+from napari_tyssue.tyssuewidget import (
+    LazyTimeSeriesSurface,
+    TimeSeriesMeshBuffer,
+    surface_mesh,
+)
+
+
+def _moved(mesh, dx):
+    vertices, faces, values = mesh
+    return vertices + dx, faces, values
+
+
+def test_write_surface_stores_topology_once_per_epoch(sheet, tmp_path):
+    mesh = surface_mesh(sheet)
+    buffer = TimeSeriesMeshBuffer()
+    for t in range(3):
+        buffer.append(_moved(mesh, t), t)
+    # a topology change starts a new epoch
+    vertices, faces, values = mesh
+    smaller = (vertices[:-1], faces[faces.max(axis=1) < len(vertices) - 1])
+    buffer.append(smaller + (values[:-1],), 3)
+
+    [path] = write_surface(str(tmp_path / "run"), buffer.data, {})
+
+    assert path.endswith(".npz")
+    with np.load(path) as npz:
+        np.testing.assert_array_equal(npz["epochs"], [0, 0, 0, 1])
+        assert npz["vertices_0"].shape == (3,) + vertices.shape
+        assert npz["vertices_0"].dtype == np.float32
+        # the values don't change within the epoch
+        assert npz["values_0"].shape == (1, len(values))
+
+    sequence = MeshSequence(path)
+    assert len(sequence) == 4
+    for t in range(3):
+        frame_vertices, frame_faces, frame_values = sequence.mesh_at(t)
+        np.testing.assert_allclose(frame_vertices, vertices + t, rtol=1e-6)
+        np.testing.assert_array_equal(frame_faces, faces)
+        np.testing.assert_allclose(frame_values, values, rtol=1e-6)
+    frame_vertices, frame_faces, _ = sequence.mesh_at(3)
+    np.testing.assert_array_equal(frame_faces, smaller[1])
+
+
+def test_lazy_surface_is_written_and_read_back(
+    make_napari_viewer, sheet, tmp_path
+):
+    viewer = make_napari_viewer()
+    mesh = surface_mesh(sheet)
+    display = LazyTimeSeriesSurface(viewer, lambda t: _moved(mesh, t))
+    display.show(4, num_timepoints=5)
+    # the layer state holds no reference to the display
+    _, meta, _ = display.layer.as_layer_data_tuple()
+    assert meta["metadata"] == {}
+
+    path = str(tmp_path / "lazy.npz")
+    display.layer.save(path, plugin="napari-tyssue")
+    viewer.layers.clear()
+    assert display not in LazyTimeSeriesSurface.displays.values()
+
+    napari_get_reader(path)(path)
+    layer = viewer.layers["lazy.npz"]
+    assert viewer.dims.range[0].stop == 4
+    viewer.dims.set_current_step(0, 3)
+    np.testing.assert_allclose(layer.data[0], mesh[0] + 3, rtol=1e-6)
+
+
+def test_lazy_surface_writes_recorded_steps_only(
+    make_napari_viewer, qtbot, tmp_path
+):
+    viewer = make_napari_viewer()
+    widget = _ShiftWidget(viewer, stop=5)
+    widget.lazy_surface = True
+    widget.record_every = 2
+    widget._on_start_click()
+    qtbot.waitUntil(lambda: not widget.render_timer.isActive(), timeout=30000)
+
+    path = str(tmp_path / "lazy.npz")
+    widget.lazy_display.layer.save(path, plugin="napari-tyssue")
+    with np.load(path) as npz:
+        np.testing.assert_array_equal(npz["times"], [0, 2, 4, 5])
@@ -1,33 +1,130 @@
 """
-This module is an example of a barebones writer plugin for napari.
+This module implements the writer of tyssue surface time series.
 
 It implements the Writer specification.
 see: https://napari.org/stable/plugins/guides.html?#writers
 
-Replace code below according to your needs.
+A surface time series is written as a mesh sequence in an ``.npz`` file.
+Consecutive timepoints with the same faces form a topology epoch, whose
+faces are stored once along with the float32 vertex positions of each of
+its timepoints:
+
+* ``format``: ``MESH_SEQUENCE_FORMAT``
+* ``times``: the time of each timepoint
+* ``epochs``: the epoch of each timepoint
+* ``faces_<e>``: (F, 3) faces of epoch ``e``
+* ``vertices_<e>``: (T_e, N, D) vertices of the timepoints of epoch ``e``
+* ``values_<e>``: (T_e, N) vertex values, or (1, N) when they don't change
+  during the epoch
+
+It is read back by ``_reader.py``.
 """
 from __future__ import annotations
 
 from typing import TYPE_CHECKING, Any, List, Sequence, Tuple, Union
 
+import numpy as np
+
 if TYPE_CHECKING:
     DataType = Union[Any, Sequence[Any]]
     FullLayerData = Tuple[DataType, dict, str]
 
+MESH_SEQUENCE_FORMAT = "napari-tyssue mesh sequence 1"
 
-def write_single_image(path: str, data: Any, meta: dict) -> List[str]:
-    """Writes a single image layer"""
 
-    # implement your writer logic here ...
+def iter_surface_frames(data, meta=None):
+    """
+    Yields the ``(t, (vertices, faces, values))`` timepoints of a surface.
 
-    # return path to any file(s) that were successfully written
-    return [path]
+    Layers displayed by a :class:`LazyTimeSeriesSurface` are read through
+    it, timepoint by timepoint, skipping those without a mesh (steps that
+    weren't recorded). Otherwise the vertices may have a leading time
+    column, as stacked by :class:`TimeSeriesMeshBuffer`.
+    """
+    from napari_tyssue.tyssuewidget import LazyTimeSeriesSurface
+
+    display = LazyTimeSeriesSurface.of_layer_data(data)
+    if display is not None:
+        for t in range(display.num_timepoints):
+            mesh = display.mesh_at(t)
+            if mesh is not None:
+                yield t, mesh
+        return
+
+    vertices, faces, values = data[:3]
+    values = np.asarray(values)
+    if values.ndim > 1:
+        values = values.reshape(-1, values.shape[-1])[-1]
+
+    if vertices.shape[1] == 3:
+        yield 0, (vertices, faces, values)
+        return
+
+    # Timepoints were appended in order, so are their vertices and faces
+    times = vertices[:, 0]
+    starts = np.flatnonzero(np.diff(times, prepend=np.nan) != 0)
+    stops = np.append(starts[1:], len(vertices))
+    face_frames = np.searchsorted(starts, faces[:, 0], side="right") - 1
+    face_counts = np.bincount(face_frames, minlength=len(starts))
+    face_stops = np.cumsum(face_counts)
+    face_starts = face_stops - face_counts
+    for start, stop, face_start, face_stop in zip(
+        starts, stops, face_starts, face_stops
+    ):
+        yield times[start], (
+            vertices[start:stop, 1:],
+            faces[face_start:face_stop] - start,
+            values[start:stop],
+        )
+
+
+def write_mesh_sequence(path, frames):
+    """
+    Writes the ``(t, (vertices, faces, values))`` frames to ``path``.
+    """
+    times = []
+    epochs = []
+    arrays = {}
+    faces = vertices = values = None
+
+    def close_epoch():
+        e = len(arrays) // 3
+        arrays[f"faces_{e}"] = faces
+        arrays[f"vertices_{e}"] = np.stack(vertices)
+        if all(np.array_equal(v, values[0]) for v in values[1:]):
+            values[1:] = []
+        arrays[f"values_{e}"] = np.stack(values)
+
+    for t, (frame_vertices, frame_faces, frame_values) in frames:
+        frame_faces = np.asarray(frame_faces, dtype=np.uint32)
+        if faces is None or not (
+            len(frame_vertices) == len(vertices[0])
+            and np.array_equal(frame_faces, faces)
+        ):
+            if faces is not None:
+                close_epoch()
+            faces, vertices, values = frame_faces, [], []
+
+        vertices.append(np.asarray(frame_vertices, dtype=np.float32))
+        values.append(np.asarray(frame_values, dtype=np.float32))
+        times.append(t)
+        epochs.append(len(arrays) // 3)
 
+    if faces is not None:
+        close_epoch()
 
-def write_multiple(path: str, data: List[FullLayerData]) -> List[str]:
-    """Writes multiple layers of different types."""
+    np.savez(
+        path,
+        format=MESH_SEQUENCE_FORMAT,
+        times=np.asarray(times, dtype=float),
+        epochs=np.asarray(epochs, dtype=np.int64),
+        **arrays,
+    )
 
-    # implement your writer logic here ...
 
-    # return path to any file(s) that were successfully written
+def write_surface(path: str, data: Any, meta: dict) -> List[str]:
+    """Writes a surface layer, e.g. a tyssue simulation, as a mesh sequence"""
+    if not path.endswith(".npz"):
+        path += ".npz"
+    write_mesh_sequence(path, iter_surface_frames(data, meta))
     return [path]
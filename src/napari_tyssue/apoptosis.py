@@ -5,43 +5,15 @@ This module was derived from https://github.com/DamCB/tyssue-demo, a MPLv2
 licensed project.
 """
 import logging
+import os
 import sys
-import pooch
 
-import napari
-
-import numpy as np
-
-# import vispy as vp
-
-import tyssue
-from tyssue import Sheet, History
-from tyssue import config
-
-from tyssue import SheetGeometry as geom
-from tyssue.dynamics.sheet_vertex_model import SheetModel as basemodel
-from tyssue.dynamics.apoptosis_model import SheetApoptosisModel as model
-from tyssue.solvers.quasistatic import QSSolver
-
-from tyssue.config.draw import sheet_spec
-from tyssue.utils.utils import spec_updater
-
-# from tyssue.draw.ipv_draw import _get_meshes
-# from tyssue.draw.vispy_draw import sheet_view, face_visual, edge_visual
-
-# from tyssue.draw import sheet_view, create_gif, browse_history
-from tyssue.io.hdf5 import save_datasets, load_datasets
+# tyssue is imported when a simulation is set up, to keep the plugin
+# quick to load
 
 # napari imports
 
-from qtpy.QtWidgets import QVBoxLayout, QPushButton, QWidget
-
 import napari
-from napari.utils import progress
-
-from threading import Thread
-
-from superqt.utils import ensure_main_thread
 
 LOGGER = logging.getLogger("napari_tyssue.ApoptosisWidget")
 
@@ -52,69 +24,154 @@ formatter = logging.Formatter(
 streamHandler.setFormatter(formatter)
 LOGGER.addHandler(streamHandler)
 
-from napari_tyssue.tyssuewidget import TyssueWidget, _get_meshes
+from napari_tyssue.cache import cached_state, fetch, state_key
+from napari_tyssue.simulation import TyssueSimulation, read_datasets
+from napari_tyssue.tyssuewidget import TyssueWidget
 
+DEMO_URL = (
+    "https://github.com/DamCB/tyssue-demo/raw/master/data/small_hexagonal.hf5"
+)
 
-# This widget wraps the apoptosis demo from tyssue.
+# Sheet sizes of the widget, ``size`` is the number of cells around and
+# along a generated cylinder, None for the 40 cells of the demo mesh
+SIZE_PRESETS = {
+    "small (40 cells)": {"size": None},
+    "medium (2k cells)": {"size": (40, 50)},
+    "large (10k cells)": {"size": (100, 100)},
+    "huge (53k cells)": {"size": (230, 230)},
+}
+
+# Part of the key of the cached relaxed sheets, increment it when the way
+# ``_relaxed_sheet`` prepares them changes
+PREPARATION_VERSION = 1
+
+
+def hexagonal_cylinder(n_around, n_along, side=2.6):
+    """
+    Datasets of a cylinder paved with ``n_around * n_along`` hexagonal
+    cells of edge length ``side``, like the demo mesh but of any size.
+
+    Returns the ``{"vert", "edge", "face"}`` datasets, the faces are
+    oriented outwards and the cylinder axis is ``z``.
+    """
+    import numpy as np
+    import pandas as pd
+
+    width = np.sqrt(3) * side
+    circumference = n_around * width
+    radius = circumference / (2 * np.pi)
+
+    # Cell centers on the unrolled cylinder, every other row is shifted
+    rows, columns = np.divmod(np.arange(n_around * n_along), n_around)
+    centers_u = (columns + 0.5 * (rows % 2)) * width
+    centers_z = (rows - (n_along - 1) / 2) * 1.5 * side
+
+    # The 6 corners of each cell, counterclockwise, merged with the corners
+    # of the neighboring cells on an integer grid
+    angles = np.pi / 6 + np.arange(6) * np.pi / 3
+    grid = 1000 / side
+    period = int(round(circumference * grid))
+    corners_u = np.rint(
+        (centers_u[:, None] + side * np.cos(angles)) * grid
+    ).astype(np.int64)
+    corners_z = np.rint(
+        (centers_z[:, None] + side * np.sin(angles)) * grid
+    ).astype(np.int64)
+    corners = np.stack([corners_u.ravel() % period, corners_z.ravel()], 1)
+    corners, verts = np.unique(corners, axis=0, return_inverse=True)
+    verts = verts.reshape(-1, 6)
+
+    def on_cylinder(u, z, name):
+        phi = 2 * np.pi * u / circumference
+        df = pd.DataFrame(
+            {"x": radius * np.cos(phi), "y": radius * np.sin(phi), "z": z}
+        )
+        df.index.name = name
+        return df
+
+    edge_df = pd.DataFrame(
+        {
+            "srce": verts.ravel(),
+            "trgt": np.roll(verts, -1, axis=1).ravel(),
+            "face": np.repeat(np.arange(len(verts)), 6),
+        }
+    )
+    edge_df.index.name = "edge"
+    return {
+        "vert": on_cylinder(
+            corners[:, 0] / grid, corners[:, 1] / grid, "vert"
+        ),
+        "edge": edge_df,
+        "face": on_cylinder(centers_u, centers_z, "face"),
+    }
+
+
+def apoptotic_region(sheet, indices, rings=2):
+    """
+    Face mask of the apoptotic cell and of its ``rings`` rings of
+    neighbors, the region of interest of the apoptosis widget.
+    """
+    is_apoptotic = sheet.face_df["is_apoptotic"].to_numpy(dtype=bool)
+    return indices.dilate(is_apoptotic, rings)
+
+
+# This simulation wraps the apoptosis demo from tyssue.
 # https://github.com/DamCB/tyssue-demo/blob/master/B-Apoptosis.ipynb
-class ApoptosisWidget(TyssueWidget):
-    def __init__(self, viewer: "napari.viewer.Viewer"):
-        super().__init__(viewer)
-
-        # tyssue model init
-
-        # The history stores simulation outputs
-        self.history = None
-
-        # Current timestep
-        self.t = 0
-
-        # This is the stop time of the simulation
-        self.stop = 100
-
-        # Add model parameters for config
-
-        # Setup the UI
-        self._init_buttons()
-
-        # Add a new callback for the timeslider
-
-    def start_simulation(self):
-        # Read pre-recorded datasets
+class ApoptosisSimulation(TyssueSimulation):
+    face_events = ("apoptosis",)
+
+    def __init__(
+        self,
+        stop=100,
+        apoptotic_cell=None,
+        use_cache=True,
+        size=None,
+        **apoptosis_settings,
+    ):
+        super().__init__(stop)
+
+        # Load the relaxed initial sheet from the local cache if possible
+        self.use_cache = use_cache
+
+        # The sheet is a generated cylinder of ``size = (around, along)``
+        # cells, or the demo mesh if None
+        self.size = size
+
+        # By default, cell 16 of the demo mesh or the middle cell of the
+        # generated cylinder
+        self.apoptotic_cell = apoptotic_cell
+
+        self.apoptosis_settings = {
+            "shrink_rate": 1.2,
+            "critical_area": 8.0,
+            "radial_tension": 0.2,
+            "contractile_increase": 0.3,
+            "contract_span": 2,
+        }
+        self.apoptosis_settings.update(apoptosis_settings)
 
-        h5store = pooch.retrieve(
-            url="https://github.com/DamCB/tyssue-demo/raw/master/data/small_hexagonal.hf5",
-            known_hash=None,
-            progressbar=True,
+    def setup(self):
+        import pooch
+        from tyssue import SheetGeometry as geom
+        from tyssue.dynamics.apoptosis_model import (
+            SheetApoptosisModel as model,
         )
+        from tyssue.solvers.quasistatic import QSSolver
+        from tyssue.stores import stores_dir
+
+        # Read pre-recorded datasets, from the local cache when possible,
+        # unless a cylinder is generated
+
+        h5store = None
+        if self.size is None:
+            h5store = fetch(
+                DEMO_URL,
+                "small_hexagonal.hf5",
+                # tyssue ships the same mesh, used when we are offline
+                fallback=os.path.join(stores_dir, "small_hexagonal.hf5"),
+            )
 
-        datasets = load_datasets(h5store, data_names=["face", "vert", "edge"])
-
-        # Corresponding specifications
-        specs = config.geometry.cylindrical_sheet()
-        sheet = Sheet("emin", datasets, specs)
-        sheet.sanitize(trim_borders=True, order_edges=True)
-
-        geom.update_all(sheet)
-
-        # Model
-        nondim_specs = config.dynamics.quasistatic_sheet_spec()
-        dim_model_specs = model.dimensionalize(nondim_specs)
-        sheet.update_specs(dim_model_specs)
-
-        sheet.get_opposite()
-        live_edges = sheet.edge_df[sheet.edge_df["opposite"] == -1].index
-        dead_src = sheet.edge_df.loc[live_edges, "srce"].unique()
-
-        ### Boundary conditions
-        sheet.vert_df.is_active = 1
-        sheet.vert_df.loc[dead_src, "is_active"] = 0
-
-        sheet.edge_df["is_active"] = sheet.upcast_srce(
-            "is_active"
-        ) * sheet.upcast_trgt("is_active")
-
-        # Energy minimization
+        # Energy minimization settings
 
         min_settings = {
             #    "minimize":{
@@ -123,13 +180,41 @@ class ApoptosisWidget(TyssueWidget):
         }
         solver = QSSolver()
 
-        res = solver.find_energy_min(sheet, geom, model, **min_settings)
-        LOGGER.info((res["success"]))
+        def relaxed_sheet():
+            return self._relaxed_sheet(
+                h5store, solver, geom, model, min_settings
+            )
+
+        if self.use_cache:
+            specs, model_specs = self._specs(model)
+            if h5store is None:
+                source = {"hexagonal_cylinder": self.size}
+            else:
+                source = pooch.file_hash(h5store)
+            key = state_key(
+                simulation="apoptosis",
+                preparation=PREPARATION_VERSION,
+                input=source,
+                specs=specs,
+                model_specs=model_specs,
+                model=model.labels,
+                min_settings=min_settings,
+            )
+            sheet = cached_state(key, relaxed_sheet)
+        else:
+            sheet = relaxed_sheet()
 
         # Choose apoptotic cell
-        # TODO this cell selection could be interactive
 
-        apoptotic_cell = 16
+        apoptotic_cell = self.apoptotic_cell
+        if apoptotic_cell is None and self.size is None:
+            apoptotic_cell = 16
+        elif apoptotic_cell is None:
+            # the cell closest to the middle of the cylinder, facing x
+            face_df = sheet.face_df
+            apoptotic_cell = (
+                face_df["z"].abs() + face_df["y"].abs() - face_df["x"]
+            ).idxmin()
         LOGGER.info(
             "Apoptotic cell position:\n{}".format(
                 sheet.face_df.loc[apoptotic_cell, sheet.coords]
@@ -148,121 +233,126 @@ class ApoptosisWidget(TyssueWidget):
 
         manager = EventManager("face")
 
-        sheet.settings["apoptosis"] = {
-            "shrink_rate": 1.2,
-            "critical_area": 8.0,
-            "radial_tension": 0.2,
-            "contractile_increase": 0.3,
-            "contract_span": 2,
-        }
+        sheet.settings["apoptosis"] = self.apoptosis_settings.copy()
 
         sheet.face_df["id"] = sheet.face_df.index.values
+        sheet.face_df["is_apoptotic"] = False
+        sheet.face_df.loc[apoptotic_cell, "is_apoptotic"] = True
         manager.append(
             apoptosis, face_id=apoptotic_cell, **sheet.settings["apoptosis"]
         )
 
-        # Run the simulation
-        self.t = 0
-
-        self.history = History(sheet)
-        self.running = True
-
-        self.viewer.dims.ndisplay = 3
+        self.sheet = sheet
+        self.manager = manager
+        self.solver = solver
+        self.geom = geom
+        self.model = model
+        self.min_settings = min_settings
 
-        # Progress indicator
-        with progress(total=self.stop) as pbr:
-            pbr.set_description("Starting simulation")
+    def face_event(self, event, face_ids):
+        """
+        Apoptosis of the faces of ids ``face_ids``, with the settings of the
+        first apoptotic cell.
+        """
+        if event != "apoptosis":
+            return super().face_event(event, face_ids)
 
-            # showing the activity dock so we can see the progress bars
-            # self.viewer.window._status_bar._toggle_activity_dock(True)
+        from tyssue.behaviors.sheet import apoptosis
 
-            while (
-                manager.current and self.t < self.stop and self.running == True
-            ):
-                manager.execute(sheet)                
-                res = solver.find_energy_min(
-                    sheet, geom, model, **min_settings
-                )
-                self.history.record()
-                manager.update()
+        face_df = self.sheet.face_df
+        face_df.loc[face_df["id"].isin(face_ids), "is_apoptotic"] = True
+        settings = self.sheet.settings["apoptosis"]
+        return apoptosis, [
+            dict(settings, face_id=face_id) for face_id in face_ids
+        ]
 
-                pbr.update(1)
-                pbr.set_description(f"Simulation step {self.t}")
-                self._on_simulation_update()
-                self.t += 1
+    @staticmethod
+    def _specs(model):
+        """
+        The geometry specs of the sheet and the dimensionalized specs of
+        ``model``.
+        """
+        from tyssue import config
 
-        color = sheet.vert_df["y"]
+        specs = config.geometry.cylindrical_sheet()
+        model_specs = model.dimensionalize(
+            config.dynamics.quasistatic_sheet_spec()
+        )
+        return specs, model_specs
 
-    @ensure_main_thread
-    def _on_simulation_update(self):
+    def _relaxed_sheet(self, h5store, solver, geom, model, min_settings):
         """
-        This function is called after every simulated timestep.
+        Builds the sheet and relaxes it before the first event.
         """
-        LOGGER.debug("ApoptosisWidget._on_simulation_update: timestep")
+        from tyssue import Sheet
 
-        specs_kw = {}
-        draw_specs = sheet_spec()
-        draw_specs["vert"]["visible"] = True
-        spec_updater(draw_specs, specs_kw)
-        coords = ["x", "y", "z"]
+        if h5store is None:
+            datasets = hexagonal_cylinder(*self.size)
+        else:
+            datasets = read_datasets(
+                h5store, data_names=["face", "vert", "edge"]
+            )
 
-        layer_name = "tyssue: apoptosis"
+        # Corresponding specifications
+        specs, model_specs = self._specs(model)
+        sheet = Sheet("emin", datasets, specs)
+        sheet.sanitize(trim_borders=True, order_edges=True)
 
-        vert_offset = 0
-        if layer_name in self.viewer.layers:
-            # Offset is # of vertices for all timepoints
-            vert_offset = self.viewer.layers[layer_name].data[0].shape[0]
+        geom.update_all(sheet)
 
-        sheet = self.history.retrieve(self.t)
-        meshes = _get_meshes(sheet, coords, draw_specs)
-        vertices, faces, values = meshes[0]
+        # Model
+        sheet.update_specs(model_specs)
 
-        LOGGER.info(
-            f"num_meshes = {len(meshes)} mesh: ({vertices.shape}, {faces.shape}, {values.shape})"
-        )
+        sheet.get_opposite()
+        live_edges = sheet.edge_df[sheet.edge_df["opposite"] == -1].index
+        dead_src = sheet.edge_df.loc[live_edges, "srce"].unique()
 
-        num_verts = vertices.shape[0]
+        ### Boundary conditions
+        sheet.vert_df.is_active = 1
+        sheet.vert_df.loc[dead_src, "is_active"] = 0
 
-        # Now we need to make the mesh into a timepoint
-        tp_vertices = np.concatenate(
-            (np.ones((num_verts, 1)) * self.t, vertices), axis=1
-        )
-        tp_faces = faces + vert_offset
-
-        # rho = np.linalg.norm(self.monolayer.vert_df[self.monolayer.coords], axis=1)
-        
-        # Use rho value for coloring
-        # values = np.asarray(sheet.vert_df["rho"])
-
-        # multichannel values test
-        #values = np.concatenate((values.reshape((1, num_verts)), values.reshape((1, num_verts))), axis=0)
-
-        try:
-            # if the layer exists, update the data
-            curr_verts, curr_faces, curr_values = self.viewer.layers[
-                layer_name
-            ].data
-
-            self.viewer.layers[layer_name].data = (
-                np.concatenate((curr_verts, tp_vertices), axis=0),
-                np.concatenate((curr_faces, tp_faces), axis=0),
-                # For multichannel
-                # np.concatenate((curr_values, values), axis=1),
-                np.concatenate((curr_values, values), axis=0),
-            )
+        sheet.edge_df["is_active"] = sheet.upcast_srce(
+            "is_active"
+        ) * sheet.upcast_trgt("is_active")
 
-            # Update timepoint that is displayed
-            self.viewer.dims.set_current_step(0, self.t)
-            
-        except KeyError:
-            # otherwise add it to the viewer
-            self.viewer.add_surface(
-                (tp_vertices, tp_faces, values),
-                colormap="viridis",
-                opacity=0.9,
-                contrast_limits=[0, 1],
-                name=layer_name,
-            )
+        # Energy minimization
+        res = solver.find_energy_min(sheet, geom, model, **min_settings)
+        LOGGER.info((res["success"]))
+        return sheet
+
+
+# This widget wraps the apoptosis demo from tyssue.
+# https://github.com/DamCB/tyssue-demo/blob/master/B-Apoptosis.ipynb
+class ApoptosisWidget(TyssueWidget):
+    size_presets = SIZE_PRESETS
+    regions = {"apoptotic neighborhood": apoptotic_region}
+    face_events = ApoptosisSimulation.face_events
+
+    def __init__(self, viewer: "napari.viewer.Viewer"):
+        super().__init__(viewer)
+
+        self.layer_name = "tyssue: apoptosis"
+
+        # tyssue model init
+
+        # The history stores simulation outputs
+        self.history = None
+
+        # Current timestep
+        self.t = 0
+
+        # This is the stop time of the simulation
+        self.stop = 100
+
+        # Add model parameters for config
+
+        # Setup the UI
+        self._init_buttons()
+
+        # Add a new callback for the timeslider
+
+    def make_simulation(self):
+        return ApoptosisSimulation(stop=self.stop, **self.size_settings())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,144 @@
+"""
+This module implements a local cache of the prepared initial sheets.
+
+Fetching the input mesh and relaxing it before the first event gives the
+same sheet for every run with the same inputs. The relaxed sheet is stored
+under a key derived from the input file hash, the specs and the solver
+settings, and later runs load it instead of recomputing it.
+
+The cache lives in the user cache directory, or in the directory given by
+the ``NAPARI_TYSSUE_CACHE`` environment variable, which can be bundled or
+pre-seeded to run offline. Downloaded input files are stored there too.
+"""
+import hashlib
+import json
+import logging
+import os
+from importlib.metadata import version
+from pathlib import Path
+
+import numpy as np
+
+LOGGER = logging.getLogger("napari_tyssue.cache")
+
+CACHE_ENV = "NAPARI_TYSSUE_CACHE"
+
+DATA_NAMES = ("vert", "edge", "face")
+
+
+def cache_dir():
+    """
+    Returns the cache directory, ``$NAPARI_TYSSUE_CACHE`` if it is set.
+    """
+    import pooch
+
+    return Path(os.environ.get(CACHE_ENV) or pooch.os_cache("napari-tyssue"))
+
+
+def fetch(url, fname, fallback=None):
+    """
+    Returns the local path of ``url``, downloading it to the cache if it
+    isn't there yet.
+
+    If the download fails (e.g. offline) and ``fallback`` is an existing
+    file, it is used instead.
+    """
+    import pooch
+
+    try:
+        return pooch.retrieve(
+            url=url,
+            known_hash=None,
+            fname=fname,
+            path=cache_dir(),
+            progressbar=True,
+        )
+    except Exception:
+        if fallback is None or not os.path.exists(fallback):
+            raise
+        LOGGER.warning("could not download %s, using %s", url, fallback)
+        return fallback
+
+
+def _jsonable(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, type) or callable(obj):
+        return f"{obj.__module__}.{obj.__qualname__}"
+    return repr(obj)
+
+
+def state_key(**parts):
+    """
+    Returns a digest of ``parts``, which should describe everything the
+    prepared sheet depends on (input file hash, specs, solver settings...).
+    The installed tyssue version is always part of the key.
+    """
+    parts = dict(parts, tyssue_version=version("tyssue"))
+    text = json.dumps(parts, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _state_path(key):
+    return cache_dir() / "states" / f"{key}.hf5"
+
+
+def load_state(key):
+    """
+    Returns the sheet cached under ``key``, or None.
+    """
+    import pandas as pd
+    from tyssue import Sheet
+
+    path = _state_path(key)
+    if not path.exists():
+        return None
+
+    with pd.HDFStore(path, mode="r") as store:
+        datasets = {name: store[name] for name in DATA_NAMES}
+        identifier, specs = json.loads(store.get_storer("vert").attrs.state)
+    sheet = Sheet(
+        identifier, {name: df.copy() for name, df in datasets.items()}, specs
+    )
+    # The constructor may add columns from the specs, restore the tables
+    # exactly as they were cached
+    for name, df in datasets.items():
+        sheet.datasets[name] = df
+    LOGGER.info("loaded initial state %s", key)
+    return sheet
+
+
+def save_state(key, sheet):
+    """
+    Stores ``sheet`` under ``key``.
+
+    The file is written next to its final location and moved in place, so
+    concurrent runs never read a partial state.
+    """
+    import pandas as pd
+
+    path = _state_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+    with pd.HDFStore(tmp_path, mode="w") as store:
+        for name in DATA_NAMES:
+            store.put(name, sheet.datasets[name])
+        store.get_storer("vert").attrs.state = json.dumps(
+            [sheet.identifier, sheet.specs], default=_jsonable
+        )
+    os.replace(tmp_path, path)
+
+
+def cached_state(key, build):
+    """
+    Returns the sheet cached under ``key``, calling ``build()`` to create
+    and cache it when it is missing.
+    """
+    sheet = load_state(key)
+    if sheet is None:
+        sheet = build()
+        save_state(key, sheet)
+    return sheet
@@ -0,0 +1,139 @@
+"""
+This module implements the streaming export of simulation histories.
+
+``HistoryWriter`` appends every recorded timestep to a compressed HDF5 file
+while the simulation runs, so a run can be checkpointed without waiting for
+its end, and nothing but the last flushed step is lost if it crashes.
+
+The file has the layout of ``tyssue.HistoryHdf5``: one table per element
+(``vert``, ``edge``, ``face``...) indexed by the element ids, with a
+``time`` data column. It can be reopened with
+``tyssue.HistoryHdf5.from_archive``.
+"""
+import logging
+import os
+
+import numpy as np
+
+from napari_tyssue.history import DeltaHistory
+
+LOGGER = logging.getLogger("napari_tyssue.export")
+
+
+class HistoryWriter:
+    """
+    Appends the timesteps of a simulation to an HDF5 file.
+
+    Parameters
+    ----------
+    path : str or Path
+        The HDF5 file, overwritten if it exists
+    complevel : int
+        Compression level, 0 disables compression
+    complib : str
+        Compression library, see ``pandas.HDFStore``
+    expected_steps : int
+        Expected number of timesteps, used by PyTables to size the chunks
+        of the tables
+    """
+
+    def __init__(
+        self, path, complevel=5, complib="blosc:zstd", expected_steps=1000
+    ):
+        self.path = os.fspath(path)
+        self.expected_steps = expected_steps
+
+        # Columns and dtypes of every element, fixed by the first timestep
+        self.dtypes = {}
+
+        # Last written time stamp
+        self.time = None
+
+        import pandas as pd
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._store = pd.HDFStore(
+            self.path, mode="w", complevel=complevel, complib=complib
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def closed(self):
+        return not self._store.is_open
+
+    def append(self, sheet, time):
+        """
+        Writes the datasets of ``sheet`` as the timestep ``time``.
+        """
+        self._append_datasets(sheet.datasets, time)
+        self._store.flush()
+
+    def write_history(self, history):
+        """
+        Writes the timesteps of ``history`` recorded after the last
+        written one, one table append per element (per timestep for a
+        ``DeltaHistory``).
+        """
+        if isinstance(history, DeltaHistory):
+            for time, datasets in history.iter_datasets(after=self.time):
+                self._append_datasets(datasets, time)
+            self._store.flush()
+            return
+
+        hist = history.datasets["vert"]
+        times = hist["time"].to_numpy()
+        if self.time is not None and times.max() <= self.time:
+            return
+
+        for element, hist in history.datasets.items():
+            if self.time is not None:
+                hist = hist[hist["time"] > self.time]
+            df = hist.set_index(element)
+            self._append(element, df, df["time"].to_numpy(dtype=float))
+        self.time = times.max()
+        self._store.flush()
+
+    def truncate(self, time):
+        """
+        Removes the timesteps written after ``time``, e.g. when the
+        simulation is rewound.
+        """
+        if self.time is None or self.time <= time:
+            return
+        for element in self.dtypes:
+            self._store.remove(element, where=f"time > {float(time)!r}")
+        self._store.flush()
+        self.time = time
+
+    def close(self):
+        if not self.closed:
+            self._store.close()
+            LOGGER.info("history written to %s", self.path)
+
+    def _append_datasets(self, datasets, time):
+        for element, df in datasets.items():
+            self._append(element, df, np.full(len(df), time, dtype=float))
+        self.time = time
+
+    def _append(self, element, df, times):
+        if element not in self.dtypes:
+            self.dtypes[element] = df.dtypes.drop("time", errors="ignore")
+            rows = len(df) * self.expected_steps
+        else:
+            rows = None
+
+        dtypes = self.dtypes[element]
+        # events may add columns, only the initial ones are recorded
+        df = df.reindex(columns=dtypes.index).astype(dtypes, copy=False)
+        df = df.assign(time=times)
+
+        kwargs = {"data_columns": ["time"], "expectedrows": rows}
+        if "segment" in df.columns:
+            kwargs["min_itemsize"] = {"segment": 8}
+        self._store.append(element, df, **kwargs)
@@ -0,0 +1,471 @@
+"""
+This module implements the delta encoded history of the simulations.
+
+``tyssue.History`` appends a full copy of every table at each step, although
+most columns (the topology, the cell parameters...) don't change between
+two steps. ``DeltaHistory`` only stores the columns that changed since the
+previous step, a table being stored whole when its rows change (topology
+changes) and every table being stored whole every ``keyframe_every`` steps.
+``retrieve(t)`` rebuilds a sheet from the nearest keyframe before ``t``, so
+it never replays more than ``keyframe_every - 1`` steps.
+
+Given the geometry of the simulation, the columns it computes from the
+others (edge lengths, normals, face areas...) are not recorded at all and
+are recomputed by ``geom.update_all`` when a sheet is rebuilt: most steps
+then only store the vertex positions.
+
+The simulation thread records while the viewer reads the history, the
+readers work on a snapshot of the records taken under a lock.
+"""
+import logging
+import threading
+
+import numpy as np
+
+LOGGER = logging.getLogger("napari_tyssue.history")
+
+
+def _same(a, b):
+    if a.dtype != b.dtype or a.shape != b.shape:
+        return False
+    if a.dtype.kind in "fc":
+        return np.array_equal(a, b, equal_nan=True)
+    return np.array_equal(a, b)
+
+
+# The derived columns by sheet type, geometry, columns and settings, see
+# ``derived_columns``
+_derived_columns = {}
+
+
+def derived_columns(sheet, geom):
+    """
+    Finds the columns of ``sheet`` that ``geom.update_all`` computes.
+
+    The probe runs ``update_all`` up to once per column, on a few faces of
+    the sheet, and only once for sheets of the same type, columns and
+    settings.
+
+    Returns
+    -------
+    derived : dict
+        The ``{element: set of columns}`` computed by the geometry
+    """
+    key = (
+        type(sheet),
+        geom,
+        tuple(
+            (element, tuple(sorted(zip(df.columns, map(str, df.dtypes)))))
+            for element, df in sorted(sheet.datasets.items())
+        ),
+        repr(sheet.settings),
+    )
+    if key not in _derived_columns:
+        _derived_columns[key] = _probe_derived_columns(
+            _small_sheet(sheet), geom
+        )
+    return {
+        element: set(columns)
+        for element, columns in _derived_columns[key].items()
+    }
+
+
+def _small_sheet(sheet, num_faces=8):
+    """
+    A sheet of the first ``num_faces`` faces of ``sheet``, with its edges
+    and vertices, reindexed from 0 as tyssue expects. ``sheet`` itself if
+    it is small already or has other tables.
+    """
+    import pandas as pd
+
+    if sheet.Nf <= num_faces or set(sheet.datasets) != {
+        "vert",
+        "edge",
+        "face",
+    }:
+        return sheet
+    faces = sheet.face_df.index[:num_faces]
+    edge_df = sheet.edge_df[sheet.edge_df["face"].isin(faces)].copy()
+    verts = pd.Index(np.unique(edge_df[["srce", "trgt"]].to_numpy()))
+    edge_df["srce"] = verts.get_indexer(edge_df["srce"])
+    edge_df["trgt"] = verts.get_indexer(edge_df["trgt"])
+    edge_df["face"] = faces.get_indexer(edge_df["face"])
+    datasets = {
+        "vert": sheet.vert_df.loc[verts],
+        "edge": edge_df,
+        "face": sheet.face_df.loc[faces],
+    }
+    for element, df in datasets.items():
+        datasets[element] = df.reset_index(drop=True)
+        datasets[element].index.name = element
+    return type(sheet)(sheet.identifier, datasets, sheet.specs)
+
+
+def _probe_derived_columns(sheet, geom):
+    """
+    A float column is derived when ``update_all`` fills it back once it was
+    set to NaN, along with every other derived column. The columns are first
+    cleared all at once, those that are not filled back (such as the
+    heights, computed from ``basal_shift``) are then cleared one at a time
+    with the derived ones: the edge unit vectors, computed from the
+    previous edge lengths, are not filled back and stay recorded.
+    """
+    candidates = {
+        element: [
+            column
+            for column in df.columns
+            if df[column].dtype.kind == "f"
+            and not (element == "vert" and column in sheet.coords)
+        ]
+        for element, df in sheet.datasets.items()
+    }
+
+    def filled(cleared):
+        probe = sheet.copy()
+        for element, columns in cleared.items():
+            probe.datasets[element][list(columns)] = np.nan
+        try:
+            geom.update_all(probe)
+        except Exception as e:
+            LOGGER.debug(f"update_all failed on the probe: {e}")
+            return {element: set() for element in cleared}
+        return {
+            element: {
+                column
+                for column in columns
+                if probe.datasets[element][column].notna().all()
+            }
+            for element, columns in cleared.items()
+        }
+
+    derived = filled(candidates)
+    for element, columns in candidates.items():
+        for column in columns:
+            if column in derived[element]:
+                continue
+            cleared = {e: set(c) for e, c in derived.items()}
+            cleared[element].add(column)
+            if column in filled(cleared)[element]:
+                derived[element].add(column)
+    return derived
+
+
+def column_deltas(datasets, columns, last, whole=False):
+    """
+    Computes the changes of the ``datasets`` tables since ``last``.
+
+    Parameters
+    ----------
+    datasets : dict
+        The ``{element: DataFrame}`` tables
+    columns : dict
+        The ``{element: columns}`` to compare
+    last : dict
+        The ``{element: (index, {column: array})}`` previous state of the
+        tables, empty at first, updated in place
+    whole : bool
+        If True every table is returned whole
+
+    Returns
+    -------
+    deltas : dict
+        The ``{element: (index, {column: array})}`` changes, the index is
+        None when the rows did not change and only the changed columns are
+        given, otherwise the table is given whole
+    """
+    deltas = {}
+    for element, element_columns in columns.items():
+        df = datasets[element]
+        previous = last.get(element)
+        if whole or previous is None or not df.index.equals(previous[0]):
+            # a new index, the table is stored whole
+            arrays = {
+                column: df[column].to_numpy(copy=True)
+                if column in df.columns
+                else np.full(len(df), np.nan)
+                for column in element_columns
+            }
+            deltas[element] = (df.index, arrays)
+            last[element] = (df.index, dict(arrays))
+            continue
+
+        last_arrays = previous[1]
+        delta = {}
+        for column in element_columns:
+            if column not in df.columns:
+                continue
+            values = df[column].to_numpy()
+            if not _same(values, last_arrays[column]):
+                delta[column] = last_arrays[column] = values.copy()
+        deltas[element] = (None, delta)
+    return deltas
+
+
+class DeltaHistory:
+    """
+    Records the time series of a sheet as column deltas.
+
+    It can be used in place of ``tyssue.History`` by the simulations and
+    the widgets: ``record``, ``retrieve``, ``time_stamps``, ``columns`` and
+    ``datasets`` behave the same.
+
+    Parameters
+    ----------
+    sheet : a :class:`tyssue.Sheet` object
+        The sheet to record, its columns are fixed by the first record
+    keyframe_every : int
+        Number of steps between two keyframes, where every table is stored
+        whole. Larger values use less memory, smaller values make
+        ``retrieve`` faster.
+    geom : a tyssue geometry class, optional
+        The geometry of the simulation, the columns it computes are not
+        recorded but recomputed when a sheet is rebuilt
+    keyframes_only : bool
+        If True only the keyframes are stored, ``retrieve`` returning the
+        keyframe before the other time stamps. Enough to rewind a
+        simulation whose full history is kept elsewhere.
+    """
+
+    def __init__(
+        self, sheet, keyframe_every=10, geom=None, keyframes_only=False
+    ):
+        self.sheet = sheet
+        self.keyframe_every = max(int(keyframe_every), 1)
+        self.geom = geom
+        self.keyframes_only = keyframes_only
+        self.columns = {
+            element: [c for c in df.columns if c != "time"]
+            for element, df in sheet.datasets.items()
+        }
+        derived = {}
+        if geom is not None:
+            derived = derived_columns(sheet, geom)
+        # The columns actually recorded
+        self.recorded_columns = {
+            element: [c for c in columns if c not in derived.get(element, ())]
+            for element, columns in self.columns.items()
+        }
+        self.time = 0.0
+
+        # One {element: (index, {column: array})} record per time stamp,
+        # index is None when the rows did not change since the previous one,
+        # the record is None between two keyframes with ``keyframes_only``
+        self._records = []
+        self._times = []
+        self._keyframes = []
+
+        # The last recorded state of each table, sharing its arrays with
+        # the records
+        self._last = {}
+
+        # Guards the lists of records, see ``_snapshot``
+        self._lock = threading.RLock()
+
+        self.record(time_stamp=0.0)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._times)
+
+    def __iter__(self):
+        for t, datasets in self.iter_datasets():
+            yield t, self._make_sheet(t, datasets)
+
+    @property
+    def time_stamps(self):
+        return np.asarray(self._times, dtype=float)
+
+    @property
+    def keyframe_times(self):
+        """The time stamps of the keyframes."""
+        with self._lock:
+            return [self._times[k] for k in self._keyframes]
+
+    @property
+    def nbytes(self):
+        """Memory used by the recorded arrays, in bytes."""
+        nbytes = 0
+        for record in self._records:
+            if record is None:
+                continue
+            for index, arrays in record.values():
+                if index is not None:
+                    nbytes += index.nbytes
+                nbytes += sum(array.nbytes for array in arrays.values())
+        return nbytes
+
+    def record(self, time_stamp=None):
+        """
+        Records the current state of the sheet.
+
+        Parameters
+        ----------
+        time_stamp : float, optional
+            The time of this record, the previous one plus 1 by default. A
+            record at the same time as the last one replaces it.
+        """
+        if time_stamp is not None:
+            self.time = time_stamp
+        elif self._times:
+            self.time += 1
+
+        if self._times and self._times[-1] >= self.time:
+            self.truncate(self.time)
+
+        keyframe = len(self._records) % self.keyframe_every == 0
+        record = None
+        if keyframe or not self.keyframes_only:
+            record = column_deltas(
+                self.sheet.datasets,
+                self.recorded_columns,
+                self._last,
+                whole=keyframe,
+            )
+
+        with self._lock:
+            if keyframe:
+                self._keyframes.append(len(self._records))
+            self._records.append(record)
+            self._times.append(self.time)
+
+    def truncate(self, time):
+        """
+        Forgets the records from ``time`` on.
+        """
+        with self._lock:
+            stop = int(np.searchsorted(self._times, time, side="left"))
+            if stop == len(self._times):
+                return
+            del self._records[stop:]
+            del self._times[stop:]
+            self._keyframes = [k for k in self._keyframes if k < stop]
+        self._last = {}
+        if stop:
+            for element, (index, arrays) in self._replay(stop - 1).items():
+                self._last[element] = (index, dict(arrays))
+
+    def retrieve(self, time):
+        """
+        Returns the sheet at the record closest to ``time``.
+        """
+        snapshot = self._snapshot()
+        times = np.asarray(snapshot[1], dtype=float)
+        i = int(np.argmin(np.abs(times - time)))
+        state = self._replay(i, snapshot)
+        return self._make_sheet(times[i], self._datasets(state))
+
+    def iter_datasets(self, after=None):
+        """
+        Yields the ``(time, datasets)`` of the records after ``after``.
+
+        The tables are indexed by the element ids, each record is replayed
+        from the previous one.
+        """
+        snapshot = self._snapshot()
+        records, times, _ = snapshot
+        start = 0
+        if after is not None:
+            start = int(np.searchsorted(times, after, side="right"))
+        if start >= len(times):
+            return
+        state = self._replay(start, snapshot)
+        yield times[start], self._datasets(state)
+        for i in range(start + 1, len(records)):
+            self._apply(state, records[i])
+            yield times[i], self._datasets(state)
+
+    @property
+    def datasets(self):
+        """
+        The records as ``tyssue.History`` tables, with an element id and a
+        ``time`` column.
+
+        They are built on each access, which takes as much memory as a
+        ``tyssue.History`` of the same simulation.
+        """
+        import pandas as pd
+
+        tables = {element: [] for element in self.columns}
+        for t, datasets in self.iter_datasets():
+            for element, df in datasets.items():
+                tables[element].append(df.reset_index().assign(time=t))
+        return {
+            element: pd.concat(dfs, ignore_index=True)
+            for element, dfs in tables.items()
+        }
+
+    def _snapshot(self):
+        """
+        The ``(records, times, keyframes)`` lists as of now. The records
+        themselves are never modified once appended, only the lists are.
+        """
+        with self._lock:
+            return (
+                list(self._records),
+                list(self._times),
+                list(self._keyframes),
+            )
+
+    def _replay(self, i, snapshot=None):
+        """
+        The ``{element: (index, {column: array})}`` state of record ``i``,
+        replayed from the keyframe before it.
+        """
+        if snapshot is None:
+            snapshot = self._snapshot()
+        records, _, keyframes = snapshot
+        k = keyframes[int(np.searchsorted(keyframes, i, side="right")) - 1]
+        state = {
+            element: (index, dict(arrays))
+            for element, (index, arrays) in records[k].items()
+        }
+        for record in records[k + 1 : i + 1]:
+            self._apply(state, record)
+        return state
+
+    @staticmethod
+    def _apply(state, record):
+        if record is None:
+            return
+        for element, (index, arrays) in record.items():
+            if index is not None:
+                state[element] = (index, dict(arrays))
+            else:
+                state[element][1].update(arrays)
+
+    def _datasets(self, state):
+        import pandas as pd
+
+        datasets = {}
+        for element, (index, arrays) in state.items():
+            df = pd.DataFrame(arrays, index=index.copy(), copy=True)
+            df.index.name = element
+            datasets[element] = df
+        if self.geom is not None:
+            sheet = self._make_sheet(0.0, datasets)
+            self.geom.update_all(sheet)
+            datasets = sheet.datasets
+            # update_all may overwrite recorded columns too (the edge unit
+            # vectors), those are put back as recorded
+            for element, (_, arrays) in state.items():
+                for column, array in arrays.items():
+                    datasets[element][column] = array
+        return {
+            element: df[self.columns[element]]
+            for element, df in datasets.items()
+        }
+
+    def _make_sheet(self, time, datasets):
+        return type(self.sheet)(
+            f"{self.sheet.identifier}_{time:04.3f}",
+            datasets,
+            self.sheet.specs,
+        )
@@ -5,109 +5,113 @@ This module was derived from https://github.com/suzannelab/invagination,
 a MPLv2 licensed project.
 """
 import logging
-from typing import TYPE_CHECKING
 
-import numpy as np
-
-# tyssue imports
-
-# import pandas as pd
-# import numpy as np
-# import json
-
-from IPython.display import display, Image
-
-import napari
-
-# import vispy as vp
-
-import tyssue
-from tyssue import Sheet, History
-from tyssue import config
-
-from tyssue import SheetGeometry as geom
-from tyssue.dynamics.sheet_vertex_model import SheetModel as basemodel
-from tyssue.dynamics.apoptosis_model import SheetApoptosisModel as model
-from tyssue.solvers.quasistatic import QSSolver
-
-from tyssue.config.draw import sheet_spec
-from tyssue.utils.utils import spec_updater
-
-# from tyssue.draw.ipv_draw import _get_meshes
-# from tyssue.draw.vispy_draw import sheet_view, face_visual, edge_visual
-
-# from tyssue.draw import sheet_view, create_gif, browse_history
-from tyssue.io.hdf5 import save_datasets, load_datasets
-
-from tyssue import Sheet, config
-from tyssue.io import hdf5
-
-# from tyssue.draw import sheet_view
-from tyssue.dynamics import effectors, model_factory
-
-from tyssue.generation import ellipsoid_sheet
-from tyssue.behaviors.event_manager import EventManager
-from tyssue.behaviors.sheet.delamination_events import constriction
-
-from tyssue.solvers.quasistatic import QSSolver
-from tyssue.geometry.sheet_geometry import EllipsoidGeometry as geom
-
-## The invagination module in this repository provides defintions
-## specific to mesoderm invagination
-
-from invagination.ellipsoid import initiate_ellipsoid, define_mesoderm
-from invagination.delamination import delamination_process, constriction_rate
-
-# from invagination.plots import mesoderm_position
-from invagination.ellipsoid import VitellineElasticity, RadialTension
+# tyssue and the invagination package are imported when a simulation is set
+# up, to keep the plugin quick to load
 
 # napari imports
 
-from qtpy.QtWidgets import QVBoxLayout, QPushButton, QWidget
-
 import napari
-from napari.utils import progress
-
-from threading import Thread
-
-from superqt.utils import ensure_main_thread
 
 LOGGER = logging.getLogger("napari_tyssue.Invagination")
 
-from napari_tyssue.tyssuewidget import TyssueWidget, _get_meshes
-
-
-# This widget wraps the invagination demo from tyssue.
+from napari_tyssue.cache import cached_state, state_key
+from napari_tyssue.simulation import TyssueSimulation, append_events
+from napari_tyssue.tyssuewidget import TyssueWidget
+
+
+# Sheet sizes of the widget: the ellipsoid and the mesoderm are scaled by
+# ``scale`` and the resolution with them, keeping the size of the cells
+SIZE_PRESETS = {
+    "small (180 cells)": {"scale": 1, "resolution": 13},
+    "medium (2.8k cells)": {"scale": 4, "resolution": 52},
+    "large (11k cells)": {"scale": 8, "resolution": 104},
+    "huge (55k cells)": {"scale": 18, "resolution": 234},
+}
+
+# Part of the key of the cached relaxed sheets, increment it when the way
+# ``_relaxed_sheet`` prepares them changes
+PREPARATION_VERSION = 1
+
+
+def constriction_events(sheet, max_traction=30, faces=None):
+    """
+    Keyword arguments of the constriction events of the ``faces`` (index
+    labels), the mesoderm faces by default.
+
+    The constriction rate of each face decreases away from the middle of
+    the mesoderm (``x = 0``), it is computed for all the faces at once. The
+    events refer to the faces by their ``id`` column if any.
+    """
+    from invagination.delamination import constriction_rate
+
+    face_df = sheet.face_df
+    if faces is None:
+        faces = face_df.index[face_df["is_mesoderm"].to_numpy(dtype=bool)]
+    face_ids = faces
+    if "id" in face_df.columns:
+        face_ids = face_df.loc[faces, "id"].to_numpy()
+    rates = constriction_rate(
+        face_df.loc[faces, "x"].to_numpy(),
+        max_constriction_rate=1.32,
+        k=0.19,
+        w=25,
+    )
+    settings = dict(
+        sheet.settings["delamination"],
+        current_traction=0,
+        max_traction=max_traction,
+    )
+    return [
+        dict(settings, face_id=face_id, contract_rate=rate)
+        for face_id, rate in zip(face_ids, rates)
+    ]
+
+
+def mesoderm_region(sheet, indices):
+    """
+    Face mask of the mesoderm, the region of interest of the invagination
+    widget.
+    """
+    return sheet.face_df["is_mesoderm"].to_numpy(dtype=bool)
+
+
+# This simulation wraps the invagination demo from tyssue.
 # https://github.com/DamCB/invagination/blob/master/notebooks/SmallEllipsoidInvagination.ipynb
-class InvaginationWidget(TyssueWidget):
-    def __init__(self, viewer: "napari.viewer.Viewer"):
-        super().__init__(viewer)
+class InvaginationSimulation(TyssueSimulation):
+    face_events = ("constriction",)
 
-        # tyssue model init
+    def __init__(
+        self,
+        stop=20,
+        contract_rate=2,
+        critical_area=5,
+        radial_tension=40,
+        use_cache=True,
+        resolution=13,
+        scale=1,
+    ):
+        super().__init__(stop)
 
-        # TODO check if tyssue was installed by conda, if not then fail for this simulation
-
-        # The history stores simulation outputs
-        self.history = None
+        # Load the relaxed initial sheet from the local cache if possible
+        self.use_cache = use_cache
 
-        # Current timestep
-        self.t = 0
+        # Number of cells along the ellipsoid height
+        self.resolution = resolution
 
-        # This is the stop time of the simulation
-        self.stop = 20
+        # Size of the ellipsoid and of the mesoderm, relative to the demo
+        self.scale = scale
 
-        self.contractility_rate = 2
-        self.critical_area = 5
-        self.radial_tension = 40
+        # Axes of the ovoid mesoderm
+        self.mesoderm = {"a": 15 * scale, "b": 6.0 * scale}
 
         self.settings = {
-            "contract_rate": self.contractility_rate,
-            "critical_area": self.critical_area,
-            "radial_tension": self.radial_tension,
+            "contract_rate": contract_rate,
+            "critical_area": critical_area,
+            "radial_tension": radial_tension,
             "nb_iteration": 10,
             "contract_neighbors": True,
             "contract_span": 1,
-            "geom": geom,
         }
 
         self.specs = {
@@ -128,7 +132,8 @@ class InvaginationWidget(TyssueWidget):
                 "line_tension": 0.0,
             },
             "settings": {
-                "abc": [12, 12, 21.0],  # Ellipsoid axes
+                # Ellipsoid axes
+                "abc": [12 * scale, 12 * scale, 21.0 * scale],
                 "geometry": "cylindrical",
                 "height_axis": "z",
                 "vitelline_space": 0.2,
@@ -136,30 +141,16 @@ class InvaginationWidget(TyssueWidget):
             },
         }
 
-        # Add model parameters for config
-
-        # Setup the UI
-        self._init_buttons()
-
-        # Add a new callback for the timeslider
+    def setup(self):
+        from tyssue.behaviors.event_manager import EventManager
+        from tyssue.behaviors.sheet.delamination_events import constriction
+        from tyssue.dynamics import effectors, model_factory
+        from tyssue.geometry.sheet_geometry import EllipsoidGeometry as geom
+        from tyssue.solvers.quasistatic import QSSolver
 
-    def start_simulation(self):
-        sheet = ellipsoid_sheet(*self.specs["settings"]["abc"], 13)
-        LOGGER.info(f"The sheet has {sheet.Nf} vertices")
-        sheet.update_specs(self.specs)
-
-        geom.update_all(sheet)
-
-        def draw_specs(sheet):
-            specs = {
-                "edge": {"visible": True, "color": sheet.vert_df.y},
-                "face": {
-                    "visible": True,
-                    "color": sheet.face_df.area,
-                    "colormap": "Blues",
-                },
-            }
-            return specs
+        ## The invagination module in this repository provides defintions
+        ## specific to mesoderm invagination
+        from invagination.ellipsoid import RadialTension, VitellineElasticity
 
         model = model_factory(
             [
@@ -172,15 +163,7 @@ class InvaginationWidget(TyssueWidget):
         )
 
         LOGGER.info("Our model has the following elements :")
-        LOGGER.info("\t", *model.labels, sep="\n\t")
-
-        # Modify some initial values
-        sheet.face_df["prefered_area"] = sheet.face_df["area"].mean()
-        sheet.settings["lumen_prefered_vol"] = 12666
-        sheet.settings["lumen_vol"] = 11626
-        sheet.settings["lumen_vol_elasticity"] = 1.0e-3
-
-        geom.update_all(sheet)
+        LOGGER.info("\t" + "\n\t".join(model.labels))
 
         # Gradient descent
 
@@ -190,15 +173,25 @@ class InvaginationWidget(TyssueWidget):
         }
 
         solver = QSSolver()
-        res = solver.find_energy_min(sheet, geom, model, **solver_kw)
-
-        LOGGER.info(res.message)
-        # fig, ax = sheet_view(sheet, coords=list("zx"), mode="quick")
 
-        # Define ovoid mesoderm
-        define_mesoderm(sheet, a=15, b=6.0)
+        def relaxed_sheet():
+            return self._relaxed_sheet(solver, geom, model, solver_kw)
+
+        if self.use_cache:
+            key = state_key(
+                simulation="invagination",
+                preparation=PREPARATION_VERSION,
+                specs=self.specs,
+                resolution=self.resolution,
+                scale=self.scale,
+                model=model.labels,
+                solver_kw=solver_kw,
+                mesoderm=self.mesoderm,
+            )
+            sheet = cached_state(key, relaxed_sheet)
+        else:
+            sheet = relaxed_sheet()
 
-        mesoderm = sheet.face_df[sheet.face_df.is_mesoderm].index
         delaminating_cells = sheet.face_df[sheet.face_df["is_mesoderm"]].index
         sheet.face_df["is_relaxation"] = False
         LOGGER.info(
@@ -207,15 +200,7 @@ class InvaginationWidget(TyssueWidget):
         # fig, axes = mesoderm_position(sheet, delaminating_cells)
 
         sheet.face_df["id"] = sheet.face_df.index.values
-        sheet.settings["delamination"] = self.settings
-
-        # Run the simulation
-        self.t = 0
-
-        self.history = History(sheet)
-        self.running = True
-
-        self.viewer.dims.ndisplay = 3
+        sheet.settings["delamination"] = dict(self.settings, geom=geom)
 
         delaminating_cells = []
         # Initiate manager
@@ -223,111 +208,134 @@ class InvaginationWidget(TyssueWidget):
         sheet.face_df["enter_in_process"] = 0
 
         # Add all cells in constriction process
-        for f in sheet.face_df[sheet.face_df["is_mesoderm"]].index:
-            x = sheet.face_df.loc[f, "x"]
-            c_rate = constriction_rate(
-                x, max_constriction_rate=1.32, k=0.19, w=25
-            )
+        append_events(manager, constriction, constriction_events(sheet))
 
-            delam_kwargs = sheet.settings["delamination"].copy()
-            delam_kwargs.update(
-                {
-                    "face_id": f,
-                    "contract_rate": c_rate,
-                    "current_traction": 0,
-                    "max_traction": 30,
-                }
-            )
-            manager.append(constriction, **delam_kwargs)
+        self.sheet = sheet
+        self.manager = manager
+        self.solver = solver
+        self.geom = geom
+        self.model = model
+        self.min_settings = solver_kw
 
-        # Progress indicator
-        with progress(total=self.stop) as pbr:
-            pbr.set_description("Starting simulation")
+    def face_event(self, event, face_ids):
+        """
+        Constriction of the faces of ids ``face_ids``, like the mesoderm
+        faces.
+        """
+        if event != "constriction":
+            return super().face_event(event, face_ids)
 
-            # showing the activity dock so we can see the progress bars
-            # self.viewer.window._status_bar._toggle_activity_dock(True)
+        from tyssue.behaviors.sheet.delamination_events import constriction
 
-            while (
-                manager.current and self.t < self.stop and self.running == True
-            ):            
+        face_df = self.sheet.face_df
+        faces = face_df.index[face_df["id"].isin(face_ids)]
+        return constriction, constriction_events(self.sheet, faces=faces)
 
-                # Clean radial tension on all vertices
-                sheet.vert_df["radial_tension"] = 0
-                manager.execute(sheet)
-                res = solver.find_energy_min(sheet, geom, model, **solver_kw)
-                self.history.record()
+    def _relaxed_sheet(self, solver, geom, model, solver_kw):
+        """
+        Builds the ellipsoid, relaxes it and defines the mesoderm.
+        """
+        from tyssue.generation import ellipsoid_sheet
 
-                manager.update()
-                manager.clock += 1
+        from invagination.ellipsoid import define_mesoderm
 
-                pbr.update(1)
-                pbr.set_description(f"Simulation step {self.t}")
-                self._on_simulation_update()
-                self.t += 1
+        abc = self.specs["settings"]["abc"]
+        sheet = ellipsoid_sheet(*abc, self.resolution)
+        LOGGER.info(f"The sheet has {sheet.Nf} vertices")
+        sheet.update_specs(self.specs)
 
-        color = sheet.vert_df["y"]
+        geom.update_all(sheet)
 
-    @ensure_main_thread
-    def _on_simulation_update(self):
-        """
-        This function is called after every simulated timestep.
-        """
-        LOGGER.debug("InvaginationWidget._on_simulation_update: timestep")
+        # Modify some initial values
+        sheet.face_df["prefered_area"] = sheet.face_df["area"].mean()
+        volume = self.scale**3
+        sheet.settings["lumen_prefered_vol"] = 12666 * volume
+        sheet.settings["lumen_vol"] = 11626 * volume
+        sheet.settings["lumen_vol_elasticity"] = 1.0e-3
 
-        specs_kw = {}
-        draw_specs = sheet_spec()
-        spec_updater(draw_specs, specs_kw)
-        coords = ["x", "y", "z"]
+        geom.update_all(sheet)
 
-        layer_name = "tyssue: invagination"
+        res = solver.find_energy_min(sheet, geom, model, **solver_kw)
 
-        vert_offset = 0
-        if layer_name in self.viewer.layers:
-            # Offset is # of vertices for all timepoints
-            vert_offset = self.viewer.layers[layer_name].data[0].shape[0]        
-        
-        sheet = self.history.retrieve(self.t)
-        meshes = _get_meshes(sheet, coords, draw_specs)
-        vertices, faces, values = meshes[0]
+        LOGGER.info(res.message)
+        # fig, ax = sheet_view(sheet, coords=list("zx"), mode="quick")
 
-        LOGGER.info(
-            f"num_meshes = {len(meshes)} mesh: ({vertices.shape}, {faces.shape}, {values.shape})"
-        )
+        # Define ovoid mesoderm
+        define_mesoderm(sheet, **self.mesoderm)
+        return sheet
+
+    def before_step(self):
+        # Clean radial tension on all vertices
+        self.sheet.vert_df["radial_tension"] = 0
+
+    def after_step(self):
+        self.manager.clock += 1
+
+
+# This widget wraps the invagination demo from tyssue.
+# https://github.com/DamCB/invagination/blob/master/notebooks/SmallEllipsoidInvagination.ipynb
+class InvaginationWidget(TyssueWidget):
+    size_presets = SIZE_PRESETS
+    regions = {"mesoderm": mesoderm_region}
+    face_events = InvaginationSimulation.face_events
 
-        num_verts = vertices.shape[0]
+    def __init__(self, viewer: "napari.viewer.Viewer"):
+        super().__init__(viewer)
+
+        self.layer_name = "tyssue: invagination"
+
+        # tyssue model init
+
+        # The history stores simulation outputs
+        self.history = None
 
-        # Now we need to make the mesh into a timepoint
-        tp_vertices = np.concatenate(
-            (np.ones((num_verts, 1)) * self.t, vertices), axis=1
+        # Current timestep
+        self.t = 0
+
+        # This is the stop time of the simulation
+        self.stop = 20
+
+        self.contractility_rate = 2
+        self.critical_area = 5
+        self.radial_tension = 40
+
+        # Number of cells along the ellipsoid height, set by the size preset
+        self.resolution = self.size_settings()["resolution"]
+
+        # Add model parameters for config
+
+        # Setup the UI
+        self._init_buttons()
+
+        # Add a new callback for the timeslider
+
+    def _init_buttons(self):
+        super()._init_buttons()
+
+        self.resolution_box = self._spin_box(
+            self.resolution, self._on_resolution_changed
+        )
+        # coarser ellipsoids don't make a closed sheet
+        self.resolution_box.setMinimum(4)
+        self.settings_form.addRow("Resolution", self.resolution_box)
+
+    def make_simulation(self):
+        settings = self.size_settings()
+        settings["resolution"] = self.resolution
+        return InvaginationSimulation(
+            stop=self.stop,
+            contract_rate=self.contractility_rate,
+            critical_area=self.critical_area,
+            radial_tension=self.radial_tension,
+            **settings,
         )
-        tp_faces = faces + vert_offset
-
-        try:
-            # if the layer exists, update the data
-            curr_verts, curr_faces, curr_values = self.viewer.layers[
-                layer_name
-            ].data
-
-            self.viewer.layers[layer_name].data = (
-                np.concatenate((curr_verts, tp_vertices), axis=0),
-                np.concatenate((curr_faces, tp_faces), axis=0),
-                # For multichannel
-                # np.concatenate((curr_values, values), axis=1),
-                np.concatenate((curr_values, values), axis=0),
-            )
 
-            # Update timepoint that is displayed
-            self.viewer.dims.set_current_step(0, self.t)
-            
-        except KeyError:
-            # otherwise add it to the viewer
-            self.viewer.add_surface(
-                (tp_vertices, tp_faces, values),
-                colormap="viridis",
-                opacity=0.9,
-                contrast_limits=[0, 1],
-                name=layer_name,
-            )
+    def _on_size_changed(self, label):
+        super()._on_size_changed(label)
+        self.resolution_box.setValue(self.size_settings()["resolution"])
+
+    def _on_resolution_changed(self, value):
+        self.resolution = value
 
 
 if __name__ == "__main__":
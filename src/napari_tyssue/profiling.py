@@ -0,0 +1,149 @@
+"""
+This module implements the per-step timing of the simulations.
+
+A ``StepTimer`` collects the wall time of each phase of a step (events,
+energy minimization, history recording, mesh extraction, layer upload) and
+the number of solver iterations, keyed by the timepoint the step produced.
+The simulations and the widget only time their phases when a timer is set,
+so nothing is measured when timing is disabled.
+"""
+import csv
+import json
+import threading
+import time
+
+import numpy as np
+
+# Phases in the order they happen during a step
+PHASES = (
+    "execute",
+    "find_energy_min",
+    "history_record",
+    "mesh_extraction",
+    "layer_upload",
+)
+
+
+class StepTimer:
+    """
+    Wall time (in seconds) of the phases of every simulation step.
+
+    The phases of a step may be recorded from several threads, e.g. the
+    simulation thread and the main thread for the layer upload.
+    """
+
+    def __init__(self):
+        # {t: {"t": t, phase: seconds, ...}}, in the order of the steps
+        self.steps = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __getstate__(self):
+        # timers are sent to the simulation process, without their lock
+        return {"steps": self.steps}
+
+    def __setstate__(self, state):
+        self.steps = state["steps"]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def now():
+        return time.perf_counter()
+
+    def lap(self, t, phase, start):
+        """
+        Adds the time elapsed since ``start`` to ``phase`` of step ``t``.
+
+        Returns the current time, the start of the next phase.
+        """
+        now = time.perf_counter()
+        self.add(t, phase, now - start)
+        return now
+
+    def add(self, t, phase, value):
+        """Adds ``value`` to ``phase`` of step ``t``."""
+        with self._lock:
+            step = self.steps.setdefault(t, {"t": t})
+            step[phase] = step.get(phase, 0) + value
+
+    def update(self, step):
+        """Merges the ``{"t": t, phase: value}`` record of a step."""
+        for phase, value in step.items():
+            if phase != "t":
+                self.add(step["t"], phase, value)
+
+    def records(self, last=None):
+        """
+        Returns the records of the steps, the ``last`` ones if given.
+        """
+        with self._lock:
+            records = [dict(step) for step in self.steps.values()]
+        if last is not None:
+            records = records[-last:]
+        return records
+
+    @property
+    def columns(self):
+        columns = {"t": None}
+        for step in self.records():
+            columns.update(dict.fromkeys(step))
+        phases = [phase for phase in PHASES if phase in columns]
+        others = [c for c in columns if c not in phases and c != "t"]
+        return ["t"] + phases + others
+
+    def summary(self, last=20):
+        """
+        Returns ``{column: mean}`` over the ``last`` steps.
+        """
+        summary = {}
+        records = self.records(last)
+        for column in self.columns[1:]:
+            values = [step[column] for step in records if column in step]
+            if values:
+                summary[column] = np.mean(values)
+        return summary
+
+    def summary_text(self, last=20):
+        """
+        Formats the summary of the ``last`` steps for the widget.
+        """
+        summary = self.summary(last)
+        if not summary:
+            return "No timings yet"
+        lines = [f"Mean over the last {min(last, len(self))} steps:"]
+        for column, value in summary.items():
+            if column in PHASES:
+                lines.append(f"{column}: {value * 1e3:.1f} ms")
+            else:
+                lines.append(f"{column}: {value:.3g}")
+        return "\n".join(lines)
+
+    def to_csv(self, path):
+        columns = self.columns
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(self.records())
+
+    def to_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.records(), f, indent=1)
+
+    def save(self, path):
+        """Writes the timings as JSON or CSV, depending on ``path``."""
+        if str(path).endswith(".json"):
+            self.to_json(path)
+        else:
+            self.to_csv(path)
+
+    def truncate(self, t):
+        """Forgets the steps after ``t``."""
+        with self._lock:
+            for step in [step for step in self.steps if step > t]:
+                del self.steps[step]
+
+    def clear(self):
+        with self._lock:
+            self.steps.clear()
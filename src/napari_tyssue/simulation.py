@@ -0,0 +1,701 @@
+"""
+This module implements the headless simulation drivers used by the widgets.
+
+A simulation owns the tyssue objects (sheet, event manager, solver) and the
+History of a run, and advances one timestep at a time so that the widgets
+only have to display it. ``ProcessSimulation`` runs any simulation in a
+separate process and mirrors its sheet and history in this one, from the
+columns that changed at each step.
+
+Every keyframe of the history is also a checkpoint of the event manager,
+so that ``rewind(t)`` can restore the sheet from the history and the
+events from the checkpoint, and the run continue from there.
+"""
+import copy
+import logging
+import multiprocessing
+import traceback
+
+import numpy as np
+
+from napari_tyssue.history import DeltaHistory, column_deltas
+from napari_tyssue.profiling import StepTimer
+
+LOGGER = logging.getLogger("napari_tyssue.simulation")
+
+
+def read_datasets(h5store, data_names=("face", "vert", "edge")):
+    """
+    Reads sheet datasets from an HDF5 file opened read only.
+
+    Unlike ``tyssue.io.hdf5.load_datasets``, this doesn't take a write lock
+    on the file, so several simulation processes can read the same input.
+    """
+    import pandas as pd
+
+    with pd.HDFStore(h5store, mode="r") as store:
+        return {name: store[name] for name in data_names if name in store}
+
+
+def _vertex_gradient(sheet, geom, model):
+    """
+    Largest absolute gradient component of each vertex, in the order of
+    ``sheet.vert_df``.
+    """
+    geom.update_all(sheet)
+    grad = model.compute_gradient(sheet).reindex(sheet.vert_df.index)
+    return np.abs(grad.to_numpy()).max(axis=1)
+
+
+def _active(sheet):
+    return sheet.vert_df["is_active"].to_numpy().astype(bool)
+
+
+def _neighborhood(sheet, mask, rings):
+    """
+    Extends the vertex ``mask`` to the vertices ``rings`` edges away.
+    """
+    index = sheet.vert_df.index
+    srce = index.get_indexer(sheet.edge_df["srce"])
+    trgt = index.get_indexer(sheet.edge_df["trgt"])
+    mask = mask.copy()
+    for _ in range(rings):
+        grown = mask.copy()
+        grown[trgt[mask[srce]]] = True
+        grown[srce[mask[trgt]]] = True
+        mask = grown
+    return mask
+
+
+def _event_element(kwargs, default=None):
+    return kwargs.get("face_id", kwargs.get("elem_id", default))
+
+
+def append_events(manager, behavior, events):
+    """
+    Appends ``behavior`` events to the next deque of ``manager`` at once.
+
+    This is the same as ``manager.append(behavior, **kwargs)`` for the
+    keyword arguments of each of the ``events``, which skips the events
+    whose element already has a ``behavior`` event queued (unless
+    ``unique`` is False), but the queued events are only scanned once
+    instead of once per appended event.
+
+    Returns the number of appended events.
+    """
+    name = behavior.__name__
+    queued = {
+        (queued_behavior.__name__, _event_element(kwargs))
+        for queued_behavior, kwargs in manager.next
+    }
+    appended = []
+    for kwargs in events:
+        key = (name, _event_element(kwargs, -1))
+        if kwargs.get("unique", True) and key in queued:
+            continue
+        queued.add(key)
+        appended.append((behavior, kwargs))
+    manager.next.extend(appended)
+    return len(appended)
+
+
+class WarmStartSolver:
+    """
+    Wraps a quasistatic solver to reconverge nearly relaxed sheets quickly.
+
+    The positions of the previous step are already the starting point of
+    ``QSSolver``, so most steps only have a few vertices out of equilibrium,
+    around the faces changed by the events. The solver usually stops on its
+    ``ftol`` criterion, with gradients well above ``gtol``: the largest
+    gradient component left by the last full minimization, times ``slack``,
+    is kept as the ``tolerance`` of the following steps (or ``gtol`` if
+    larger).
+
+    Before minimizing, the gradient of the active vertices (``is_active``)
+    is computed:
+
+    * if it is within the tolerance, the sheet is considered relaxed and
+      the minimization is skipped;
+    * otherwise, if ``rings`` is set, only the vertices ``rings`` edges
+      away from the vertices out of equilibrium are minimized first; if the
+      solver converged and the other vertices are still within the
+      tolerance the step is done;
+    * else the whole sheet is minimized.
+
+    tyssue computes the energy of the whole sheet at every iteration, so
+    the local minimization only pays off when it needs fewer iterations
+    than the full one, e.g. for localized events on large sheets; it is
+    disabled by default.
+
+    The tolerance is a heuristic, not a convergence criterion: the skipped
+    steps are left short of the minimum the solver would have found, so the
+    vertex positions drift from those of the solver itself. The simulations
+    only use it when their ``warm_start`` is set.
+
+    The returned result reports the convergence of the step: ``nit`` (the
+    iterations of both minimizations), ``initial_gradient`` and
+    ``gradient`` (largest gradient component before and after) and
+    ``minimized_vertices``.
+    """
+
+    def __init__(self, solver, rings=None, slack=2.0):
+        self.solver = solver
+        self.rings = rings
+        self.slack = slack
+        self.tolerance = None
+        self.res = None
+
+    def __getattr__(self, name):
+        if name == "solver":
+            raise AttributeError(name)
+        return getattr(self.solver, name)
+
+    def find_energy_min(self, sheet, geom, model, periodic=False, **settings):
+        if periodic:
+            return self.solver.find_energy_min(
+                sheet, geom, model, periodic=True, **settings
+            )
+        from tyssue import config
+
+        options = config.solvers.quasistatic().get("options", {})
+        gtol = dict(options, **settings.get("options", {})).get("gtol", 1e-5)
+
+        active = _active(sheet)
+        gradient = _vertex_gradient(sheet, geom, model)
+        initial = gradient[active].max(initial=0.0)
+        res = {"success": True, "nit": 0, "message": "Already relaxed"}
+        minimized = 0
+
+        relaxed = False
+        if self.tolerance is not None:
+            tolerance = max(gtol, self.tolerance)
+            relaxed = initial <= tolerance
+            if not relaxed and self.rings is not None:
+                res, minimized, gradient, relaxed = self._minimize_locally(
+                    sheet, geom, model, gradient, tolerance, settings
+                )
+                active = _active(sheet)
+
+        if not relaxed:
+            nit = res.get("nit", 0)
+            res = self.solver.find_energy_min(sheet, geom, model, **settings)
+            res["nit"] = res.get("nit", 0) + nit
+            minimized = int(active.sum())
+            gradient = _vertex_gradient(sheet, geom, model)
+            active = _active(sheet)
+            self.tolerance = gradient[active].max(initial=0.0) * self.slack
+
+        res = dict(res)
+        res["initial_gradient"] = float(initial)
+        res["gradient"] = float(gradient[active].max(initial=0.0))
+        res["minimized_vertices"] = minimized
+        LOGGER.debug(
+            "energy minimization: %d iterations on %d vertices, gradient "
+            "%.2g -> %.2g",
+            res["nit"],
+            minimized,
+            res["initial_gradient"],
+            res["gradient"],
+        )
+        self.res = res
+        return res
+
+    def _minimize_locally(
+        self, sheet, geom, model, gradient, tolerance, settings
+    ):
+        """
+        Minimizes around the vertices out of equilibrium.
+
+        Returns the result of the solver, the number of minimized vertices,
+        the gradient of the vertices and whether the sheet is relaxed.
+        """
+        active = _active(sheet)
+        local = active & _neighborhood(
+            sheet, gradient > tolerance, self.rings
+        )
+        if local.sum() == active.sum():
+            return {"nit": 0}, 0, gradient, False
+
+        res = self._minimize_vertices(sheet, geom, model, local, settings)
+        gradient = _vertex_gradient(sheet, geom, model)
+        # the minimized vertices converged according to the solver, the
+        # others must not have been pushed out of equilibrium; a topology
+        # change calls for a full minimization
+        relaxed = False
+        if res["success"] and len(gradient) == len(local):
+            frozen = active & ~local
+            relaxed = gradient[frozen].max(initial=0.0) <= tolerance
+        return res, int(local.sum()), gradient, relaxed
+
+    def _minimize_vertices(self, sheet, geom, model, mask, settings):
+        """Minimizes with only the vertices of ``mask`` active."""
+        is_active = sheet.vert_df["is_active"].copy()
+        sheet.vert_df["is_active"] = mask.astype(is_active.dtype)
+        try:
+            return self.solver.find_energy_min(sheet, geom, model, **settings)
+        finally:
+            # the solver may have changed the topology, new vertices are
+            # active
+            sheet.vert_df["is_active"] = is_active.reindex(
+                sheet.vert_df.index, fill_value=1
+            ).astype(is_active.dtype)
+
+
+class TyssueSimulation:
+    """
+    Base class of the simulations run by the widgets.
+
+    Subclasses implement ``setup`` which has to create ``sheet``,
+    ``manager``, ``solver``, ``geom``, ``model`` and ``min_settings``;
+    ``before_step`` and ``after_step`` can be overridden to modify the
+    sheet around the events and the energy minimization. The events of
+    ``face_events`` can be added to a running simulation with ``inject``,
+    they are built by ``face_event``. ``rewind`` goes back to a recorded
+    step, the run continues from there.
+    """
+
+    # Names of the events that can be injected on faces
+    face_events = ()
+
+    def __init__(self, stop=100):
+        # This is the stop time of the simulation
+        self.stop = stop
+
+        # Current timestep
+        self.t = 0
+
+        self.sheet = None
+        self.manager = None
+        self.solver = None
+        self.geom = None
+        self.model = None
+        self.min_settings = {}
+
+        # The history stores simulation outputs, as column deltas with
+        # every table stored whole every ``keyframe_every`` steps
+        self.history = None
+        self.keyframe_every = 10
+
+        # When True the history only keeps its keyframes, enough to rewind
+        # when the full history is kept elsewhere (see ProcessSimulation)
+        self.keyframes_only = False
+
+        # Only the steps multiple of ``record_every`` are recorded, and the
+        # last one by ``flush``
+        self.record_every = 1
+
+        # When True the solver is wrapped in a WarmStartSolver, which is
+        # faster but skips the steps that are nearly relaxed: the results
+        # differ from those of the solver itself
+        self.warm_start = False
+
+        # Result of the last energy minimization
+        self.res = None
+
+        # Optional StepTimer recording the time spent in each phase
+        self.timer = None
+
+        # {t: (current, next, clock)} state of the event manager at each
+        # keyframe of the history, the steps ``rewind`` can go back to
+        self._checkpoints = {}
+
+    def setup(self):
+        """
+        OVERRIDE This method.
+
+        Creates the initial sheet, the event manager and the solver.
+        """
+        LOGGER.debug("TyssueSimulation.setup: not implemented")
+
+    def start(self):
+        """
+        Sets the simulation up and starts recording its history.
+        """
+        self.setup()
+        if self.sheet is None:
+            # nothing to simulate, ``done`` is True
+            return
+        if self.warm_start and self.model is not None:
+            self.solver = WarmStartSolver(self.solver)
+        self.t = 0
+        self.history = DeltaHistory(
+            self.sheet,
+            keyframe_every=self.keyframe_every,
+            geom=self.geom,
+            keyframes_only=self.keyframes_only,
+        )
+        self._checkpoints = {}
+        self._checkpoint()
+
+    @property
+    def done(self):
+        return (
+            self.manager is None
+            or not self.manager.current
+            or self.t >= self.stop
+        )
+
+    @property
+    def checkpoints(self):
+        """The timesteps ``rewind`` can go back to."""
+        return sorted(self._checkpoints)
+
+    def face_event(self, event, face_ids):
+        """
+        OVERRIDE This method to inject events.
+
+        Returns the behavior of the ``event`` of ``face_events`` and the
+        keyword arguments of its events on the faces of ids ``face_ids``.
+        """
+        raise ValueError(f"{type(self).__name__} has no {event} event")
+
+    def inject(self, event, face_ids):
+        """
+        Appends the ``event`` of ``face_events`` on the faces of ids
+        ``face_ids`` to the event manager, they are executed from the next
+        step on. Faces that already have this event queued are skipped.
+
+        Returns the number of appended events.
+        """
+        behavior, events = self.face_event(event, face_ids)
+        return append_events(self.manager, behavior, events)
+
+    def before_step(self):
+        pass
+
+    def after_step(self):
+        pass
+
+    def step(self):
+        """
+        Executes the current events, relaxes the sheet and records it
+        every ``record_every`` steps.
+        """
+        t = self.t + 1
+        timer = self.timer
+        if timer is not None:
+            start = timer.now()
+
+        self.before_step()
+        self.manager.execute(self.sheet)
+        if timer is not None:
+            start = timer.lap(t, "execute", start)
+
+        self.res = self.solver.find_energy_min(
+            self.sheet, self.geom, self.model, **self.min_settings
+        )
+        if timer is not None:
+            start = timer.lap(t, "find_energy_min", start)
+
+        recorded = t % self.record_every == 0
+        if recorded:
+            self.history.record(time_stamp=t)
+            if timer is not None:
+                timer.lap(t, "history_record", start)
+        if timer is not None:
+            if "nit" in self.res:
+                timer.add(t, "solver_iterations", int(self.res["nit"]))
+            if "gradient" in self.res:
+                timer.add(t, "gradient", self.res["gradient"])
+
+        self.manager.update()
+        self.after_step()
+        self.t += 1
+        if recorded:
+            self._checkpoint()
+
+    def flush(self):
+        """
+        Records the current step if it wasn't, e.g. at the end of a run.
+        """
+        if self.history is not None and self.history.time != self.t:
+            self.history.record(time_stamp=self.t)
+            self._checkpoint()
+
+    def rewind(self, t):
+        """
+        Goes back to the last checkpoint at or before ``t``, i.e. the last
+        keyframe of the history.
+
+        The sheet is restored from the history and the event manager from
+        its checkpoint, the records after that step are forgotten and the
+        following steps start from there.
+
+        Returns the timestep the simulation was rewound to.
+        """
+        times = [time for time in self._checkpoints if time <= t]
+        if not times:
+            raise ValueError(f"No checkpoint to rewind to at t={t}")
+        t = max(times)
+
+        sheet = self.history.retrieve(t)
+        for element, df in sheet.datasets.items():
+            self.sheet.datasets[element] = df
+        current, next_, clock = copy.deepcopy(self._checkpoints[t])
+        self.manager.current = current
+        self.manager.next = next_
+        self.manager.clock = clock
+
+        self._checkpoints = {
+            time: state
+            for time, state in self._checkpoints.items()
+            if time <= t
+        }
+        self.history.truncate(t + 1)
+        self.history.time = t
+        self.t = t
+        LOGGER.info("simulation rewound to t=%d", t)
+        return t
+
+    def close(self):
+        pass
+
+    def _checkpoint(self):
+        """
+        Keeps the state of the event manager if the current step was
+        recorded as a keyframe: copying every queued event at every step
+        would grow as the steps times the events.
+        """
+        keyframes = self.history.keyframe_times
+        if not keyframes or keyframes[-1] != self.t:
+            return
+        manager = self.manager
+        self._checkpoints[self.t] = copy.deepcopy(
+            (manager.current, manager.next, manager.clock)
+        )
+
+
+def _run_in_process(simulation, conn, stop_event, control_conn):
+    """
+    Entry point of the simulation process.
+
+    Sends the initial sheet, then the changes of every step through ``conn``
+    until the simulation is done or ``stop_event`` is set: the recorded
+    columns that changed (the vertex positions for most steps) and the
+    tables whose rows changed, see ``column_deltas``. The
+    ``("inject", (event, face_ids))`` and ``("rewind", t)`` messages
+    received from ``control_conn`` are handled before the next step, a
+    rewind is acknowledged with ``("rewound", t)``.
+    """
+    try:
+        simulation.start()
+        sheet = simulation.sheet
+        conn.send(
+            (
+                "start",
+                (
+                    sheet.identifier,
+                    dict(sheet.datasets),
+                    sheet.specs,
+                    simulation.geom,
+                ),
+            )
+        )
+        columns = simulation.history.recorded_columns
+        last = {}
+        column_deltas(sheet.datasets, columns, last)
+        while not simulation.done and not stop_event.is_set():
+            while control_conn.poll():
+                kind, payload = control_conn.recv()
+                if kind == "inject":
+                    simulation.inject(*payload)
+                elif kind == "rewind":
+                    simulation.rewind(payload)
+                    conn.send(("rewound", simulation.t))
+                    # the next step sends the tables whole
+                    last.clear()
+            if simulation.done:
+                break
+            simulation.step()
+            timings = None
+            if simulation.timer is not None:
+                timings = simulation.timer.steps.pop(simulation.t, None)
+            deltas = column_deltas(sheet.datasets, columns, last)
+            conn.send(("step", (simulation.t, deltas, timings)))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.send(("done", None))
+        conn.close()
+
+
+class ProcessSimulation:
+    """
+    Runs a :class:`TyssueSimulation` in a separate process.
+
+    The quasistatic solver holds the GIL for long stretches, running it in
+    another process keeps the viewer responsive. The changes of every step
+    are streamed back through a pipe into a mirror sheet, whose geometry is
+    updated here, and a local DeltaHistory, so this object can be used in
+    place of the simulation itself. The simulation process only keeps the
+    keyframes of its history, to rewind.
+    """
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        simulation.keyframes_only = True
+        self.stop = simulation.stop
+        self.t = 0
+        self.sheet = None
+        self.geom = None
+        self.history = None
+        self.finished = False
+
+        # Optional StepTimer, the phases are timed in the simulation process
+        self.timer = None
+
+        context = multiprocessing.get_context("spawn")
+        self._stop_event = context.Event()
+        self._conn, child_conn = context.Pipe(duplex=False)
+        child_control_conn, self._control_conn = context.Pipe(duplex=False)
+        self._process = context.Process(
+            target=_run_in_process,
+            args=(
+                simulation,
+                child_conn,
+                self._stop_event,
+                child_control_conn,
+            ),
+            daemon=True,
+        )
+
+    def start(self):
+        from tyssue import Sheet
+
+        if self.timer is not None:
+            self.simulation.timer = StepTimer()
+        self._process.start()
+        kind, payload = self._receive()
+        if kind != "start":
+            raise RuntimeError("The simulation process stopped during setup")
+
+        identifier, datasets, specs, self.geom = payload
+        self.sheet = Sheet(
+            identifier, {k: df.copy() for k, df in datasets.items()}, specs
+        )
+        self._update_datasets(datasets)
+        self.t = 0
+        self.history = DeltaHistory(
+            self.sheet,
+            keyframe_every=self.simulation.keyframe_every,
+            geom=self.geom,
+        )
+
+    @property
+    def done(self):
+        return self.finished or self.t >= self.stop
+
+    @property
+    def record_every(self):
+        return self.simulation.record_every
+
+    def step(self):
+        """
+        Waits for the next step of the simulation process and records it.
+        """
+        kind, payload = self._receive()
+        if kind == "done":
+            return
+
+        self.t, deltas, timings = payload
+        self._apply_deltas(deltas)
+        if self.t % self.simulation.record_every == 0:
+            self.history.record(time_stamp=self.t)
+        if self.timer is not None and timings is not None:
+            self.timer.update(timings)
+
+    def inject(self, event, face_ids):
+        """
+        Sends the ``event`` on the faces of ids ``face_ids`` to the
+        simulation process, where it is injected before its next step, or
+        its first one when called before ``start``.
+        """
+        self._control_conn.send(("inject", (event, list(face_ids))))
+
+    def rewind(self, t):
+        """
+        Rewinds the simulation process to its last checkpoint at or before
+        ``t``, and the mirror sheet and history with it. The steps
+        the process ran ahead are dropped.
+
+        Returns the timestep the simulation was rewound to.
+        """
+        if self.finished:
+            raise RuntimeError("The simulation process has stopped")
+        self._control_conn.send(("rewind", t))
+        kind, payload = self._receive()
+        while kind not in ("rewound", "done"):
+            kind, payload = self._receive()
+        if kind == "done":
+            raise RuntimeError(
+                "The simulation process stopped before rewinding"
+            )
+
+        self.t = payload
+        sheet = self.history.retrieve(self.t)
+        self._update_datasets(sheet.datasets)
+        self.history.truncate(self.t + 1)
+        self.history.time = self.t
+        return self.t
+
+    def flush(self):
+        """
+        Records the last received step if it wasn't.
+        """
+        if self.history is not None and self.history.time != self.t:
+            self.history.record(time_stamp=self.t)
+
+    def close(self):
+        """
+        Stops the simulation process after its current step.
+        """
+        self._stop_event.set()
+        while not self.finished:
+            self._receive()
+        self._process.join()
+
+    def _update_datasets(self, datasets):
+        # Replace the tables as sent, the Sheet constructor may add columns
+        # from the specs that the simulation process doesn't record
+        for element, df in datasets.items():
+            self.sheet.datasets[element] = df
+
+    def _apply_deltas(self, deltas):
+        import pandas as pd
+
+        for element, (index, arrays) in deltas.items():
+            if index is not None:
+                # the columns that were not sent are kept for the rows that
+                # remain, update_all computes some from their last values
+                previous = self.sheet.datasets[element]
+                df = pd.DataFrame(arrays, index=index)
+                for column in previous.columns.difference(df.columns):
+                    df[column] = previous[column].reindex(index)
+                df.index.name = element
+                self.sheet.datasets[element] = df
+            else:
+                df = self.sheet.datasets[element]
+                for column, array in arrays.items():
+                    df[column] = array
+        if self.geom is None:
+            return
+        # the columns computed by the geometry are not sent, update_all
+        # may overwrite sent columns too (the edge unit vectors)
+        self.geom.update_all(self.sheet)
+        for element, (_, arrays) in deltas.items():
+            df = self.sheet.datasets[element]
+            for column, array in arrays.items():
+                df[column] = array
+
+    def _receive(self):
+        try:
+            kind, payload = self._conn.recv()
+        except EOFError:
+            self.finished = True
+            return "done", None
+        if kind == "error":
+            self.finished = True
+            raise RuntimeError(f"The simulation process failed:\n{payload}")
+        if kind == "done":
+            self.finished = True
+        return kind, payload
@@ -0,0 +1,237 @@
+"""
+This module implements headless parameter sweeps of the tyssue simulations.
+
+``run_sweep`` runs a simulation class (e.g. ``ApoptosisSimulation``) for
+every combination of a parameter grid in a process pool, writes each
+History to an HDF5 archive and a ``summary.csv`` table. ``SweepWidget``
+browses those results in napari.
+"""
+import itertools
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import TYPE_CHECKING
+
+from qtpy.QtWidgets import (
+    QFileDialog,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+from napari_tyssue.export import HistoryWriter
+from napari_tyssue.tyssuewidget import (
+    LazyTimeSeriesSurface,
+    TopologyCache,
+    surface_mesh,
+)
+
+if TYPE_CHECKING:
+    import napari
+
+LOGGER = logging.getLogger("napari_tyssue.sweep")
+
+SUMMARY_FILE = "summary.csv"
+
+
+def parameter_grid(grid):
+    """
+    Expands ``{name: [values, ...]}`` into the list of every combination.
+
+    >>> grid = {"shrink_rate": [1.2, 1.5], "critical_area": [8.0]}
+    >>> parameter_grid(grid)  # doctest: +NORMALIZE_WHITESPACE
+    [{'shrink_rate': 1.2, 'critical_area': 8.0},
+     {'shrink_rate': 1.5, 'critical_area': 8.0}]
+    """
+    names = list(grid)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+def run_one(simulation_class, params, path):
+    """
+    Runs ``simulation_class(**params)`` to completion, streaming its
+    History to ``path``.
+
+    Returns
+    -------
+    summary : dict
+        The parameters and a summary of the run
+    """
+    summary = dict(params, path=os.fspath(path), error="")
+    start = time.perf_counter()
+    try:
+        simulation = simulation_class(**params)
+        simulation.start()
+        with HistoryWriter(path) as writer:
+            writer.write_history(simulation.history)
+            while not simulation.done:
+                simulation.step()
+                writer.append(simulation.sheet, simulation.history.time)
+
+        res = simulation.res
+        summary.update(
+            steps=simulation.t,
+            Nf=simulation.sheet.Nf,
+            Nv=simulation.sheet.Nv,
+            success=bool(res["success"]) if res is not None else True,
+        )
+    except Exception:
+        LOGGER.exception("run %s failed", params)
+        summary["error"] = traceback.format_exc()
+    summary["duration"] = time.perf_counter() - start
+    return summary
+
+
+def run_sweep(simulation_class, grid, output_dir, max_workers=None):
+    """
+    Runs a parameter sweep of ``simulation_class`` in a process pool.
+
+    Parameters
+    ----------
+    simulation_class : a :class:`TyssueSimulation` subclass
+        Each configuration is passed to it as keyword arguments
+    grid : dict or list of dict
+        Either ``{name: [values, ...]}``, expanded with ``parameter_grid``,
+        or an explicit list of configurations
+    output_dir : str or Path
+        Each History is written to ``run_<i>.hf5`` in this directory,
+        along with a ``summary.csv`` table
+    max_workers : int, optional
+        Number of worker processes, defaults to the number of CPUs
+
+    Returns
+    -------
+    summary : pd.DataFrame
+        One row per configuration, in the order of the grid
+    """
+    import pandas as pd
+
+    configurations = grid
+    if isinstance(grid, dict):
+        configurations = parameter_grid(grid)
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [
+        os.path.join(output_dir, f"run_{i:04d}.hf5")
+        for i in range(len(configurations))
+    ]
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=get_context("spawn")
+    ) as executor:
+        summaries = list(
+            executor.map(
+                run_one,
+                itertools.repeat(simulation_class),
+                configurations,
+                paths,
+            )
+        )
+
+    summary = pd.DataFrame(summaries)
+    summary.to_csv(os.path.join(output_dir, SUMMARY_FILE), index=False)
+    return summary
+
+
+def load_sweep(output_dir):
+    """
+    Reads the summary table written by ``run_sweep``.
+    """
+    import pandas as pd
+
+    return pd.read_csv(
+        os.path.join(output_dir, SUMMARY_FILE), keep_default_na=False
+    )
+
+
+class SweepWidget(QWidget):
+    """
+    Lists the runs of a sweep and displays the selected one in the viewer.
+    """
+
+    def __init__(self, viewer: "napari.viewer.Viewer"):
+        super().__init__()
+        self.viewer = viewer
+
+        self.summary = None
+        self.history = None
+        self.display = None
+        self.topology_cache = TopologyCache()
+
+        self.open_btn = QPushButton("Open Sweep")
+        self.open_btn.clicked.connect(self._on_open_click)
+
+        self.table = QTableWidget()
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.itemSelectionChanged.connect(self._on_selection_changed)
+
+        self.setLayout(QVBoxLayout())
+        self.layout().addWidget(self.open_btn)
+        self.layout().addWidget(self.table)
+
+    def load(self, output_dir):
+        """
+        Fills the table with the summary of the sweep in ``output_dir``.
+        """
+        self.summary = load_sweep(output_dir)
+        columns = [c for c in self.summary.columns if c != "error"]
+
+        self.table.clear()
+        self.table.setRowCount(len(self.summary))
+        self.table.setColumnCount(len(columns))
+        self.table.setHorizontalHeaderLabels(columns)
+        for row, values in enumerate(self.summary[columns].itertuples()):
+            for column, value in enumerate(values[1:]):
+                self.table.setItem(row, column, QTableWidgetItem(str(value)))
+        self.table.resizeColumnsToContents()
+
+    def show_run(self, row):
+        """
+        Displays the history of the ``row``-th run of the sweep.
+        """
+        from napari_tyssue._reader import HistoryFile
+
+        run = self.summary.iloc[row]
+        if run["error"]:
+            LOGGER.warning("run %d failed:\n%s", row, run["error"])
+            return
+
+        self.history = HistoryFile(run["path"])
+        self.topology_cache.clear()
+
+        if self.display is None:
+            self.display = LazyTimeSeriesSurface(
+                self.viewer,
+                self._mesh_at,
+                colormap="viridis",
+                opacity=0.9,
+                contrast_limits=[0, 1],
+                name="tyssue: sweep",
+            )
+        self.display.clear()
+        self.viewer.dims.ndisplay = 3
+        self.display.show(0, num_timepoints=len(self.history))
+        self.viewer.dims.set_current_step(0, 0)
+
+    def _mesh_at(self, t):
+        sheet = self.history.retrieve(self.history.time_stamps[t])
+        return surface_mesh(sheet, topology_cache=self.topology_cache)
+
+    def _on_open_click(self):
+        output_dir = QFileDialog.getExistingDirectory(self, "Open Sweep")
+        if output_dir:
+            self.load(output_dir)
+
+    def _on_selection_changed(self):
+        rows = self.table.selectionModel().selectedRows()
+        if rows:
+            self.show_run(rows[0].row())
@@ -6,125 +6,920 @@ see: https://napari.org/stable/plugins/guides.html?#widgets
 
 Replace code below according to your needs.
 """
+import hashlib
 import logging
-from typing import TYPE_CHECKING
+import queue
+from collections import OrderedDict, namedtuple
+from threading import Condition, Lock, Thread
 
-# tyssue imports
-
-# import pandas as pd
 import numpy as np
 
-# import json
+# tyssue is imported when a simulation starts, to keep the plugin quick to
+# load
+
+# napari imports
+
+from qtpy.QtCore import QTimer
+from qtpy.QtWidgets import (
+    QCheckBox,
+    QComboBox,
+    QFileDialog,
+    QFormLayout,
+    QHBoxLayout,
+    QLabel,
+    QSpinBox,
+    QVBoxLayout,
+    QPushButton,
+    QWidget,
+)
 
 import napari
+from napari.utils import progress
 
-# import vispy as vp
+from napari_tyssue.export import HistoryWriter
+from napari_tyssue.profiling import StepTimer
+from napari_tyssue.simulation import ProcessSimulation
 
-import tyssue
-from tyssue import Sheet, History
-from tyssue import config
+LOGGER = logging.getLogger("napari_tyssue.TyssueWidget")
 
-from tyssue import SheetGeometry as geom
-from tyssue.dynamics.sheet_vertex_model import SheetModel as basemodel
-from tyssue.dynamics.apoptosis_model import SheetApoptosisModel as model
-from tyssue.solvers.quasistatic import QSSolver
+# Number of faces above which the widgets draw simplified surfaces
+PREVIEW_FACES = 5000
 
-from tyssue.config.draw import sheet_spec
-from tyssue.utils.utils import spec_updater
+# A simulated timestep queued for display: its surface mesh, its junction
+# vectors and vertex points when they are drawn and the face id of each
+# triangle when faces can be picked (None otherwise)
+Frame = namedtuple("Frame", ["t", "mesh", "edges", "vertices", "face_ids"])
 
-# from tyssue.draw.ipv_draw import _get_meshes
-# from tyssue.draw.vispy_draw import sheet_view, face_visual, edge_visual
 
-# from tyssue.draw import sheet_view, create_gif, browse_history
-from tyssue.io.hdf5 import save_datasets, load_datasets
+def topology_fingerprint(sheet):
+    """
+    Returns a hashable summary of the sheet connectivity.
 
-# napari imports
+    Two sheets with the same fingerprint have identical ``srce``, ``trgt``
+    and ``face`` columns, hence the same triangle fan.
+    """
+    connectivity = np.ascontiguousarray(
+        sheet.edge_df[["srce", "trgt", "face"]].to_numpy()
+    )
+    digest = hashlib.blake2b(connectivity.tobytes(), digest_size=16)
+    return (sheet.Ne, sheet.Nf, digest.hexdigest())
 
-from qtpy.QtWidgets import QVBoxLayout, QPushButton, QWidget
 
-import napari
-from napari.utils import progress
+def _fan_triangles(sheet):
+    Ne, Nf = sheet.Ne, sheet.Nf
+    return np.vstack(
+        [sheet.edge_df["face"], np.arange(Ne) + Nf, np.arange(Ne) + Ne + Nf]
+    ).T.astype(dtype=np.uint32)
 
-from threading import Thread
 
-from superqt.utils import ensure_main_thread
+def _positions(index, labels):
+    """Row positions of ``labels`` in ``index``, skipping the lookup when
+    the index already is 0..N-1."""
+    labels = labels.to_numpy()
+    is_range = len(index) == 0 or (
+        index[0] == 0
+        and index[-1] == len(index) - 1
+        and index.is_monotonic_increasing
+        and index.is_unique
+    )
+    if is_range:
+        return labels.astype(np.uint32, copy=False)
+    return index.get_indexer(labels).astype(np.uint32)
 
-LOGGER = logging.getLogger("napari_tyssue.TyssueWidget")
 
+def _float32_columns(df, columns):
+    """Copies ``columns`` of ``df`` into a contiguous float32 array."""
+    out = np.empty((df.shape[0], len(columns)), dtype=np.float32)
+    for i, column in enumerate(columns):
+        out[:, i] = df[column].to_numpy()
+    return out
 
-def face_mesh(sheet, coords, **face_draw_specs):
+
+def face_mesh_vertices(sheet, coords, epsilon=0.0, out=None):
     """
-    Creates a ipyvolume Mesh of the face polygons
+    Computes the vertex positions of the face triangle fans with NumPy.
+
+    Positions are taken once from ``vert_df`` and ``face_df`` as contiguous
+    float32 arrays and the ``srce``, ``trgt`` and ``face`` columns as uint32
+    indices; no intermediate DataFrame is built. The result holds the face
+    centers followed by the (shrunk by ``epsilon``) source and target
+    vertices of each edge, in the order expected by the fan triangles.
+
+    Parameters
+    ----------
+    sheet : a :class:`tyssue.Sheet` object
+    coords : list of str
+        The position columns, e.g. ``["x", "y", "z"]``
+    epsilon : float, default 0
+        Shrink each face towards its center by this fraction
+    out : np.ndarray, optional
+        A float array of shape ``(Nf + 2 * Ne, len(coords))`` to write into
+
+    Returns
+    -------
+    out : np.ndarray
     """
     Ne, Nf = sheet.Ne, sheet.Nf
+    vert_pos = _float32_columns(sheet.vert_df, coords)
+    face_pos = _float32_columns(sheet.face_df, coords)
+
+    edge_df = sheet.edge_df
+    srce = _positions(sheet.vert_df.index, edge_df["srce"])
+    trgt = _positions(sheet.vert_df.index, edge_df["trgt"])
+
+    if out is None:
+        out = np.empty((Nf + 2 * Ne, len(coords)), dtype=np.float32)
+
+    up_srce = out[Nf : Nf + Ne]
+    up_trgt = out[Nf + Ne :]
+    out[:Nf] = face_pos
+    # indices are known to be in bounds, "clip" avoids a buffered copy
+    np.take(vert_pos, srce, axis=0, out=up_srce, mode="clip")
+    np.take(vert_pos, trgt, axis=0, out=up_trgt, mode="clip")
+
+    if epsilon > 0:
+        face = _positions(sheet.face_df.index, edge_df["face"])
+        up_face = face_pos.take(face, axis=0)
+        for up_vert in (up_srce, up_trgt):
+            up_vert -= up_face
+            up_vert *= 1 - epsilon
+            up_vert += up_face
+
+    return out
+
+
+class MeshIndices:
+    """
+    Rows of the face, edge and vertex tables behind each mesh vertex.
+
+    The mesh vertices are the face centers followed by the source and
+    target vertices of each edge (see ``face_mesh_vertices``), so a column
+    of any table maps to the mesh vertex values with a single ``take``.
+    """
+
+    def __init__(self, sheet):
+        Ne, Nf = sheet.Ne, sheet.Nf
+        edge_df = sheet.edge_df
+        self.num_faces = Nf
+        self.num_verts = sheet.Nv
+
+        # face of each edge, and of each mesh vertex
+        self.edge_face = _positions(sheet.face_df.index, edge_df["face"])
+        self.face = np.concatenate(
+            [np.arange(Nf, dtype=np.uint32), self.edge_face, self.edge_face]
+        )
+
+        # edge and vertex of each edge based mesh vertex
+        edges = np.arange(Ne, dtype=np.uint32)
+        self.edge = np.concatenate([edges, edges])
+        self.vert = np.concatenate(
+            [
+                _positions(sheet.vert_df.index, edge_df["srce"]),
+                _positions(sheet.vert_df.index, edge_df["trgt"]),
+            ]
+        )
+
+        # number of edges of each face, for the face center values
+        self.face_size = np.bincount(self.edge_face, minlength=Nf)
+
+        # edges sorted by face, those of face i start at face_start[i]
+        self.face_edges = np.argsort(self.edge_face, kind="stable")
+        self.face_start = np.cumsum(self.face_size) - self.face_size
+
+    def edges_of(self, faces):
+        """
+        Rows of the edges of the ``faces`` rows, face by face.
+
+        Only the edges of ``faces`` are visited.
+        """
+        sizes = self.face_size[faces]
+        # position of each edge in the sorted edges of its face
+        shift = self.face_start[faces] - (np.cumsum(sizes) - sizes)
+        positions = np.repeat(shift, sizes) + np.arange(sizes.sum())
+        return self.face_edges[positions]
+
+    def dilate(self, face_mask, rings=1):
+        """
+        Grows the ``face_mask`` by ``rings`` rings of faces sharing a vertex
+        with it.
+        """
+        srce = self.vert[: len(self.edge_face)]
+        for _ in range(rings):
+            verts = np.zeros(self.num_verts, dtype=bool)
+            verts[srce[face_mask[self.edge_face]]] = True
+            face_mask = np.zeros(self.num_faces, dtype=bool)
+            face_mask[self.edge_face[verts[srce]]] = True
+        return face_mask
+
+
+def mesh_values(sheet, color_by, indices=None, out=None):
+    """
+    Maps a column of the sheet to the vertex values of its surface mesh.
+
+    Parameters
+    ----------
+    sheet : a :class:`tyssue.Sheet` object
+    color_by : tuple of str
+        ``(element, column)``, e.g. ``("face", "area")``,
+        ``("edge", "line_tension")`` or ``("vert", "z")``. Face values
+        color each face uniformly; edge and vertex values are interpolated
+        across the faces, the face centers getting the mean of their edges.
+        A column missing from the sheet gives zeros.
+    indices : MeshIndices, optional
+        The indices of the current topology, computed if not given
+    out : np.ndarray, optional
+        A float32 array of shape ``(Nf + 2 * Ne,)`` to write into
+
+    Returns
+    -------
+    out : np.ndarray
+    """
+    if indices is None:
+        indices = MeshIndices(sheet)
+    if out is None:
+        out = np.empty(len(indices.face), dtype=np.float32)
+
+    element, column = color_by
+    df = sheet.datasets[element]
+    if column not in df.columns:
+        out[:] = 0
+        return out
+    values = df[column].to_numpy(dtype=np.float32)
+
+    if element == "face":
+        np.take(values, indices.face, out=out, mode="clip")
+        return out
+
+    Nf = indices.num_faces
+    rows = indices.edge if element == "edge" else indices.vert
+    np.take(values, rows, out=out[Nf:], mode="clip")
+    # each edge starts at its source vertex, the first half of the rows
+    edge_values = out[Nf : Nf + len(indices.edge_face)]
+    out[:Nf] = np.bincount(
+        indices.edge_face, weights=edge_values, minlength=Nf
+    ) / np.maximum(indices.face_size, 1)
+    return out
+
+
+class TopologyCache:
+    """
+    Keeps the triangle indices of the last meshed topology.
+
+    Between topology changes (T1/T3 transitions, face removal) only the
+    vertex positions move, so the same triangles array (and the same
+    ``MeshIndices`` for the vertex values) is handed out again instead of
+    being rebuilt.
+    """
+
+    def __init__(self):
+        self.fingerprint = None
+        self.triangles = None
+        self.indices = None
+        self.misses = 0
+
+    def triangles_for(self, sheet):
+        self._update(sheet)
+        return self.triangles
+
+    def indices_for(self, sheet):
+        self._update(sheet)
+        return self.indices
+
+    def _update(self, sheet):
+        fingerprint = topology_fingerprint(sheet)
+        if fingerprint != self.fingerprint:
+            self.triangles = _fan_triangles(sheet)
+            self.indices = MeshIndices(sheet)
+            self.fingerprint = fingerprint
+            self.misses += 1
+
+    def clear(self):
+        self.fingerprint = None
+        self.triangles = None
+        self.indices = None
+
+
+def face_mesh(
+    sheet,
+    coords,
+    triangles=None,
+    indices=None,
+    color_by=None,
+    **face_draw_specs,
+):
+    """
+    Creates a ipyvolume Mesh of the face polygons
+
+    ``triangles`` and ``indices`` can be passed to reuse the connectivity
+    of a previous call when the topology did not change.
+
+    The vertex values are given by ``color_by``, an ``(element, column)``
+    of the sheet (see ``mesh_values``), or by the face ``color`` spec when
+    it is a sequence of one value per face (or a function of the sheet
+    returning one). Otherwise they run from 0 to 1 along the mesh.
+    """
     if callable(face_draw_specs["color"]):
         face_draw_specs["color"] = face_draw_specs["color"](sheet)
 
-    if isinstance(face_draw_specs["color"], str):
-        color = face_draw_specs["color"]
-
-    elif hasattr(face_draw_specs["color"], "__len__"):
-        color = _face_color_from_sequence(face_draw_specs, sheet)[:, :3]
+    color = face_draw_specs["color"]
+    if not isinstance(color, str) and hasattr(color, "__len__"):
+        color = np.asarray(color)
 
     if "visible" in sheet.face_df.columns:
-        edges = sheet.edge_df[
-            sheet.upcast_face(sheet.face_df["visible"])
-        ].index
-        _sheet = get_sub_eptm(sheet, edges)
-        if _sheet is not None:
-            sheet = _sheet
-            if isinstance(color, np.ndarray):
-                faces = sheet.face_df["face_o"].values.astype(np.uint32)
-                edges = edges.values.astype(np.uint32)
-                indexer = np.concatenate([faces, edges + Nf, edges + Ne + Nf])
-                color = color.take(indexer, axis=0)
+        # only the visible faces are meshed, without a sub-sheet
+        faces = np.flatnonzero(sheet.face_df["visible"].to_numpy(dtype=bool))
+        return roi_mesh(
+            sheet, faces, coords=coords, indices=indices, color_by=color_by
+        )
 
     epsilon = face_draw_specs.get("epsilon", 0)
-    up_srce = sheet.edge_df[["s" + c for c in coords]]
-    up_trgt = sheet.edge_df[["t" + c for c in coords]]
+    mesh_ = face_mesh_vertices(sheet, coords, epsilon=epsilon)
 
-    Ne, Nf = sheet.Ne, sheet.Nf
+    if triangles is None:
+        triangles = _fan_triangles(sheet)
 
-    if epsilon > 0:
-        up_face = sheet.edge_df[["f" + c for c in coords]].values
-        up_srce = (up_srce - up_face) * (1 - epsilon) + up_face
-        up_trgt = (up_trgt - up_face) * (1 - epsilon) + up_face
+    if color_by is not None:
+        color = mesh_values(sheet, color_by, indices=indices)
+    elif isinstance(color, np.ndarray) and color.ndim == 1:
+        if indices is None:
+            indices = MeshIndices(sheet)
+        color = color.astype(np.float32).take(indices.face)
+    else:
+        color = np.linspace(0, 1, len(mesh_))
+
+    mesh_ *= 10.0
+    mesh = (mesh_, triangles, color)
+    return mesh
+
+
+def roi_mesh(
+    sheet, faces, coords=("x", "y", "z"), indices=None, color_by=None
+):
+    """
+    Builds the surface mesh of the ``faces`` rows of ``sheet`` only.
+
+    The mesh has the layout of ``face_mesh`` restricted to the faces, e.g.
+    a region of interest given by ``np.flatnonzero(face_mask)``. With the
+    ``indices`` of the topology, only the rows of the faces, of their edges
+    and of their vertices are read: the cost is proportional to the number
+    of drawn faces, and no sub-sheet is built.
+
+    The values are those of the ``(element, column)`` ``color_by`` (see
+    ``mesh_values``), or run from 0 to 1 along the mesh.
+    """
+    if indices is None:
+        indices = MeshIndices(sheet)
+    faces = np.asarray(faces, dtype=np.intp)
+    edges = indices.edges_of(faces)
+    Ne = len(indices.edge_face)
+    nf, ne = len(faces), len(edges)
+    srce = indices.vert[edges]
+    trgt = indices.vert[edges + Ne]
 
-    mesh_ = np.concatenate(
-        [sheet.face_df[coords].values, up_srce.values, up_trgt.values]
+    vertices = np.empty((nf + 2 * ne, len(coords)), dtype=np.float32)
+    for i, coord in enumerate(coords):
+        face_pos = sheet.face_df[coord].to_numpy()
+        vert_pos = sheet.vert_df[coord].to_numpy()
+        vertices[:nf, i] = face_pos[faces]
+        vertices[nf : nf + ne, i] = vert_pos[srce]
+        vertices[nf + ne :, i] = vert_pos[trgt]
+    vertices *= 10.0
+
+    # the edges come face by face, their triangles fan out of the centers
+    local_face = np.repeat(
+        np.arange(nf, dtype=np.uint32), indices.face_size[faces]
+    )
+    edge_vertices = np.arange(nf, nf + ne, dtype=np.uint32)
+    triangles = np.stack(
+        [local_face, edge_vertices, edge_vertices + ne], axis=1
     )
 
-    triangles = np.vstack(
-        [sheet.edge_df["face"], np.arange(Ne) + Nf, np.arange(Ne) + Ne + Nf]
-    ).T.astype(dtype=np.uint32)
+    if color_by is None:
+        values = np.linspace(0, 1, len(vertices), dtype=np.float32)
+        return vertices, triangles, values
 
-    color = np.linspace(0, 1, len(mesh_))
+    values = np.empty(len(vertices), dtype=np.float32)
+    element, column = color_by
+    df = sheet.datasets[element]
+    if column not in df.columns:
+        values[:] = 0
+        return vertices, triangles, values
+    column_values = df[column].to_numpy(dtype=np.float32)
+    if element == "face":
+        values[:nf] = column_values[faces]
+        values[nf:] = np.tile(values[:nf][local_face], 2)
+        return vertices, triangles, values
 
-    mesh = (mesh_ * 10.0, triangles, color)
-    return mesh
+    if element == "edge":
+        values[nf:] = np.tile(column_values[edges], 2)
+    else:
+        values[nf:] = column_values[np.concatenate([srce, trgt])]
+    values[:nf] = np.bincount(
+        local_face, weights=values[nf : nf + ne], minlength=nf
+    ) / np.maximum(indices.face_size[faces], 1)
+    return vertices, triangles, values
 
 
-def _get_meshes(sheet, coords, draw_specs):
-    meshes = []
-    edge_spec = draw_specs["edge"]
-    edge_spec["visible"] = False
-    if edge_spec["visible"]:
-        edges = edge_mesh(sheet, coords, **edge_spec)
-        meshes.append(edges)
+def edge_mesh(sheet, coords, color_by="line_tension", **edge_draw_specs):
+    """
+    Creates the ``(vectors, values)`` of the cell junctions for a napari
+    Vectors layer.
+
+    ``vectors`` is a (N, 2, D) array of the junction sources and of their
+    ``trgt - srce`` projections, scaled like the face meshes, and ``values``
+    is the ``color_by`` column of the edges (zeros if it is missing). A
+    junction between two cells is made of two opposite half-edges, only the
+    one going to the higher vertex id is drawn.
+
+    The edge draw specs are accepted like in ``face_mesh``, the width and
+    colormap being set on the layer.
+    """
+    edge_df = sheet.edge_df
+    vert_index = sheet.vert_df.index
+    srce = _positions(vert_index, edge_df["srce"]).astype(np.int64)
+    trgt = _positions(vert_index, edge_df["trgt"]).astype(np.int64)
+
+    # half-edges without an opposite one are on the border of the sheet
+    Nv = len(vert_index)
+    opposite = np.isin(trgt * Nv + srce, srce * Nv + trgt)
+    drawn = np.flatnonzero((srce < trgt) | ~opposite)
+
+    positions = _float32_columns(sheet.vert_df, list(coords))
+    positions *= 10.0
+    vectors = np.empty((len(drawn), 2, len(coords)), dtype=np.float32)
+    np.take(positions, srce[drawn], axis=0, out=vectors[:, 0])
+    np.subtract(positions[trgt[drawn]], vectors[:, 0], out=vectors[:, 1])
+
+    if color_by in edge_df.columns:
+        values = edge_df[color_by].to_numpy(dtype=np.float32)[drawn]
     else:
-        edges = None
+        values = np.zeros(len(drawn), dtype=np.float32)
+    return vectors, values
+
+
+def vertex_points(sheet, columns, coords=("x", "y", "z")):
+    """
+    Creates the ``(points, features)`` of the vertices of ``sheet`` for a
+    napari Points layer.
+
+    The points are scaled like the face meshes and the features are the
+    ``columns`` of ``vert_df``, zeros for the missing ones so that the
+    features of a layer don't depend on the simulation step.
+    """
+    points = _float32_columns(sheet.vert_df, list(coords))
+    points *= 10.0
+    vert_df = sheet.vert_df
+    features = {}
+    for column in columns:
+        if column in vert_df.columns:
+            features[column] = vert_df[column].to_numpy(dtype=np.float32)
+        else:
+            features[column] = np.zeros(len(points), dtype=np.float32)
+    return points, features
+
 
+def _get_meshes(sheet, coords, draw_specs, topology_cache=None, color_by=None):
+    meshes = []
     face_spec = draw_specs["face"]
     face_spec["visible"] = True
     if face_spec["visible"]:
-        faces = face_mesh(sheet, coords, **face_spec)
+        triangles = indices = None
+        if topology_cache is not None:
+            triangles = topology_cache.triangles_for(sheet)
+            indices = topology_cache.indices_for(sheet)
+        faces = face_mesh(
+            sheet,
+            coords,
+            triangles=triangles,
+            indices=indices,
+            color_by=color_by,
+            **face_spec,
+        )
         meshes.append(faces)
-    else:
-        faces = None
 
-    LOGGER.info("faces", faces)
+    # the junctions follow the faces, drawn as vectors
+    edge_spec = draw_specs["edge"]
+    if edge_spec["visible"]:
+        meshes.append(edge_mesh(sheet, coords, **edge_spec))
     return meshes
 
+
+def _preview_fan(srce, trgt, edge_face, num_faces):
+    """
+    The fan center of the face of each edge, and the mask of the edges
+    making a triangle with it.
+    """
+    # the source of the first edge of each face is the center of its fan
+    _, first = np.unique(edge_face, return_index=True)
+    anchor = np.zeros(num_faces, dtype=np.uint32)
+    anchor[edge_face[first]] = srce[first]
+    anchor = anchor[edge_face]
+    return anchor, (srce != anchor) & (trgt != anchor)
+
+
+def preview_mesh(sheet, coords=("x", "y", "z"), color_by=None):
+    """
+    Builds a simplified ``(vertices, faces, values)`` surface of ``sheet``.
+
+    The mesh vertices are the vertices of the sheet and each face is fanned
+    out from one of its vertices, without the face centers and the
+    per-edge vertex copies of ``face_mesh``: a hexagonal sheet gives about
+    6 times fewer mesh vertices and a third fewer triangles. The values
+    are those of the ``(element, column)`` ``color_by`` (face and edge
+    values are averaged around each vertex), or run from 0 to 1.
+    """
+    Nv = sheet.Nv
+    edge_df = sheet.edge_df
+    vert_index = sheet.vert_df.index
+    srce = _positions(vert_index, edge_df["srce"])
+    trgt = _positions(vert_index, edge_df["trgt"])
+    edge_face = _positions(sheet.face_df.index, edge_df["face"])
+
+    anchor, fan = _preview_fan(srce, trgt, edge_face, sheet.Nf)
+    triangles = np.stack([anchor[fan], srce[fan], trgt[fan]], axis=1)
+
+    vertices = _float32_columns(sheet.vert_df, list(coords))
+    vertices *= 10.0
+
+    if color_by is None:
+        values = np.linspace(0, 1, Nv, dtype=np.float32)
+        return vertices, triangles, values
+
+    element, column = color_by
+    df = sheet.datasets[element]
+    if column not in df.columns:
+        return vertices, triangles, np.zeros(Nv, dtype=np.float32)
+    column_values = df[column].to_numpy(dtype=np.float32)
+    if element == "vert":
+        return vertices, triangles, column_values
+    if element == "face":
+        column_values = column_values[edge_face]
+    counts = np.maximum(np.bincount(srce, minlength=Nv), 1)
+    values = np.bincount(srce, weights=column_values, minlength=Nv) / counts
+    return vertices, triangles, values.astype(np.float32)
+
+
+def surface_mesh(sheet, topology_cache=None, color_by=None, preview=False):
+    """
+    Builds the ``(vertices, faces, values)`` surface mesh of ``sheet``
+    with the default tyssue draw specs, its values given by the
+    ``(element, column)`` ``color_by`` if any (see ``mesh_values``).
+
+    With ``preview``, a simplified surface is built by ``preview_mesh``.
+    """
+    if preview:
+        return preview_mesh(sheet, color_by=color_by)
+
+    from tyssue.config.draw import sheet_spec
+    from tyssue.utils.utils import spec_updater
+
+    specs_kw = {}
+    draw_specs = sheet_spec()
+    spec_updater(draw_specs, specs_kw)
+    # the widgets draw the junctions in their own layer
+    draw_specs["edge"]["visible"] = False
+    coords = ["x", "y", "z"]
+
+    meshes = _get_meshes(
+        sheet,
+        coords,
+        draw_specs,
+        topology_cache=topology_cache,
+        color_by=color_by,
+    )
+    vertices, faces, values = meshes[0]
+
+    LOGGER.info(
+        "num_meshes = %d mesh: (%s, %s, %s)",
+        len(meshes),
+        vertices.shape,
+        faces.shape,
+        values.shape,
+    )
+    return meshes[0]
+
+
+class _GrowableArray:
+    """A NumPy array with amortized O(1) appends along the first axis.
+
+    Storage is preallocated and its capacity doubles whenever an append does
+    not fit, so the filled part can be exposed as a view without copying.
+    """
+
+    def __init__(self, shape=(), dtype=np.float32, capacity=1024):
+        self._data = np.empty((capacity,) + tuple(shape), dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self):
+        return self._data.shape[0]
+
+    @property
+    def filled(self):
+        """View of the filled part of the array."""
+        return self._data[: self.size]
+
+    def reserve(self, n):
+        """Make room for ``n`` more rows, doubling the capacity if needed."""
+        needed = self.size + n
+        if needed <= self.capacity:
+            return
+        capacity = max(self.capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        data = np.empty((capacity,) + self._data.shape[1:], self._data.dtype)
+        data[: self.size] = self._data[: self.size]
+        self._data = data
+
+    def extend(self, n):
+        """Grow the filled part by ``n`` rows and return a view on them."""
+        self.reserve(n)
+        start = self.size
+        self.size += n
+        return self._data[start : self.size]
+
+    def truncate(self, n):
+        """Keep the first ``n`` rows."""
+        self.size = min(self.size, n)
+
+    def clear(self):
+        self.size = 0
+
+
+class TimeSeriesMeshBuffer:
+    """Stacks one mesh per timepoint into a single napari Surface dataset.
+
+    Vertices get the timepoint prepended as column 0 and faces are offset
+    by the number of vertices already stored, as napari expects for a
+    time series surface. Appending a timepoint only writes that mesh, its
+    cost does not depend on how many timepoints were stored before.
+    """
+
+    def __init__(self, ndim=3, capacity=1024):
+        self._vertices = _GrowableArray((ndim + 1,), np.float32, capacity)
+        self._faces = _GrowableArray((3,), np.uint32, capacity)
+        self._values = _GrowableArray((), np.float32, capacity)
+        self.timepoints = []
+        # first vertex and face of each timepoint, and the end of the last one
+        self.offsets = [0]
+        self.face_offsets = [0]
+
+    def __len__(self):
+        return len(self.timepoints)
+
+    @property
+    def data(self):
+        """(vertices, faces, values) views of the filled part of the buffer."""
+        return (
+            self._vertices.filled,
+            self._faces.filled,
+            self._values.filled,
+        )
+
+    def append(self, mesh, t):
+        """Append the ``(vertices, faces, values)`` mesh of timepoint ``t``."""
+        vertices, faces, values = mesh
+        offset = len(self._vertices)
+
+        tp_vertices = self._vertices.extend(vertices.shape[0])
+        tp_vertices[:, 0] = t
+        tp_vertices[:, 1:] = vertices
+
+        tp_faces = self._faces.extend(faces.shape[0])
+        np.add(faces, offset, out=tp_faces, casting="unsafe")
+
+        self._values.extend(values.shape[0])[:] = values
+        self.timepoints.append(t)
+        self.offsets.append(len(self._vertices))
+        self.face_offsets.append(len(self._faces))
+
+    def values_at(self, i):
+        """Writable view of the vertex values of the ``i``-th timepoint."""
+        return self._values.filled[self.offsets[i] : self.offsets[i + 1]]
+
+    def truncate(self, t):
+        """Drop the timepoints from ``t`` on, e.g. after a rewind."""
+        i = int(np.searchsorted(self.timepoints, t, side="left"))
+        self._vertices.truncate(self.offsets[i])
+        self._faces.truncate(self.face_offsets[i])
+        self._values.truncate(self.offsets[i])
+        del self.timepoints[i:]
+        del self.offsets[i + 1 :]
+        del self.face_offsets[i + 1 :]
+
+    def clear(self):
+        self._vertices.clear()
+        self._faces.clear()
+        self._values.clear()
+        self.timepoints = []
+        self.offsets = [0]
+        self.face_offsets = [0]
+
+
+class TimeSeriesVectorBuffer:
+    """Stacks the junction vectors of each timepoint for a napari Vectors
+    layer.
+
+    The vectors get the timepoint prepended to their position (and a null
+    time projection), like the vertices of ``TimeSeriesMeshBuffer``, and
+    their values are stored alongside as the layer features. The layer is
+    given the vectors of one timepoint at a time, see ``at``.
+    """
+
+    def __init__(self, ndim=3, capacity=1024):
+        self._vectors = _GrowableArray((2, ndim + 1), np.float32, capacity)
+        self._values = _GrowableArray((), np.float32, capacity)
+        self.timepoints = []
+        # first vector of each timepoint, and the end of the last one
+        self.offsets = [0]
+
+    def __len__(self):
+        return len(self.timepoints)
+
+    @property
+    def data(self):
+        """(vectors, values) views of the filled part of the buffer."""
+        return self._vectors.filled, self._values.filled
+
+    def append(self, edges, t):
+        """Append the ``(vectors, values)`` of timepoint ``t``."""
+        vectors, values = edges
+        tp_vectors = self._vectors.extend(vectors.shape[0])
+        tp_vectors[:, 0, 0] = t
+        tp_vectors[:, 1, 0] = 0
+        tp_vectors[:, :, 1:] = vectors
+
+        self._values.extend(values.shape[0])[:] = values
+        self.timepoints.append(t)
+        self.offsets.append(len(self._vectors))
+
+    def at(self, t):
+        """(vectors, values) views of timepoint ``t``, None if not stored."""
+        i = int(np.searchsorted(self.timepoints, t, side="left"))
+        if i == len(self.timepoints) or self.timepoints[i] != t:
+            return None
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return (
+            self._vectors.filled[start:stop],
+            self._values.filled[start:stop],
+        )
+
+    def truncate(self, t):
+        """Drop the timepoints from ``t`` on, e.g. after a rewind."""
+        i = int(np.searchsorted(self.timepoints, t, side="left"))
+        self._vectors.truncate(self.offsets[i])
+        self._values.truncate(self.offsets[i])
+        del self.timepoints[i:]
+        del self.offsets[i + 1 :]
+
+    def clear(self):
+        self._vectors.clear()
+        self._values.clear()
+        self.timepoints = []
+        self.offsets = [0]
+
+
+class LazyTimeSeriesSurface:
+    """Displays one timepoint of a mesh time series in a Surface layer.
+
+    Only the mesh of the current ``viewer.dims`` step is held by the layer,
+    it is rebuilt on demand with ``mesh_at(t)`` when the time slider moves
+    and the most recently viewed meshes are kept in a small LRU cache.
+    ``mesh_at`` returns None for the timepoints that have no mesh, e.g.
+    steps that weren't recorded, the layer is hidden on them. The
+    values are broadcast (without copying) along a leading time axis so that
+    the slider still spans every timepoint.
+    """
+
+    # The displays of the layers in a viewer, by layer id: keeps them alive
+    # as long as their layer (viewer events hold weak references) and lets
+    # the writer export every timepoint, see ``of_layer_data``
+    displays = {}
+
+    def __init__(self, viewer, mesh_at, cache_size=8, **layer_kwargs):
+        self.viewer = viewer
+        self.mesh_at = mesh_at
+        self.cache_size = cache_size
+        self.layer_kwargs = layer_kwargs
+
+        self.layer = None
+        self.num_timepoints = 0
+        self.current = None
+        self._cache = OrderedDict()
+
+        self.viewer.dims.events.current_step.connect(self._on_current_step)
+        self.viewer.layers.events.removed.connect(self._on_layer_removed)
+
+    @classmethod
+    def of_layer_data(cls, data):
+        """The display of the layer whose data is ``data``, or None."""
+        for display in cls.displays.values():
+            if display.layer.vertices is data[0]:
+                return display
+        return None
+
+    def show(self, t, num_timepoints=None, mesh=None):
+        """Display timepoint ``t``, optionally growing the time axis.
+
+        ``mesh`` can be passed when it is already known, e.g. for the
+        latest simulated timepoint, to skip ``mesh_at``.
+        """
+        if num_timepoints is not None:
+            self.num_timepoints = num_timepoints
+        self.num_timepoints = max(self.num_timepoints, t + 1)
+        if mesh is not None:
+            self._cache_mesh(t, mesh)
+
+        mesh = self._get_mesh(t)
+        self.current = t
+        if mesh is None:
+            if self.layer is not None:
+                self.layer.visible = False
+            return
+
+        vertices, faces, values = mesh
+        values = np.broadcast_to(values, (self.num_timepoints, len(values)))
+        if self.layer is not None and self.layer in self.viewer.layers:
+            self.layer.data = (vertices, faces, values)
+            self.layer.visible = True
+        else:
+            self.layer = self.viewer.add_surface(
+                (vertices, faces, values), **self.layer_kwargs
+            )
+            self.displays[id(self.layer)] = self
+
+    def update_values(self, values_at):
+        """Replaces the vertex values of the timepoints, keeping the meshes.
+
+        ``values_at(t, mesh)`` returns the new values of timepoint ``t``.
+        Only the values of the layer are updated, and the following calls
+        to ``mesh_at`` are expected to return the new values.
+        """
+        for t, mesh in self._cache.items():
+            if mesh is not None:
+                self._cache[t] = (*mesh[:2], values_at(t, mesh))
+        if self._cache.get(self.current) is None:
+            return
+        if self.layer not in self.viewer.layers:
+            return
+        values = self._cache[self.current][2]
+        self.layer.vertex_values = np.broadcast_to(
+            values, (self.num_timepoints, len(values))
+        )
+
+    def refresh(self):
+        """Forget the cached meshes and rebuild the current timepoint."""
+        self._cache.clear()
+        if self.current is not None and self.layer in self.viewer.layers:
+            self.show(self.current)
+
+    def truncate(self, t):
+        """Forget the timepoints from ``t`` on, e.g. after a rewind."""
+        for key in [key for key in self._cache if key >= t]:
+            del self._cache[key]
+        self.num_timepoints = min(self.num_timepoints, t)
+
+    def clear(self):
+        """Forget the cached meshes, e.g. when a new simulation starts."""
+        self._cache.clear()
+        self.num_timepoints = 0
+        self.current = None
+
+    def close(self):
+        self.viewer.dims.events.current_step.disconnect(self._on_current_step)
+        self.viewer.layers.events.removed.disconnect(self._on_layer_removed)
+        self.displays.pop(id(self.layer), None)
+
+    def _get_mesh(self, t):
+        if t in self._cache:
+            self._cache.move_to_end(t)
+            return self._cache[t]
+
+        mesh = self.mesh_at(t)
+        self._cache_mesh(t, mesh)
+        return mesh
+
+    def _cache_mesh(self, t, mesh):
+        self._cache[t] = mesh
+        self._cache.move_to_end(t)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _on_layer_removed(self, event):
+        if event.value is self.layer:
+            self.displays.pop(id(self.layer), None)
+
+    def _on_current_step(self, event=None):
+        if self.layer is None or self.layer not in self.viewer.layers:
+            return
+        t = self.viewer.dims.current_step[0]
+        if t != self.current and t < self.num_timepoints:
+            self.show(t)
+
+
 def append_time(mesh, time):
     """Append a time dimensions to the mesh."""
     vertices, faces, values = mesh
@@ -136,6 +931,18 @@ def append_time(mesh, time):
     return (vertices, faces, values)
 
 class TyssueWidget(QWidget):
+    # Sheet sizes offered by the widget, ``{label: simulation settings}``
+    size_presets = {}
+
+    # Regions of interest offered by the widget, ``{label: face_mask}``
+    # where ``face_mask(sheet, indices)`` returns the boolean mask of the
+    # faces to draw, given the ``MeshIndices`` of the sheet
+    regions = {}
+
+    # Names of the events of the simulation that can be queued on a face by
+    # clicking it, see ``TyssueSimulation.face_event``
+    face_events = ()
+
     # your QWidget.__init__ can optionally request the napari viewer instance
     # in one of two ways:
     # 1. use a parameter called `napari_viewer`, as done here
@@ -144,11 +951,123 @@ class TyssueWidget(QWidget):
         super().__init__()
         self.viewer = viewer
 
-        # TODO create the layer that we will use for rendering
+        # The layer that we use for rendering, and the name it is added with
         self.layer = None
+        self.layer_name = "tyssue"
+
+        # The number of steps of a simulation, and the label of its sheet
+        # size in ``size_presets``
+        self.stop = 100
+        self.size_preset = next(iter(self.size_presets), None)
+
+        # Sheets with more faces than ``preview_faces`` are drawn as the
+        # simplified surface of ``preview_mesh``, the history still holds
+        # the full sheets. None always draws the full mesh.
+        self.preview_faces = PREVIEW_FACES
+
+        # The label of the region of interest in ``regions``, only its faces
+        # are drawn. None draws the whole sheet.
+        self.region = None
+
+        # Stacked meshes of all the displayed timepoints
+        self.mesh_buffer = TimeSeriesMeshBuffer()
+
+        # Triangles of the last meshed topology, for the simulation thread
+        # and for meshes rebuilt from the history on the main thread
+        self.topology_cache = TopologyCache()
+        self._history_topology_cache = TopologyCache()
+
+        # Mesh snapshots waiting to be displayed, and the minimum time (ms)
+        # between two viewer updates
+        self.max_queued_frames = 16
+        self.frame_queue = queue.Queue(maxsize=self.max_queued_frames)
+        self.dropped_frames = 0
+        self.render_interval = 33
+        self.render_timer = QTimer(self)
+        self.render_timer.timeout.connect(self._on_render_tick)
+
+        # Only the steps multiple of ``record_every`` are recorded in the
+        # history and exported, and the recorded multiples of
+        # ``render_every`` are displayed: the displayed timepoints are
+        # rebuilt from the history, e.g. to color them. The last step of a
+        # run is always recorded and shown.
+        self.record_every = 1
+        self.render_every = 1
+
+        # When True only the current timepoint is kept in the layer and
+        # meshes are rebuilt from the history as the time slider moves.
+        # Otherwise the timepoints are stacked in ``mesh_buffer``, whose
+        # whole data napari goes over at every update: the cost of a step
+        # grows with the number of displayed timepoints.
+        self.lazy_surface = True
+        self.lazy_display = None
+
+        # The ``(element, column)`` of the sheet coloring the faces, None
+        # colors them by their position in the mesh
+        self.color_by = None
+        self.color_combo = None
+
+        # The edge column coloring the cell junctions, drawn as vectors in
+        # their own layer and buffered like the surface. None hides them.
+        self.edge_color_by = None
+        self.edge_layer = None
+        self.edge_buffer = TimeSeriesVectorBuffer()
+        # The timepoint of the junctions shown by the layer
+        self._edges_t = None
+        self.viewer.dims.events.current_step.connect(self._on_current_step)
+
+        # The vert_df column coloring the vertices of the live sheet, drawn
+        # as points with the ``vertex_features`` columns as features. None
+        # hides them.
+        self.vertex_color_by = None
+        self.vertex_features = ["is_active", "radial_tension"]
+        self.vertex_layer = None
+
+        # The event of ``face_events`` queued on the faces clicked while the
+        # simulation runs, None when clicks don't queue events. The queued
+        # ``(event, face_ids)`` are injected between two steps.
+        self.click_event = None
+        self.event_queue = queue.Queue()
+
+        # The face id of each triangle of the displayed meshes, by timepoint
+        self.face_lookup = {}
 
         # Flag used by simulation thread to change simulation state between timesteps
         self.running = False
+        self.thread = None
+
+        # The simulation of the thread, kept once it ends so that it can be
+        # rewound and continued
+        self.simulation = None
+
+        # While paused the simulation thread waits between two steps, for
+        # the ``step_once`` steps or a ``rewind`` to the ``_rewind_to``
+        # timestep. ``_control`` guards these and wakes the thread up.
+        self.paused = False
+        self._pending_steps = 0
+        self._rewind_to = None
+        self._control = Condition()
+
+        # Last displayed timepoint, a rewound simulation displays earlier ones
+        self._shown_t = None
+
+        # When True the simulation runs in a separate process, so that the
+        # solver doesn't hold the GIL of the viewer
+        self.use_process = False
+
+        # When True the phases of every step are timed by ``step_timer``
+        self.record_timings = False
+        self.step_timer = None
+        self.timings_label = None
+
+        # History of the current simulation, and its current timestep
+        self.history = None
+        self.t = 0
+
+        # Writer of the exported history, the simulation thread appends
+        # every new timestep to it while the simulation runs
+        self.history_writer = None
+        self._export_lock = Lock()
 
         # Setup the UI
         # self._init_buttons()
@@ -160,41 +1079,1071 @@ class TyssueWidget(QWidget):
         self.stop_btn = QPushButton("Stop Simulation")
         self.stop_btn.clicked.connect(self._on_stop_click)
 
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.setCheckable(True)
+        self.pause_btn.setChecked(self.paused)
+        self.pause_btn.toggled.connect(self._on_pause_toggled)
+
+        self.step_btn = QPushButton("Step")
+        self.step_btn.clicked.connect(self._on_step_click)
+
+        self.rewind_btn = QPushButton("Rewind to the displayed timepoint")
+        self.rewind_btn.clicked.connect(self._on_rewind_click)
+
         self.export_btn = QPushButton("Export Simulation")
         self.export_btn.clicked.connect(self._on_export_click)
 
+        self.lazy_checkbox = QCheckBox("Only keep the current timepoint")
+        self.lazy_checkbox.setChecked(self.lazy_surface)
+        self.lazy_checkbox.toggled.connect(self._on_lazy_toggled)
+
+        self.process_checkbox = QCheckBox(
+            "Run the solver in a separate process"
+        )
+        self.process_checkbox.setChecked(self.use_process)
+        self.process_checkbox.toggled.connect(self._on_process_toggled)
+
+        self.timings_checkbox = QCheckBox("Record step timings")
+        self.timings_checkbox.setChecked(self.record_timings)
+        self.timings_checkbox.toggled.connect(self._on_timings_toggled)
+
+        self.timings_label = QLabel()
+        self.timings_label.setVisible(self.record_timings)
+
+        self.export_timings_btn = QPushButton("Export Timings")
+        self.export_timings_btn.clicked.connect(self._on_export_timings_click)
+        self.export_timings_btn.setVisible(self.record_timings)
+
+        self.record_every_box = self._spin_box(
+            self.record_every, self._on_record_every_changed
+        )
+        self.render_every_box = self._spin_box(
+            self.render_every, self._on_render_every_changed
+        )
+        self.render_interval_box = self._spin_box(
+            self.render_interval, self._on_render_interval_changed
+        )
+        self.render_interval_box.setSuffix(" ms")
+        cadence = QFormLayout()
+        cadence.addRow("Record every (steps)", self.record_every_box)
+        cadence.addRow("Render every (steps)", self.render_every_box)
+        cadence.addRow("Render at most every", self.render_interval_box)
+
+        self.settings_form = QFormLayout()
+        self.stop_box = self._spin_box(self.stop, self._on_steps_changed)
+        self.settings_form.addRow("Steps", self.stop_box)
+        if self.size_presets:
+            self.size_combo = QComboBox()
+            self.size_combo.addItems(list(self.size_presets))
+            self.size_combo.setCurrentText(self.size_preset)
+            self.size_combo.currentTextChanged.connect(self._on_size_changed)
+            self.settings_form.addRow("Sheet size", self.size_combo)
+        if self.regions:
+            self.region_combo = QComboBox()
+            self.region_combo.addItem("whole sheet", None)
+            for label in self.regions:
+                self.region_combo.addItem(label, label)
+            self.region_combo.currentIndexChanged.connect(
+                self._on_region_changed
+            )
+            self.settings_form.addRow("Region", self.region_combo)
+
+        self.preview_checkbox = QCheckBox("Simplify large sheets")
+        self.preview_checkbox.setChecked(self.preview_faces is not None)
+        self.preview_checkbox.toggled.connect(self._on_preview_toggled)
+
+        self.color_combo = QComboBox()
+        self.color_combo.addItem("Color by: mesh index", None)
+        self.color_combo.currentIndexChanged.connect(self._on_color_changed)
+
+        self.edge_combo = QComboBox()
+        self.edge_combo.addItem("Junctions: hidden", None)
+        self.edge_combo.addItem("Junctions: line tension", "line_tension")
+        self.edge_combo.addItem("Junctions: length", "length")
+        self.edge_combo.setCurrentIndex(
+            max(self.edge_combo.findData(self.edge_color_by), 0)
+        )
+        self.edge_combo.currentIndexChanged.connect(self._on_edges_changed)
+
+        self.vertex_combo = QComboBox()
+        self.vertex_combo.addItem("Vertices: hidden", None)
+        for column in self.vertex_features:
+            self.vertex_combo.addItem(f"Vertices: {column}", column)
+        self.vertex_combo.setCurrentIndex(
+            max(self.vertex_combo.findData(self.vertex_color_by), 0)
+        )
+        self.vertex_combo.currentIndexChanged.connect(
+            self._on_vertices_changed
+        )
+
         self.setLayout(QVBoxLayout())
+        self.layout().addLayout(self.settings_form)
         self.layout().addWidget(self.start_btn)
         self.layout().addWidget(self.stop_btn)
+        controls = QHBoxLayout()
+        controls.addWidget(self.pause_btn)
+        controls.addWidget(self.step_btn)
+        self.layout().addLayout(controls)
+        self.layout().addWidget(self.rewind_btn)
         self.layout().addWidget(self.export_btn)
+        self.layout().addWidget(self.lazy_checkbox)
+        self.layout().addWidget(self.preview_checkbox)
+        self.layout().addWidget(self.process_checkbox)
+        self.layout().addWidget(self.timings_checkbox)
+        self.layout().addWidget(self.timings_label)
+        self.layout().addWidget(self.export_timings_btn)
+        self.layout().addLayout(cadence)
+        self.layout().addWidget(self.color_combo)
+        self.layout().addWidget(self.edge_combo)
+        self.layout().addWidget(self.vertex_combo)
 
-    def start_simulation(self):
+        if self.face_events:
+            self.click_combo = QComboBox()
+            self.click_combo.addItem("Click a face: no event", None)
+            for event in self.face_events:
+                self.click_combo.addItem(f"Click a face: {event}", event)
+            self.click_combo.currentIndexChanged.connect(
+                self._on_click_event_changed
+            )
+            self.layout().addWidget(self.click_combo)
+
+    @staticmethod
+    def _spin_box(value, on_changed):
+        box = QSpinBox()
+        box.setRange(1, 100000)
+        box.setValue(value)
+        box.valueChanged.connect(on_changed)
+        return box
+
+    def make_simulation(self):
         """
         OVERRIDE This method.
 
+        Returns the :class:`TyssueSimulation` run by this widget, None if
+        there is nothing to run.
+        """
+        LOGGER.debug("TyssueWidget.make_simulation: not implemented")
+        return None
+
+    def size_settings(self):
+        """
+        The simulation settings of the selected sheet size.
+        """
+        return dict(self.size_presets.get(self.size_preset, {}))
+
+    def start_simulation(self):
+        """
         This function will be run in a separate thread.
-        The function should implement your simulation and
-        viewer updates.
+
+        It sets up the simulation returned by ``make_simulation`` and steps
+        it until it is done or stopped, queueing a viewer update after every
+        timestep.
+        """
+        simulation = self.make_simulation()
+        if simulation is None:
+            return
+        simulation.record_every = self.record_every
+        if self.use_process:
+            simulation = ProcessSimulation(simulation)
+            # the process steps as soon as it started, the events queued
+            # so far are sent before its first step
+            self._inject_events(simulation)
+        simulation.timer = self.step_timer
+        self.simulation = simulation
+
+        try:
+            simulation.start()
+
+            # Run the simulation
+            self.t = simulation.t
+            self.history = simulation.history
+            self._on_simulation_update(simulation.sheet, self.t)
+            self._run_simulation(simulation)
+        finally:
+            self._close_simulation(simulation)
+
+    def _continue_simulation(self):
+        """
+        Runs the kept simulation again in a separate thread, e.g. after it
+        was rewound.
+        """
+        simulation = self.simulation
+        try:
+            self._run_simulation(simulation)
+        finally:
+            self._close_simulation(simulation)
+
+    def _run_simulation(self, simulation):
+        """
+        Steps ``simulation`` until it is done or stopped, waiting while the
+        widget is paused and rewinding it when asked.
+        """
+        # Progress indicator
+        with progress(total=simulation.stop) as pbr:
+            pbr.set_description("Starting simulation")
+            pbr.update(self.t)
+
+            # showing the activity dock so we can see the progress bars
+            # self.viewer.window._status_bar._toggle_activity_dock(True)
+
+            shown = self.t
+            while self.running:
+                rewind_to = self._wait_for_control()
+                if rewind_to is not None:
+                    self._rewind(simulation, rewind_to)
+                    pbr.update(self.t - pbr.n)
+                    pbr.set_description(f"Rewound to step {self.t}")
+                    shown = self.t
+                    continue
+                if simulation.done or not self.running:
+                    break
+
+                self._inject_events(simulation)
+                simulation.step()
+                if simulation.t == self.t:
+                    continue
+
+                self.t = simulation.t
+                pbr.update(1)
+                pbr.set_description(f"Simulation step {self.t}")
+                record_every = simulation.record_every
+                if self.t % record_every == 0:
+                    self._export(simulation.sheet, self.t)
+                if self.t % np.lcm(record_every, self.render_every) == 0:
+                    self._on_simulation_update(simulation.sheet, self.t)
+                    shown = self.t
+
+        # the last step is recorded and shown whatever the cadence
+        simulation.flush()
+        if shown != self.t:
+            self._on_simulation_update(simulation.sheet, self.t)
+
+    def _close_simulation(self, simulation):
+        simulation.close()
+        # the simulation process is gone, it can't be rewound
+        if isinstance(simulation, ProcessSimulation):
+            self.simulation = None
+        self._finish_export()
+
+    def _wait_for_control(self):
+        """
+        Waits while the simulation is paused, until a step or a rewind is
+        asked or the simulation is stopped.
+
+        Returns the timestep to rewind to, or None to step.
+        """
+        with self._control:
+            while (
+                self.running
+                and self.paused
+                and not self._pending_steps
+                and self._rewind_to is None
+            ):
+                self._control.wait()
+            rewind_to, self._rewind_to = self._rewind_to, None
+            if rewind_to is None and self._pending_steps:
+                self._pending_steps -= 1
+            return rewind_to
+
+    def _rewind(self, simulation, t):
+        """
+        Rewinds ``simulation`` to timestep ``t``, on the simulation thread.
+
+        The exported history and the timings after ``t`` are dropped, the
+        displayed timepoints are dropped by ``_show_frames`` when the frame
+        of ``t`` is shown.
+        """
+        try:
+            t = simulation.rewind(t)
+        except (RuntimeError, ValueError) as error:
+            LOGGER.warning("cannot rewind the simulation: %s", error)
+            return
+        self.t = t
+        with self._export_lock:
+            if self.history_writer is not None:
+                self.history_writer.truncate(t)
+        if self.step_timer is not None:
+            self.step_timer.truncate(t)
+        self._on_simulation_update(simulation.sheet, t)
+
+    def pause(self):
+        """Pauses the simulation before its next step."""
+        with self._control:
+            self.paused = True
+
+    def resume(self):
+        """Resumes a paused simulation."""
+        with self._control:
+            self.paused = False
+            self._control.notify_all()
+
+    def step_once(self):
+        """Runs a single step of the simulation, and pauses it."""
+        with self._control:
+            self.paused = True
+            self._pending_steps += 1
+            self._control.notify_all()
+
+    def rewind(self, t):
+        """
+        Rewinds the simulation to its last checkpoint at or before ``t``, a
+        keyframe of its history, it then continues from there unless it is
+        paused.
+
+        The sheet and the event manager are restored from the checkpoints
+        of the simulation, the timesteps after it are forgotten. A finished
+        or stopped simulation is run again, unless it ran in a separate
+        process.
+        """
+        with self._control:
+            self._rewind_to = t
+            self._control.notify_all()
+        if self.thread is not None and self.thread.is_alive():
+            return
+        if self.simulation is None:
+            with self._control:
+                self._rewind_to = None
+            LOGGER.warning("rewind: there is no simulation to rewind")
+            return
+
+        self.running = True
+        self.thread = Thread(target=self._continue_simulation)
+        self.thread.start()
+        self.render_timer.start(self.render_interval)
+
+    def _recorded(self, t):
+        """
+        The sheet recorded at timestep ``t``, None if it wasn't recorded.
+        """
+        if self.history is None or t not in self.history.time_stamps:
+            return None
+        return self.history.retrieve(t)
+
+    def queue_event(self, event, face_ids):
+        """
+        Queues the ``event`` of ``face_events`` on the faces of ids
+        ``face_ids``, it is added to the running simulation before its next
+        step.
+        """
+        self.event_queue.put((event, list(face_ids)))
+
+    def _inject_events(self, simulation):
+        while True:
+            try:
+                event, face_ids = self.event_queue.get_nowait()
+            except queue.Empty:
+                return
+            LOGGER.info("%s of the faces %s", event, face_ids)
+            simulation.inject(event, face_ids)
+
+    def _previewed(self, sheet):
+        """Whether ``sheet`` is drawn as a simplified surface."""
+        preview_faces = self.preview_faces
+        return preview_faces is not None and sheet.Nf > preview_faces
+
+    def _sheet_mesh(self, sheet, topology_cache):
+        """
+        Builds the surface mesh of ``sheet``, of its region of interest if
+        any.
+        """
+        faces = self._region_faces(sheet, topology_cache)
+        if faces is not None:
+            return roi_mesh(
+                sheet,
+                faces,
+                indices=topology_cache.indices_for(sheet),
+                color_by=self.color_by,
+            )
+        return surface_mesh(
+            sheet,
+            topology_cache=topology_cache,
+            color_by=self.color_by,
+            preview=self._previewed(sheet),
+        )
+
+    def _region_faces(self, sheet, topology_cache):
+        """
+        The rows of the faces of the region of interest, None to draw the
+        whole sheet.
+        """
+        if self.region is None:
+            return None
+        indices = topology_cache.indices_for(sheet)
+        faces = np.flatnonzero(self.regions[self.region](sheet, indices))
+        # an empty region, e.g. once the apoptotic cell is removed, draws
+        # the whole sheet
+        return faces if len(faces) else None
+
+    def _sheet_face_ids(self, sheet, topology_cache):
+        """
+        The face id of each triangle of the mesh of ``sheet`` built by
+        ``_sheet_mesh``, from the ``id`` column of the faces if any.
+        """
+        indices = topology_cache.indices_for(sheet)
+        if "id" in sheet.face_df.columns:
+            ids = sheet.face_df["id"].to_numpy()
+        else:
+            ids = sheet.face_df.index.to_numpy()
+
+        # one triangle per edge, but for the preview fans
+        faces = self._region_faces(sheet, topology_cache)
+        if faces is not None:
+            return ids[np.repeat(faces, indices.face_size[faces])]
+        edge_face = indices.edge_face
+        if self._previewed(sheet):
+            Ne = len(edge_face)
+            srce, trgt = indices.vert[:Ne], indices.vert[Ne:]
+            _, fan = _preview_fan(srce, trgt, edge_face, indices.num_faces)
+            edge_face = edge_face[fan]
+        return ids[edge_face]
+
+    def _face_ids_at(self, t):
+        """
+        The face ids of the triangles of timepoint ``t``, rebuilt from the
+        history the first time if the frame didn't have them. None if ``t``
+        wasn't recorded.
+        """
+        if t not in self.face_lookup:
+            sheet = self._recorded(t)
+            if sheet is None:
+                return None
+            self.face_lookup[t] = self._sheet_face_ids(
+                sheet, self._history_topology_cache
+            )
+        return self.face_lookup[t]
+
+    def pick_face(self, position, view_direction, dims_displayed):
+        """
+        Returns the id of the face under ``position`` of the surface layer,
+        looking along ``view_direction``, or None.
         """
-        LOGGER.debug("TyssueWidget.start_simulation: not implemented")
+        if self.lazy_display is not None:
+            layer, t = self.lazy_display.layer, self.lazy_display.current
+        else:
+            layer, t = self.layer, self.viewer.dims.current_step[0]
+        if layer is None or self.history is None:
+            return None
+        value = layer.get_value(
+            position,
+            view_direction=view_direction,
+            dims_displayed=dims_displayed,
+            world=True,
+        )
+        face_ids = self._face_ids_at(t)
+        if value is None or value[1] is None or face_ids is None:
+            return None
+        return face_ids[value[1]].item()
+
+    def _on_surface_click(self, layer, event):
+        if self.click_event is None or not self.running:
+            return
+        face_id = self.pick_face(
+            event.position, event.view_direction, event.dims_displayed
+        )
+        if face_id is not None:
+            self.queue_event(self.click_event, [face_id])
+
+    def _connect_picking(self, layer):
+        if self.face_events and (
+            self._on_surface_click not in layer.mouse_drag_callbacks
+        ):
+            layer.mouse_drag_callbacks.append(self._on_surface_click)
+
+    def _sheet_edges(self, sheet):
+        """
+        Builds the junction vectors of ``sheet``, None when they are hidden.
+        """
+        if self.edge_color_by is None:
+            return None
+        return edge_mesh(sheet, ["x", "y", "z"], color_by=self.edge_color_by)
+
+    def _sheet_vertices(self, sheet):
+        """
+        Builds the vertex points of ``sheet``, None when they are hidden.
+        """
+        if self.vertex_color_by is None:
+            return None
+        columns = list(self.vertex_features)
+        if self.vertex_color_by not in columns:
+            columns.append(self.vertex_color_by)
+        return vertex_points(sheet, columns)
+
+    def _mesh_at(self, t):
+        """
+        Builds the surface mesh of timepoint ``t`` from the history, None
+        if it wasn't recorded.
+        """
+        sheet = self._recorded(t)
+        if sheet is None:
+            return None
+        return self._sheet_mesh(sheet, self._history_topology_cache)
+
+    def _on_simulation_update(self, sheet, t):
+        """
+        This function is called by the simulation thread after every
+        simulated timestep.
+
+        It only queues a mesh snapshot of ``sheet``, the viewer is updated
+        from the main thread by ``_on_render_tick``. If the queue is full the
+        oldest pending frame is dropped, so the simulation never waits for
+        rendering; the history still holds every step.
+        """
+        LOGGER.debug("TyssueWidget._on_simulation_update: timestep %s", t)
+
+        timer = self.step_timer
+        if timer is not None:
+            start = timer.now()
+
+        frame = Frame(
+            t,
+            self._sheet_mesh(sheet, self.topology_cache),
+            self._sheet_edges(sheet),
+            self._sheet_vertices(sheet),
+            (
+                self._sheet_face_ids(sheet, self.topology_cache)
+                if self.face_events
+                else None
+            ),
+        )
+
+        if timer is not None:
+            timer.lap(t, "mesh_extraction", start)
+        while True:
+            try:
+                self.frame_queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frame_queue.get_nowait()
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+    def _on_render_tick(self):
+        """
+        Drains the frame queue and updates the viewer once, on the main thread.
+        """
+        frames = []
+        while True:
+            try:
+                frames.append(self.frame_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if frames:
+            timer = self.step_timer
+            if timer is None:
+                self._show_frames(frames)
+            else:
+                start = timer.now()
+                self._show_frames(frames)
+                timer.lap(frames[-1].t, "layer_upload", start)
+                if self.timings_label is not None:
+                    self.timings_label.setText(timer.summary_text())
+
+        finished = self.thread is None or not self.thread.is_alive()
+        if finished and self.frame_queue.empty():
+            self.render_timer.stop()
+            if self.dropped_frames:
+                LOGGER.info(
+                    "%d frames were not displayed", self.dropped_frames
+                )
+
+    def _show_frames(self, frames):
+        """
+        Adds the frames to the viewer, uploading the layer data a single
+        time.
+        """
+        # a rewound simulation shows an earlier timepoint again, the frames
+        # before it and the timepoints displayed from it on are dropped
+        rewound = None
+        last = self._shown_t
+        for i, frame in enumerate(frames):
+            if last is not None and frame.t <= last:
+                rewound = i
+            last = frame.t
+        if rewound is not None:
+            frames = frames[rewound:]
+            self._truncate_display(frames[0].t)
+        self._shown_t = frames[-1].t
+
+        self._show_edge_frames(frames)
+        vertices = [frame.vertices for frame in frames]
+        vertices = [points for points in vertices if points is not None]
+        if vertices:
+            self._update_vertex_layer(vertices[-1])
+        t, mesh = frames[-1].t, frames[-1].mesh
+
+        if self.lazy_display is not None:
+            self.face_lookup.clear()
+            frames = frames[-1:]
+        for frame in frames:
+            if frame.face_ids is not None:
+                self.face_lookup[frame.t] = frame.face_ids
+
+        if self.lazy_display is not None:
+            self.lazy_display.show(t, num_timepoints=t + 1, mesh=mesh)
+            self._connect_picking(self.lazy_display.layer)
+            self.viewer.dims.set_current_step(0, t)
+            self._update_color_choices()
+            return
+
+        # Now we need to make the meshes into timepoints
+        for frame in frames:
+            self.mesh_buffer.append(frame.mesh, frame.t)
+
+        if self.layer is not None and self.layer in self.viewer.layers:
+            # if the layer exists, update the data
+            self.layer.data = self.mesh_buffer.data
+
+            # Update timepoint that is displayed
+            self.viewer.dims.set_current_step(0, t)
+        else:
+            # otherwise add it to the viewer
+            self.layer = self.viewer.add_surface(
+                self.mesh_buffer.data,
+                colormap="viridis",
+                opacity=0.9,
+                contrast_limits=[0, 1],
+                name=self.layer_name,
+            )
+            self._connect_picking(self.layer)
+            self._update_color_choices()
+
+    def _truncate_display(self, t):
+        """Drops the displayed timepoints from ``t`` on."""
+        self.mesh_buffer.truncate(t)
+        self.edge_buffer.truncate(t)
+        self._edges_t = None
+        for key in [key for key in self.face_lookup if key >= t]:
+            del self.face_lookup[key]
+        if self.lazy_display is not None:
+            self.lazy_display.truncate(t)
+
+    def _show_edge_frames(self, frames):
+        """
+        Adds the junctions of the frames to the edge buffer, only the last
+        one when the surface is lazy, and shows the last one.
+        """
+        frames = [(f.t, f.edges) for f in frames if f.edges is not None]
+        if not frames:
+            return
+        if self.lazy_display is not None:
+            self.edge_buffer.clear()
+            frames = frames[-1:]
+        for t, edges in frames:
+            self.edge_buffer.append(edges, t)
+        self._upload_edges(frames[-1][0])
+
+    def _upload_edges(self, t):
+        """
+        Shows the junctions of timepoint ``t`` of the edge buffer.
+
+        The layer only holds one timepoint, like the lazy surface: setting
+        the stacked vectors would cost as much as the number of timepoints.
+        """
+        self._edges_t = t
+        edges = self.edge_buffer.at(t)
+        layer = self.edge_layer
+        if edges is None:
+            # like the surface, nothing is drawn on unrecorded steps
+            if layer is not None:
+                layer.visible = False
+            return
+        vectors, values = edges
+        features = {"value": values}
+        if layer is not None and layer in self.viewer.layers:
+            layer.data = vectors
+            layer.features = features
+            layer.edge_color = "value"
+            layer.visible = True
+        else:
+            self.edge_layer = self.viewer.add_vectors(
+                vectors,
+                features=features,
+                edge_color="value",
+                edge_colormap="viridis",
+                edge_width=2,
+                vector_style="line",
+                name=f"{self.layer_name} junctions",
+            )
+
+    def set_edge_color_by(self, column):
+        """
+        Draws the cell junctions colored by the edge ``column``, e.g.
+        ``"line_tension"`` or ``"length"``, or hides them if None.
+
+        The junctions of the displayed timepoints are rebuilt from the
+        history.
+        """
+        self.edge_color_by = column
+        self.edge_buffer.clear()
+        self._edges_t = None
+        if column is None:
+            if self.edge_layer in self.viewer.layers:
+                self.viewer.layers.remove(self.edge_layer)
+            self.edge_layer = None
+            return
+        if self.history is None:
+            return
+
+        if self.lazy_display is not None:
+            timepoints = [self.viewer.dims.current_step[0]]
+        else:
+            timepoints = self.mesh_buffer.timepoints
+        for t in timepoints:
+            sheet = self._recorded(t)
+            if sheet is not None:
+                self.edge_buffer.append(self._sheet_edges(sheet), t)
+        if len(self.edge_buffer):
+            self._upload_edges(self.viewer.dims.current_step[0])
+
+    def _update_vertex_layer(self, vertices):
+        """
+        Shows the ``(points, features)`` of the vertices of the live sheet.
+
+        While the vertices are the same, their positions and features are
+        written in place in the arrays of the layer.
+        """
+        points, features = vertices
+        layer = self.vertex_layer
+        if layer is None or layer not in self.viewer.layers:
+            self.vertex_layer = self.viewer.add_points(
+                points,
+                features=features,
+                face_color=self.vertex_color_by,
+                face_colormap="viridis",
+                border_width=0,
+                size=4,
+                name=f"{self.layer_name} vertices",
+            )
+            return
+
+        same_columns = list(layer.features.columns) == list(features)
+        if same_columns and len(layer.data) == len(points):
+            layer.data[:] = points
+            for column, values in features.items():
+                layer.features[column] = values
+            layer.refresh_colors(update_color_mapping=True)
+            layer.refresh()
+        else:
+            layer.data = points
+            layer.features = features
+            layer.face_color = self.vertex_color_by
+
+    def set_vertex_color_by(self, column):
+        """
+        Draws the vertices of the sheet colored by the vert_df ``column``,
+        e.g. ``"is_active"``, or hides them if None.
+        """
+        self.vertex_color_by = column
+        if column is None:
+            if self.vertex_layer in self.viewer.layers:
+                self.viewer.layers.remove(self.vertex_layer)
+            self.vertex_layer = None
+            return
+        if self.history is None:
+            return
+
+        # the last recorded step, the closest to the live sheet
+        sheet = self.history.retrieve(self.history.time_stamps[-1])
+        vertices = self._sheet_vertices(sheet)
+        self._update_vertex_layer(vertices)
+        self.vertex_layer.face_color = column
+
+    def _on_current_step(self, event=None):
+        """
+        Shows the junctions of the current timepoint, rebuilt from the
+        history when the surface is lazy.
+        """
+        # the layer is added with the first frame: adding it may move the
+        # current step before the layer is known
+        if self.edge_layer is None or self.history is None:
+            return
+        t = self.viewer.dims.current_step[0]
+        if t == self._edges_t:
+            return
+        if self.lazy_display is not None and self.edge_buffer.at(t) is None:
+            sheet = self._recorded(t)
+            self.edge_buffer.clear()
+            if sheet is not None:
+                self.edge_buffer.append(self._sheet_edges(sheet), t)
+        self._upload_edges(t)
+
+    def set_region(self, region):
+        """
+        Only draws the faces of the ``region`` of ``regions``, or the whole
+        sheet if None.
+
+        The meshes of the displayed timepoints are rebuilt from the history,
+        the ones that weren't recorded are dropped.
+        """
+        self.region = region
+        self.face_lookup.clear()
+        if self.history is None:
+            return
+
+        if self.lazy_display is not None:
+            self.lazy_display.refresh()
+            return
+
+        buffer = self.mesh_buffer
+        timepoints = list(buffer.timepoints)
+        buffer.clear()
+        for t in timepoints:
+            mesh = self._mesh_at(t)
+            if mesh is not None:
+                buffer.append(mesh, t)
+        if self.layer is not None and self.layer in self.viewer.layers:
+            self.layer.data = buffer.data
+
+    def set_color_by(self, color_by):
+        """
+        Colors the faces by the ``(element, column)`` ``color_by`` of the
+        sheet, e.g. ``("face", "area")``, or by mesh index if None.
+
+        The values of the displayed timepoints are recomputed from the
+        history; the vertices and faces of the layer are left untouched.
+        """
+        self.color_by = None if color_by is None else tuple(color_by)
+        if self.history is None:
+            return
+
+        cache = self._history_topology_cache
+
+        def values_at(t, mesh):
+            if self.color_by is None:
+                return np.linspace(0, 1, len(mesh[2]), dtype=np.float32)
+            sheet = self._recorded(t)
+            if sheet is None:
+                return mesh[2]
+            if self.region is not None or self._previewed(sheet):
+                return self._sheet_mesh(sheet, cache)[2]
+            return mesh_values(
+                sheet, self.color_by, indices=cache.indices_for(sheet)
+            )
+
+        if self.lazy_display is not None:
+            self.lazy_display.update_values(values_at)
+            layer = self.lazy_display.layer
+            values = layer.vertex_values if layer is not None else None
+        else:
+            buffer = self.mesh_buffer
+            for i, t in enumerate(buffer.timepoints):
+                out = buffer.values_at(i)
+                out[:] = values_at(t, (None, None, out))
+            layer = self.layer
+            values = buffer.data[2]
+            if layer is not None and layer in self.viewer.layers:
+                layer.vertex_values = values
+
+        if layer is None or layer not in self.viewer.layers or not len(values):
+            return
+        low, high = float(np.min(values)), float(np.max(values))
+        if high > low:
+            layer.contrast_limits = [low, high]
+        elif self.color_by is None:
+            layer.contrast_limits = [0, 1]
+
+    def _update_color_choices(self):
+        """Lists the numeric columns of the simulated sheet in the combo."""
+        combo = self.color_combo
+        if combo is None or self.history is None or combo.count() > 1:
+            return
+        combo.blockSignals(True)
+        datasets = self.history.sheet.datasets
+        # the ids of the elements don't make colors
+        ids = set(datasets) | {"time", "srce", "trgt"}
+        for element, df in datasets.items():
+            for column, dtype in sorted(df.dtypes.items()):
+                if column in ids or dtype.kind not in "biuf":
+                    continue
+                combo.addItem(f"{element}: {column}", (element, column))
+        if self.color_by is not None:
+            combo.setCurrentIndex(max(combo.findData(self.color_by), 0))
+        combo.blockSignals(False)
+
+    def _on_color_changed(self, index):
+        self.set_color_by(self.color_combo.itemData(index))
+
+    def _on_click_event_changed(self, index):
+        self.click_event = self.click_combo.itemData(index)
+
+    def _on_region_changed(self, index):
+        self.set_region(self.region_combo.itemData(index))
+
+    def _on_edges_changed(self, index):
+        self.set_edge_color_by(self.edge_combo.itemData(index))
+
+    def _on_vertices_changed(self, index):
+        self.set_vertex_color_by(self.vertex_combo.itemData(index))
 
     def _on_start_click(self):
         """
         This function is called when the start simulation button is clicked.
         It launches a new simulation thread.
         """
-        LOGGER.info("start: napari has", len(self.viewer.layers), "layers")
+        LOGGER.info("start: napari has %d layers", len(self.viewer.layers))
+
+        self.mesh_buffer.clear()
+        self.edge_buffer.clear()
+        self.face_lookup.clear()
+        self.topology_cache.clear()
+        self._history_topology_cache.clear()
+        if self.lazy_surface:
+            if self.lazy_display is None:
+                self.lazy_display = LazyTimeSeriesSurface(
+                    self.viewer,
+                    self._mesh_at,
+                    colormap="viridis",
+                    opacity=0.9,
+                    contrast_limits=[0, 1],
+                    name=self.layer_name,
+                )
+            self.lazy_display.clear()
+        elif self.lazy_display is not None:
+            self.lazy_display.close()
+            self.lazy_display = None
+
+        self.frame_queue = queue.Queue(maxsize=self.max_queued_frames)
+        self.dropped_frames = 0
+        self._shown_t = None
+        self.history = None
+        self.simulation = None
+        self.step_timer = StepTimer() if self.record_timings else None
+        with self._control:
+            self._pending_steps = 0
+            self._rewind_to = None
 
+        self.viewer.dims.ndisplay = 3
+        self.running = True
         self.thread = Thread(target=self.start_simulation)
         self.thread.start()
+        self.render_timer.start(self.render_interval)
 
     def _on_stop_click(self):
         LOGGER.info("stopping simulation")
 
-        self.running = False
+        with self._control:
+            self.running = False
+            self._control.notify_all()
         self.thread.join()
+        self._on_render_tick()
 
         LOGGER.info("simulation stopped")
 
+    def _on_pause_toggled(self, checked):
+        if checked:
+            self.pause()
+        else:
+            self.resume()
+        self.pause_btn.setText("Resume" if checked else "Pause")
+
+    def _on_step_click(self):
+        self.step_once()
+        self.pause_btn.setChecked(True)
+
+    def _on_rewind_click(self):
+        lazy_display = self.lazy_display
+        if lazy_display is not None and lazy_display.current is not None:
+            t = lazy_display.current
+        else:
+            t = self.viewer.dims.current_step[0]
+        self.rewind(t)
+
+    def _on_lazy_toggled(self, checked):
+        """The display mode is applied when the next simulation starts."""
+        self.lazy_surface = checked
+
+    def _on_process_toggled(self, checked):
+        """The backend is applied when the next simulation starts."""
+        self.use_process = checked
+
+    def _on_record_every_changed(self, value):
+        """The recording cadence is applied when the next simulation starts."""
+        self.record_every = value
+
+    def _on_steps_changed(self, value):
+        self.stop = value
+
+    def _on_size_changed(self, label):
+        self.size_preset = label
+
+    def _on_preview_toggled(self, checked):
+        self.preview_faces = PREVIEW_FACES if checked else None
+
+    def _on_render_every_changed(self, value):
+        self.render_every = value
+
+    def _on_render_interval_changed(self, value):
+        self.render_interval = value
+        if self.render_timer.isActive():
+            self.render_timer.setInterval(value)
+
+    def _on_timings_toggled(self, checked):
+        """Timings are recorded from the next simulation on."""
+        self.record_timings = checked
+        self.timings_label.setVisible(checked)
+        self.export_timings_btn.setVisible(checked)
+
+    def _on_export_timings_click(self):
+        if self.step_timer is None:
+            LOGGER.info("export timings: no timings were recorded")
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export Timings",
+            "",
+            "CSV files (*.csv);;JSON files (*.json)",
+        )
+        if path:
+            self.step_timer.save(path)
+
+    def export_history(self, path):
+        """
+        Exports the history of the simulation to the HDF5 file ``path``.
+
+        The timesteps recorded so far are written at once. If the simulation
+        is running, the following ones are appended as they are computed and
+        the file is closed when the simulation ends; otherwise the next
+        simulation is streamed to ``path`` from its first step.
+        """
+        with self._export_lock:
+            if self.history_writer is not None:
+                self.history_writer.close()
+            self.history_writer = HistoryWriter(path)
+            if self.history is not None:
+                self.history_writer.write_history(self.history)
+
+            if self.history is not None and (
+                self.thread is None or not self.thread.is_alive()
+            ):
+                self.history_writer.close()
+                self.history_writer = None
+
+    def _export(self, sheet, t):
+        """Appends timestep ``t`` to the exported history, if any."""
+        with self._export_lock:
+            if self.history_writer is None:
+                return
+            if self.history_writer.time is None:
+                # the export was requested before the simulation started
+                self.history_writer.write_history(self.history)
+            elif t > self.history_writer.time:
+                # ``export_history`` may have written it from the history
+                self.history_writer.append(sheet, t)
+
+    def _finish_export(self):
+        with self._export_lock:
+            if self.history_writer is not None:
+                if self.history is not None:
+                    self.history_writer.write_history(self.history)
+                self.history_writer.close()
+                self.history_writer = None
+
     def _on_export_click(self):
-        LOGGER.info("export: not implemented")
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Simulation", "", "HDF5 files (*.hf5 *.h5)"
+        )
+        if path:
+            self.export_history(path)